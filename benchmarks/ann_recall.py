@@ -0,0 +1,106 @@
+# benchmarks/ann_recall.py
+"""
+Recall@k and latency of IVF-PQ against exact search.
+
+    # synthetic clustered 384-dim vectors
+    python -m benchmarks.ann_recall --n 200000 --nlist 1024 --m 48 --nprobe 4 8 16 32 64
+    # or an index dir built with `python -m src.shared.ann_index`
+    python -m benchmarks.ann_recall --index_dir data/ann --nprobe 8 16 32
+"""
+import argparse, json, os, tempfile, time
+
+import numpy as np
+
+from src.shared.ann_index import IVFPQVectorSearch, build_ivfpq
+from src.shared.vector_store import LocalVectorSearch, build_index
+
+
+def synthetic_corpus(n: int, dim: int, clusters: int = 200, latent_dim: int = 32, seed: int = 0) -> np.ndarray:
+    """
+    Unit vectors around random topic centres in a low-dimensional subspace, plus a little
+    isotropic noise (roughly the shape of e5 abstract embeddings).
+    """
+    rng = np.random.default_rng(seed)
+    latent_dim = min(latent_dim, dim)
+    centres = rng.normal(size=(clusters, latent_dim))
+    latent = centres[rng.integers(0, clusters, n)] + 0.5 * rng.normal(size=(n, latent_dim))
+    x = latent @ rng.normal(size=(latent_dim, dim)) + 0.5 * rng.normal(size=(n, dim))
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x.astype(np.float32)
+
+
+def write_jsonl_corpus(x: np.ndarray, out_dir: str):
+    emb, store = os.path.join(out_dir, "emb.jsonl"), os.path.join(out_dir, "store.jsonl")
+    with open(emb, "w") as fe, open(store, "w") as fs:
+        for i, v in enumerate(x):
+            fe.write(json.dumps({"id": f"{i}#0", "embedding": v.tolist()}) + "\n")
+            fs.write(json.dumps({"id": f"{i}#0", "doc_id": str(i), "title": f"doc {i}", "chunk_index": 0, "chunk_text": ""}) + "\n")
+    return emb, store
+
+
+def percentile_ms(samples, p):
+    return float(np.percentile(np.asarray(samples) * 1000.0, p))
+
+
+def run(index_dir: str, nprobes, k: int = 10, n_queries: int = 200, seed: int = 1):
+    exact = LocalVectorSearch(index_dir)
+    ann = IVFPQVectorSearch(index_dir)
+    n, dim = exact.matrix.shape
+    rng = np.random.default_rng(seed)
+    # queries: perturbed corpus vectors, as real questions land near their answers
+    q = np.asarray(exact.matrix[rng.choice(n, n_queries, replace=False)], dtype=np.float32)
+    q = q + 0.3 * rng.normal(size=q.shape).astype(np.float32) / np.sqrt(dim)
+    q = (q / np.linalg.norm(q, axis=1, keepdims=True)).astype(np.float32)
+
+    truth, exact_lat = [], []
+    for v in q:
+        t0 = time.perf_counter()
+        idx, _ = exact._scan(v[None, :], k)
+        exact_lat.append(time.perf_counter() - t0)
+        truth.append(set(idx[0].tolist()))
+
+    report = {
+        "n": n, "dim": dim, "k": k, "queries": n_queries,
+        "exact": {"p50_ms": percentile_ms(exact_lat, 50), "p99_ms": percentile_ms(exact_lat, 99),
+                  "bytes_per_million": int(4 * dim * 1_000_000)},
+        "ivfpq": [],
+        "ivfpq_bytes_per_million": int(ann.memory_bytes() / n * 1_000_000),
+    }
+    for nprobe in nprobes:
+        ann.nprobe = nprobe
+        lat, recall = [], []
+        for v, t in zip(q, truth):
+            t0 = time.perf_counter()
+            rows, _ = ann._search_one(v, k)
+            lat.append(time.perf_counter() - t0)
+            recall.append(len(t & set(rows.tolist())) / k)
+        report["ivfpq"].append({"nprobe": nprobe, f"recall@{k}": float(np.mean(recall)),
+                                "p50_ms": percentile_ms(lat, 50), "p99_ms": percentile_ms(lat, 99)})
+    return report
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index_dir", default=None, help="existing ann_index dir; omit to use a synthetic corpus")
+    ap.add_argument("--n", type=int, default=100_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--nlist", type=int, default=512)
+    ap.add_argument("--m", type=int, default=48)
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32, 64])
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--out", default=None, help="write the JSON report here")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_dir = args.index_dir
+        if index_dir is None:
+            index_dir = os.path.join(tmp, "index")
+            build_index(*write_jsonl_corpus(synthetic_corpus(args.n, args.dim), tmp), index_dir)
+            build_ivfpq(index_dir, nlist=args.nlist, m=args.m)
+        report = run(index_dir, args.nprobe, k=args.k, n_queries=args.queries)
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,116 @@
+# benchmarks/cold_start.py
+"""
+Cold start of the API: a fresh `uvicorn` process, timed from spawn until
+    first_response_secs   the port answers at all (/healthz 503 while services load)
+    healthz_ready_secs    /healthz returns 200 (clients built and warmed up)
+    first_chat_secs       the first /v1/chat returns 200
+plus the `-X importtime` cost of importing the API module (--import_module).
+
+    # real services (needs GCP credentials and the model)
+    python -m benchmarks.cold_start --runs 3 --out bench/cold.json
+    # offline: the app wired to benchmarks/fakes.py, so only our import / startup path is measured
+    python -m benchmarks.cold_start --app benchmarks.cold_start:fake_app
+"""
+import argparse, json, socket, subprocess, sys, time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+from benchmarks.compare import save_report
+
+
+def fake_app():
+    """uvicorn --factory target: the real app over zero-latency fakes."""
+    import tempfile
+    from types import SimpleNamespace
+    from benchmarks.load_chat import build_fake_services
+    from src.agent_api.main import create_app
+    args = SimpleNamespace(corpus=1000, dim=384, seed=0, backend="bigquery", embed_ms=0, embed_item_ms=0, jitter=0,
+                           bq_ms=0, llm_ttft_ms=0, llm_tps=0, llm_prefill_ms=0, answer_tokens=20,
+                           semantic_cache=False, context_tokens=0)
+    return create_app(services_factory=lambda: build_fake_services(args, tempfile.mkdtemp()))
+
+
+def import_times(module: str) -> Dict[str, int]:
+    """{imported module: cumulative microseconds} for `import module` in a fresh interpreter (-X importtime)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def import_profile(module: str, top: int = 10) -> Dict:
+    """Cumulative import time of `module` and its most expensive imports."""
+    times = import_times(module)
+    slowest = sorted(((us, n) for n, us in times.items() if n != module), reverse=True)[:top]
+    return {"import_ms": round(times[module] / 1000, 1),
+            "modules": len(times),
+            "slowest": [{"module": n, "ms": round(us / 1000, 1)} for us, n in slowest]}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_once(app: str, factory: bool, timeout: float = 300.0, question: str = "What are transformer models?") -> Dict:
+    port = _free_port()
+    cmd = [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    if factory:
+        cmd.append("--factory")
+    out: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            while "healthz_ready_secs" not in out:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"server exited: {proc.stderr.read()[-2000:]}")
+                if time.perf_counter() - t0 > timeout:
+                    raise TimeoutError("server did not become ready")
+                try:
+                    r = client.get("/healthz")
+                except httpx.TransportError:
+                    time.sleep(0.005)
+                    continue
+                out.setdefault("first_response_secs", time.perf_counter() - t0)
+                if r.status_code == 200:
+                    out["healthz_ready_secs"] = time.perf_counter() - t0
+                elif r.json().get("error"):
+                    raise RuntimeError(f"startup failed: {r.json()['error']}")
+                else:
+                    # the server is up and loading services; polling harder would compete for its GIL
+                    time.sleep(0.05)
+            r = client.post("/v1/chat", json={"question": question, "k": 3})
+            r.raise_for_status()
+            out["first_chat_secs"] = time.perf_counter() - t0
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    return {k: round(v, 3) for k, v in out.items()}
+
+
+def run(app: str, runs: int = 3, factory: bool = False, import_module: str = "src.agent_api.main") -> Dict:
+    samples: List[Dict] = [start_once(app, factory) for _ in range(runs)]
+    report = {"app": app, "runs": runs, "import": import_profile(import_module)}
+    for key in ("first_response_secs", "healthz_ready_secs", "first_chat_secs"):
+        report[key] = round(float(np.median([s[key] for s in samples])), 3)
+    report["samples"] = samples
+    return report
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--app", default="src.agent_api.main:app", help="uvicorn target; *:fake_app is a factory")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--import_module", default="src.agent_api.main")
+    ap.add_argument("--out", default=None, help="write the JSON report here (compare with benchmarks.compare)")
+    args = ap.parse_args()
+    report = run(args.app, args.runs, factory=args.app.endswith(":fake_app"), import_module=args.import_module)
+    print(json.dumps(save_report(report, args.out, "cold_start", vars(args)), indent=2))
@@ -0,0 +1,96 @@
+# benchmarks/compare.py
+"""
+Saved benchmark reports and regression checks between two runs.
+
+    python -m benchmarks.load_chat --out bench/base.json          # on main
+    python -m benchmarks.load_chat --out bench/new.json           # on the branch
+    python -m benchmarks.compare bench/base.json bench/new.json --threshold 0.10
+
+Every numeric leaf of the two reports is compared by path. Metric direction comes from the name:
+latencies, durations and sizes (*_ms, *_us, *_secs, *bytes*) should go down; throughput, rates and
+quality (*per_sec*, *throughput*, *rps*, recall*, overlap*, *speedup*, *ratio*) should go up. Other
+numbers (counts, config) are informational. Exits 1 if anything is worse by more than the threshold.
+"""
+import argparse, json, os, platform, subprocess, sys, time
+from typing import Dict, List, Tuple
+
+LOWER_IS_BETTER = ("_ms", "_us", "_secs", "bytes")
+HIGHER_IS_BETTER = ("per_sec", "throughput", "rps", "recall", "overlap", "speedup", "ratio")
+
+
+def _git_sha() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def save_report(report: Dict, out: str | None, name: str, config: Dict | None = None) -> Dict:
+    """Wrap a benchmark report with run metadata; write it to `out` if given."""
+    doc = {"benchmark": name, "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+           "git_sha": _git_sha(), "python": platform.python_version(), "machine": platform.machine(),
+           "cpus": os.cpu_count(), "config": config or {}, "results": report}
+    if out:
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        with open(out, "w") as f:
+            json.dump(doc, f, indent=2)
+    return doc
+
+
+def flatten(obj, prefix: str = "") -> Dict[str, float]:
+    out = {}
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            out.update(flatten(v, f"{prefix}.{k}" if prefix else str(k)))
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            out.update(flatten(v, f"{prefix}[{i}]"))
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        out[prefix] = float(obj)
+    return out
+
+
+def direction(path: str) -> int:
+    """-1: lower is better, +1: higher is better, 0: not a performance metric."""
+    leaf = path.rsplit(".", 1)[-1].lower()
+    if any(leaf.endswith(s) or s in leaf for s in LOWER_IS_BETTER):
+        return -1
+    if any(s in leaf for s in HIGHER_IS_BETTER):
+        return 1
+    return 0
+
+
+def compare(base: Dict, new: Dict, threshold: float = 0.10) -> Dict[str, List[Tuple[str, float, float, float]]]:
+    """{"regressions": [...], "improvements": [...]} of (path, base, new, relative change)."""
+    a, b = flatten(base.get("results", base)), flatten(new.get("results", new))
+    out = {"regressions": [], "improvements": []}
+    for path in sorted(a.keys() & b.keys()):
+        d = direction(path)
+        if d == 0 or a[path] == 0:
+            continue
+        change = (b[path] - a[path]) / abs(a[path])
+        if -d * change > threshold:
+            out["regressions"].append((path, a[path], b[path], change))
+        elif d * change > threshold:
+            out["improvements"].append((path, a[path], b[path], change))
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("base")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=0.10, help="relative change that counts (0.10 = 10%%)")
+    args = ap.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    res = compare(base, new, args.threshold)
+    print(f"{base.get('git_sha')} -> {new.get('git_sha')} ({base.get('benchmark')}, threshold {args.threshold:.0%})")
+    for kind in ("regressions", "improvements"):
+        print(f"{kind}: {len(res[kind])}")
+        for path, x, y, change in res[kind]:
+            print(f"  {path}: {x:g} -> {y:g} ({change:+.1%})")
+    sys.exit(1 if res["regressions"] else 0)
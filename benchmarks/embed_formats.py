@@ -0,0 +1,85 @@
+# benchmarks/embed_formats.py
+"""
+File size and load time of the embedding artifact formats.
+
+    python -m benchmarks.embed_formats --n 100000 --dim 384
+
+jsonl:   embeddings JSONL + store JSONL (JsonlSink), loaded with json.loads into a float32 matrix
+parquet: sharded Parquet (ParquetSink), loaded as zero-copy views of the embedding column
+"""
+import argparse, json, os, tempfile, time
+
+import numpy as np
+
+from benchmarks.ann_recall import synthetic_corpus
+from benchmarks.compare import save_report
+from src.data_pipeline.embed_generator import JsonlSink
+from src.shared import embed_parquet
+from src.shared.gcp_clients import GCSClient
+
+
+def _rows(n: int):
+    return [{"id": f"{i}#0", "doc_id": str(i), "title": f"doc {i}", "chunk_index": 0,
+             "chunk_text": f"abstract text of paper {i} " * 20} for i in range(n)]
+
+
+def _size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def _write(sink, rows, x, batch: int = 256) -> float:
+    t0 = time.perf_counter()
+    with sink:
+        for i in range(0, len(rows), batch):
+            sink.write(rows[i:i + batch], x[i:i + batch].tolist())
+    return time.perf_counter() - t0
+
+
+def load_jsonl_matrix(path: str) -> np.ndarray:
+    with open(path) as f:
+        return np.asarray([json.loads(line)["embedding"] for line in f], dtype=np.float32)
+
+
+def run(n: int, dim: int, out_dir: str) -> dict:
+    gcs = GCSClient()
+    x = synthetic_corpus(n, dim)
+    rows = _rows(n)
+    emb, store = os.path.join(out_dir, "emb.jsonl"), os.path.join(out_dir, "store.jsonl")
+    pq_uri = os.path.join(out_dir, "emb.parquet")
+
+    report = {"n": n, "dim": dim}
+    write_jsonl = _write(JsonlSink(gcs, emb, store), rows, x)
+    write_parquet = _write(embed_parquet.ParquetSink(gcs, pq_uri), rows, x)
+
+    t0 = time.perf_counter()
+    m_json = load_jsonl_matrix(emb)
+    load_jsonl = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    _, m_pq = embed_parquet.read_matrix(gcs, pq_uri)
+    load_parquet = time.perf_counter() - t0
+    assert m_pq.shape == m_json.shape and np.allclose(m_pq, m_json)
+
+    report["jsonl"] = {"bytes": _size(emb) + _size(store), "embeddings_bytes": _size(emb),
+                       "write_secs": round(write_jsonl, 3), "load_matrix_secs": round(load_jsonl, 3)}
+    report["parquet"] = {"bytes": _size(pq_uri), "write_secs": round(write_parquet, 3),
+                         "load_matrix_secs": round(load_parquet, 3)}
+    report["size_ratio"] = round(report["jsonl"]["bytes"] / report["parquet"]["bytes"], 2)
+    report["load_speedup"] = round(load_jsonl / max(load_parquet, 1e-9), 1)
+    return report
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=50000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--out_dir", default=None, help="where to write the artifacts (default: a temp dir)")
+    ap.add_argument("--out", default=None, help="write the JSON report here (compare with benchmarks.compare)")
+    args = ap.parse_args()
+    if args.out_dir:
+        report = run(args.n, args.dim, args.out_dir)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            report = run(args.n, args.dim, tmp)
+    print(json.dumps(save_report(report, args.out, "embed_formats", vars(args)), indent=2))
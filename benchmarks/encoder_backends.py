@@ -0,0 +1,87 @@
+# benchmarks/encoder_backends.py
+"""
+Throughput, query latency and parity of the LocalEmbeddings backends (torch / onnx / onnx-int8).
+
+    python -m benchmarks.encoder_backends --threads 2 --out bench/encoders.json
+    python -m benchmarks.encoder_backends --backends torch onnx-int8 --max_seq_length 256
+
+passages_per_sec: arXiv-chunk-length texts in pipeline-sized batches (--batch_size), encoded
+    through embed_batches() with and without pooling into a length-sorted window.
+query_p50_ms / query_p99_ms: one question per call, the /v1/chat path.
+cosine_min / cosine_mean: against the torch backend on the same texts (1.0 = identical).
+Needs sentence-transformers, plus optimum[onnxruntime] for the onnx backends.
+"""
+import argparse, json, random, time
+
+import numpy as np
+
+from benchmarks.ann_recall import percentile_ms
+from benchmarks.compare import save_report
+from src.shared.gcp_clients import LocalEmbeddings
+
+
+def passages(n: int, seed: int = 0):
+    # chunk_text makes 180-word chunks; abstracts end in a shorter tail chunk
+    rng = random.Random(seed)
+    words = [f"term{i}" for i in range(3000)] + ["model", "language", "neural", "the", "of", "we"] * 50
+    return [" ".join(rng.choice(words) for _ in range(rng.choice([180, 180, rng.randrange(10, 180)])))
+            for _ in range(n)]
+
+
+def questions(n: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [f"what are recent results on term{rng.randrange(3000)} for term{rng.randrange(3000)}?" for _ in range(n)]
+
+
+def _throughput(enc: LocalEmbeddings, texts, batch_size: int, sort_window: int):
+    enc.sort_window = sort_window
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    t0 = time.perf_counter()
+    vecs = [v for out in enc.embed_batches(batches) for v in out]
+    return len(texts) / (time.perf_counter() - t0), np.asarray(vecs, dtype=np.float32)
+
+
+def run(backends, n_passages: int = 512, n_queries: int = 100, batch_size: int = 16, sort_window: int = 256,
+        threads: int = 0, max_seq_length: int = 0, model_name: str = "intfloat/e5-small-v2") -> dict:
+    texts, qs = passages(n_passages), questions(n_queries)
+    report, reference = {"model": model_name, "passages": n_passages, "batch_size": batch_size}, None
+    for backend in backends:
+        t0 = time.perf_counter()
+        enc = LocalEmbeddings(model_name, backend=backend, threads=threads, max_seq_length=max_seq_length)
+        load_secs = time.perf_counter() - t0
+        enc.embed_queries(qs[:4])   # warm up
+        unsorted_rate, _ = _throughput(enc, texts, batch_size, sort_window=1)
+        sorted_rate, vecs = _throughput(enc, texts, batch_size, sort_window=sort_window)
+        lat = []
+        for q in qs:
+            t1 = time.perf_counter()
+            enc.embed_queries([q])
+            lat.append(time.perf_counter() - t1)
+        out = {"load_secs": round(load_secs, 2),
+               "passages_per_sec": round(sorted_rate, 1), "passages_per_sec_unsorted": round(unsorted_rate, 1),
+               "query_p50_ms": round(percentile_ms(lat, 50), 2), "query_p99_ms": round(percentile_ms(lat, 99), 2)}
+        if reference is None:
+            reference = vecs
+        else:
+            cos = (vecs * reference).sum(axis=1)   # both unit-normalized
+            out.update(cosine_min=round(float(cos.min()), 5), cosine_mean=round(float(cos.mean()), 5))
+            out["speedup"] = round(sorted_rate / report[backends[0]]["passages_per_sec"], 2)
+        report[backend] = out
+    return report
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backends", nargs="+", default=list(LocalEmbeddings.BACKENDS), help="first one is the parity reference")
+    ap.add_argument("--model", default="intfloat/e5-small-v2")
+    ap.add_argument("--passages", type=int, default=512)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--batch_size", type=int, default=16, help="embed_generator --batch_size")
+    ap.add_argument("--sort_window", type=int, default=256)
+    ap.add_argument("--threads", type=int, default=0)
+    ap.add_argument("--max_seq_length", type=int, default=0)
+    ap.add_argument("--out", default=None, help="write the JSON report here (compare with benchmarks.compare)")
+    args = ap.parse_args()
+    report = run(args.backends, args.passages, args.queries, args.batch_size, args.sort_window,
+                 args.threads, args.max_seq_length, args.model)
+    print(json.dumps(save_report(report, args.out, "encoder_backends", vars(args)), indent=2))
@@ -0,0 +1,218 @@
+# benchmarks/fakes.py
+"""
+Deterministic local stand-ins for BigQuery, Vertex AI Gemini, the query encoder and GCS, with
+configurable latency. They plug into the real client wrappers (BigQueryVectorSearch(client=...),
+VertexLLM(generative_model=...), RAGService(embedder=...), anything taking a GCSClient), so
+benchmarks exercise the same code paths as production, minus the network.
+
+Latency is `ms` scaled by a seeded log-normal factor (`jitter` = its sigma), so a run with the
+same seed sleeps the same amounts in the same order.
+"""
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from src.shared.gcp_clients import GCSClient
+
+
+class Latency:
+    def __init__(self, ms: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.ms = ms
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_secs(self, scale: float = 1.0) -> float:
+        if self.ms <= 0:
+            return 0.0
+        with self._lock:
+            factor = self._rng.lognormvariate(0.0, self.jitter) if self.jitter > 0 else 1.0
+        return self.ms * scale * factor / 1000.0
+
+    def sleep(self, scale: float = 1.0):
+        secs = self.sample_secs(scale)
+        if secs > 0:
+            time.sleep(secs)
+
+
+def _hash_vec(text: str, dim: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+    v = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+# ---------- encoder ----------
+class FakeEncoder:
+    """LocalEmbeddings stand-in: hash-seeded unit vectors, `batch_ms` + `item_ms` per item per call."""
+    def __init__(self, dim: int = 384, batch_ms: float = 0.0, item_ms: float = 0.0, jitter: float = 0.0,
+                 seed: int = 0):
+        self.dim = dim
+        self.batch = Latency(batch_ms, jitter, seed)
+        self.item_ms = item_ms
+        self.calls = 0
+
+    def _encode(self, texts):
+        self.calls += 1
+        self.batch.sleep()
+        if self.item_ms > 0:
+            time.sleep(self.item_ms * len(texts) / 1000.0)
+        return [_hash_vec(t, self.dim).tolist() for t in texts]
+
+    def embed_queries(self, texts):
+        return self._encode(["query: " + t for t in texts])
+
+    def embed_passages(self, texts):
+        return self._encode(["passage: " + t for t in texts])
+
+    def embed_texts_sync(self, texts):
+        return self._encode(list(texts))
+
+
+# ---------- BigQuery ----------
+class FakeQueryJob:
+    def __init__(self, run):
+        self._run = run
+
+    def result(self):
+        return iter(self._run())
+
+
+class FakeBigQueryClient:
+    """
+    bigquery.Client stand-in for BigQueryVectorSearch: answers its dot-product / VECTOR_SEARCH SQL
+    by an exact matmul over an in-memory corpus (k is read from the SQL, filters are ignored),
+    after sleeping `latency` per job.
+    """
+    _K = re.compile(r"LIMIT (\d+)|top_k => (\d+)|<= (\d+)")
+
+    def __init__(self, matrix: np.ndarray, rows: List[Dict], latency: Latency | None = None):
+        self.matrix = np.asarray(matrix, dtype=np.float32)
+        self.rows = rows
+        self.latency = latency or Latency()
+        self.jobs = 0
+
+    def _top(self, q, k: int, with_vec: bool) -> List[Dict]:
+        scores = self.matrix @ np.asarray(q, dtype=np.float32)
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        out = []
+        for i in best.tolist():
+            row = {"id": self.rows[i]["id"], "title": self.rows[i].get("title"),
+                   "chunk_text": self.rows[i].get("chunk_text"), "dot": float(scores[i])}
+            if with_vec:
+                row["embedding"] = self.matrix[i].tolist()
+            out.append(row)
+        return out
+
+    def query(self, sql: str, job_config=None):
+        params = {p.name: p for p in (job_config.query_parameters if job_config else [])}
+        k = int(next(g for g in self._K.search(sql).groups() if g))
+        with_vec = "AS embedding," in sql or "chunk_text, embedding," in sql
+        self.jobs += 1
+
+        def run():
+            self.latency.sleep()
+            if "queries" in params:
+                out = []
+                for p in params["queries"].values:
+                    qid = p.struct_values["qid"]
+                    out += [{"qid": qid, **r} for r in self._top(p.struct_values["vec"].values, k, with_vec)]
+                return out
+            return self._top(params["query_vec"].values, k, with_vec)
+
+        return FakeQueryJob(run)
+
+
+# ---------- Gemini ----------
+class _Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    vertexai GenerativeModel stand-in for VertexLLM. A response takes
+    ttft (+ prefill_ms_per_1k_chars of prompt) and then answer_tokens / tokens_per_sec;
+    streamed responses sleep between chunks of `chunk_tokens`.
+    """
+    def __init__(self, ttft_ms: float = 0.0, tokens_per_sec: float = 0.0, answer_tokens: int = 120,
+                 prefill_ms_per_1k_chars: float = 0.0, chunk_tokens: int = 8, jitter: float = 0.0, seed: int = 0):
+        self.ttft = Latency(ttft_ms, jitter, seed)
+        self.tokens_per_sec = tokens_per_sec
+        self.answer_tokens = answer_tokens
+        self.prefill_ms_per_1k_chars = prefill_ms_per_1k_chars
+        self.chunk_tokens = chunk_tokens
+        self.prompt_chars = 0
+        self.calls = 0
+
+    def _first_token(self, contents):
+        prompt = "".join(contents) if isinstance(contents, list) else str(contents)
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        self.ttft.sleep()
+        if self.prefill_ms_per_1k_chars > 0:
+            time.sleep(self.prefill_ms_per_1k_chars * len(prompt) / 1e6)
+        return prompt
+
+    def _words(self, prompt: str) -> List[str]:
+        title = re.search(r"TITLE: (.*)", prompt)
+        cite = f"[{title.group(1).strip()}]" if title else "[no context]"
+        return [cite if i % 40 == 0 else f"w{i}" for i in range(self.answer_tokens)]
+
+    def generate_content(self, contents, generation_config=None, stream: bool = False):
+        prompt = self._first_token(contents)
+        words = self._words(prompt)
+        per_token = 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+        if not stream:
+            time.sleep(per_token * len(words))
+            return _Chunk(" ".join(words))
+
+        def chunks():
+            for i in range(0, len(words), self.chunk_tokens):
+                part = words[i:i + self.chunk_tokens]
+                if i:
+                    time.sleep(per_token * len(part))
+                yield _Chunk(" ".join(part) + " ")
+        return chunks()
+
+
+# ---------- GCS ----------
+class FakeGCS(GCSClient):
+    """GCSClient over a local directory: gs://bucket/path -> <root>/bucket/path, `open_ms` per open()."""
+    def __init__(self, root: str, open_ms: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        super().__init__()
+        self.root = os.path.abspath(root)
+        self.latency = Latency(open_ms, jitter, seed)
+
+    def _local(self, uri: str) -> str:
+        return os.path.join(self.root, uri[len("gs://"):]) if uri.startswith("gs://") else uri
+
+    def open(self, uri: str, mode: str = "r"):
+        self.latency.sleep()
+        return super().open(self._local(uri), mode)
+
+    def _fs(self, uri: str):
+        return super()._fs(self._local(uri))
+
+    def glob(self, pattern: str) -> List[str]:
+        prefix = os.path.join(self.root, "")
+        return sorted(("gs://" + p[len(prefix):]) if pattern.startswith("gs://") else p
+                      for p in super().glob(self._local(pattern)))
+
+
+def synthetic_chunks(n: int, dim: int = 384, seed: int = 0):
+    """(rows, matrix): arXiv-shaped chunk rows with clustered unit embeddings."""
+    from benchmarks.ann_recall import synthetic_corpus
+    rng = random.Random(seed)
+    words = [f"term{i}" for i in range(2000)]
+    rows = [{"id": f"{2000 + i // 10000:04d}.{i % 10000:05d}#0", "doc_id": f"{2000 + i // 10000:04d}.{i % 10000:05d}",
+             "title": f"Paper {i}", "chunk_index": 0,
+             "chunk_text": " ".join(rng.choice(words) for _ in range(150))} for i in range(n)]
+    return rows, synthetic_corpus(n, dim, seed=seed)
@@ -0,0 +1,117 @@
+# benchmarks/lexical_hybrid.py
+"""
+Latency and overlap with dense-only search for the BM25 retrieval modes.
+
+    # synthetic topical corpus (word vectors averaged into document embeddings)
+    python -m benchmarks.lexical_hybrid --n 200000 --k 10
+    # or a local index dir with BM25 files (python -m src.shared.lexical_index --index_dir ...)
+    python -m benchmarks.lexical_hybrid --index_dir data/index --queries queries.txt
+
+overlap@k is |top-k(mode) ∩ top-k(dense)| / k. Dense is the exact full scan.
+"""
+import argparse, json, os, tempfile, time
+
+import numpy as np
+
+from benchmarks.ann_recall import percentile_ms
+from benchmarks.compare import save_report
+from src.shared.lexical_index import LexicalIndex, build_bm25, rrf_fuse
+from src.shared.vector_store import LocalVectorSearch, _write_index
+
+
+def synthetic_text_corpus(n: int, dim: int = 64, vocab: int = 5000, topics: int = 100, words: int = 60,
+                          seed: int = 0):
+    """
+    Documents draw most words from one topic's vocabulary. A document's embedding is the normalized
+    mean of its word vectors, so lexical and dense relevance agree roughly, as they do for real text.
+    """
+    rng = np.random.default_rng(seed)
+    word_vecs = rng.normal(size=(vocab, dim)).astype(np.float32)
+    topic_words = rng.integers(0, vocab, size=(topics, 200))
+    rows, vecs = [], np.empty((n, dim), dtype=np.float32)
+    for i in range(n):
+        topic = rng.integers(0, topics)
+        ids = np.where(rng.random(words) < 0.7, rng.choice(topic_words[topic], words), rng.integers(0, vocab, words))
+        v = word_vecs[ids].mean(axis=0)
+        vecs[i] = v / np.linalg.norm(v)
+        rows.append({"id": f"{i}#0", "doc_id": str(i), "title": f"topic {topic}", "chunk_index": 0,
+                     "chunk_text": " ".join(f"w{w}" for w in ids)})
+    return rows, vecs, word_vecs
+
+
+def build_synthetic(n: int, out_dir: str, seed: int = 0):
+    rows, vecs, word_vecs = synthetic_text_corpus(n, seed=seed)
+    _write_index(zip(rows, vecs), out_dir)
+    build_bm25(out_dir)
+    return rows, word_vecs
+
+
+def synthetic_queries(rows, word_vecs, n_queries: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in rng.choice(len(rows), n_queries, replace=False):
+        words = rows[i]["chunk_text"].split()
+        picked = list(rng.choice(words, 4, replace=False))
+        v = word_vecs[[int(w[1:]) for w in picked]].mean(axis=0)
+        out.append((" ".join(picked), (v / np.linalg.norm(v)).astype(np.float32)))
+    return out
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def run(index_dir: str, queries, k: int = 10, candidates: int = 100) -> dict:
+    dense = LocalVectorSearch(index_dir)
+    lexical = LexicalIndex(index_dir, rows=dense)
+    modes = {
+        "dense": lambda text, v: dense.search(v, k=k),
+        "bm25_exhaustive": lambda text, v: lexical.search(text, k=k, prune=False),
+        "bm25": lambda text, v: lexical.search(text, k=k),
+        "hybrid_rrf": lambda text, v: rrf_fuse([dense.search(v, k=candidates), lexical.search(text, k=candidates)], k=k),
+        "rerank": lambda text, v: dense.search_rows(v, lexical.top_rows(text, candidates)[0], k=k),
+    }
+    lat = {m: [] for m in modes}
+    overlap = {m: [] for m in modes}
+    for text, v in queries:
+        truth, t = _timed(lambda: modes["dense"](text, v))
+        lat["dense"].append(t)
+        truth_ids = {h["id"] for h in truth}
+        for m, fn in modes.items():
+            if m == "dense":
+                continue
+            hits, t = _timed(lambda: fn(text, v))
+            lat[m].append(t)
+            overlap[m].append(len(truth_ids & {h["id"] for h in hits}) / max(len(truth_ids), 1))
+    report = {"n": len(dense), "queries": len(queries), "k": k, "candidates": candidates}
+    for m in modes:
+        report[m] = {"p50_ms": round(percentile_ms(lat[m], 50), 3), "p99_ms": round(percentile_ms(lat[m], 99), 3)}
+        if overlap[m]:
+            report[m]["overlap_at_k"] = round(float(np.mean(overlap[m])), 3)
+    return report
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index_dir", default=None, help="local index dir with BM25 files")
+    ap.add_argument("--queries", default=None, help="with --index_dir: text file, one query per line")
+    ap.add_argument("--embed_model", default="intfloat/e5-small-v2", help="with --index_dir: query encoder")
+    ap.add_argument("--n", type=int, default=100000)
+    ap.add_argument("--n_queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--candidates", type=int, default=100)
+    ap.add_argument("--out", default=None, help="write the JSON report here (compare with benchmarks.compare)")
+    args = ap.parse_args()
+    if args.index_dir:
+        from src.shared.gcp_clients import LocalEmbeddings
+        texts = [l.strip() for l in open(args.queries) if l.strip()][: args.n_queries]
+        vecs = np.asarray(LocalEmbeddings(args.embed_model).embed_queries(texts), dtype=np.float32)
+        report = run(args.index_dir, list(zip(texts, vecs)), args.k, args.candidates)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            rows, word_vecs = build_synthetic(args.n, os.path.join(tmp, "index"))
+            qs = synthetic_queries(rows, word_vecs, args.n_queries)
+            report = run(os.path.join(tmp, "index"), qs, args.k, args.candidates)
+    print(json.dumps(save_report(report, args.out, "lexical_hybrid", vars(args)), indent=2))
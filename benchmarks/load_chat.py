@@ -0,0 +1,222 @@
+# benchmarks/load_chat.py
+"""
+Open-loop load test of the chat API, in process, against latency-injecting fakes (benchmarks/fakes.py).
+
+    python -m benchmarks.load_chat --rps 20 --duration 30 --bq_ms 250 --llm_ttft_ms 400 --llm_tps 100
+    python -m benchmarks.load_chat --backend local --rps 100 --out bench/load.json
+
+Arrivals are Poisson at --rps and do not wait for earlier responses (open loop), so queueing
+shows up as latency instead of silently lowering the offered load. Latency is measured from each
+request's scheduled send time. Per-stage p50/p95/p99 come from the API's own `request` log lines
+(core/telemetry.py), keyed by X-Request-ID.
+
+By default the app is served by uvicorn on a loopback port in a background thread, so a server
+that blocks its event loop cannot also slow down the load generator. `--transport asgi` calls the
+app in the generator's own loop instead (no sockets; offered_rps then shows any stall).
+
+Everything between the HTTP layer and the fakes is the production code: services, micro-batcher,
+semantic cache, context packer, BigQueryVectorSearch (or LocalVectorSearch) and VertexLLM.
+"""
+import argparse, asyncio, json, logging, os, random, tempfile, threading, time
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+from benchmarks.compare import save_report
+from benchmarks.fakes import FakeBigQueryClient, FakeEncoder, FakeGenerativeModel, Latency, synthetic_chunks
+from src.agent_api.core.admission import PipelineLimits
+from src.agent_api.core.config import settings
+from src.agent_api.core.context_packer import ContextPacker
+from src.agent_api.core.embed_batcher import EmbeddingBatcher
+from src.agent_api.core.rag_service import RAGService
+from src.agent_api.core.semantic_cache import SemanticCache
+from src.agent_api.core.services import Services
+from src.agent_api.core.telemetry import logger
+from src.agent_api.main import create_app
+from src.shared.gcp_clients import BigQueryVectorSearch, VertexLLM
+
+
+def build_fake_services(args, tmp: str) -> Services:
+    rows, matrix = synthetic_chunks(args.corpus, args.dim, seed=args.seed)
+    # stage limits from the same env vars as the API (ENCODE_CONCURRENCY, CHAT_MAX_IN_FLIGHT, ...)
+    limits = PipelineLimits.from_settings(settings)
+    embedder = FakeEncoder(args.dim, batch_ms=args.embed_ms, item_ms=args.embed_item_ms, jitter=args.jitter,
+                           seed=args.seed)
+    if args.backend == "local":
+        from src.shared.vector_store import LocalVectorSearch, _write_index
+        _write_index(zip(rows, matrix), os.path.join(tmp, "index"))
+        searcher = LocalVectorSearch(os.path.join(tmp, "index"))
+    else:
+        client = FakeBigQueryClient(matrix, rows, Latency(args.bq_ms, args.jitter, args.seed + 1))
+        searcher = BigQueryVectorSearch("bench", "bench.arxiv_demo.chunks", client=client)
+    llm = VertexLLM("bench", "local", generative_model=FakeGenerativeModel(
+        ttft_ms=args.llm_ttft_ms, tokens_per_sec=args.llm_tps, answer_tokens=args.answer_tokens,
+        prefill_ms_per_1k_chars=args.llm_prefill_ms, jitter=args.jitter, seed=args.seed + 2),
+        executor=limits.llm.executor)
+    semantic_cache = SemanticCache(threshold=0.95, capacity=1000, ttl_secs=3600) if args.semantic_cache else None
+    packer = None
+    if args.context_tokens > 0:
+        packer = ContextPacker(token_budget=args.context_tokens)
+        searcher.return_vectors = True
+    batcher = EmbeddingBatcher(embedder, max_batch=32, max_wait_ms=5, max_queue=100_000,
+                               executor=limits.encode.executor)
+    rag = RAGService(embedder=embedder, searcher=searcher, llm=llm, semantic_cache=semantic_cache,
+                     batcher=batcher, packer=packer, limits=limits)
+    return Services(rag=rag)
+
+
+def questions(n: int, distinct: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    pool = [f"what is known about term{rng.randrange(2000)} and term{rng.randrange(2000)} (variant {i})?"
+            for i in range(distinct)]
+    return [rng.choice(pool) for _ in range(n)]
+
+
+class _RequestLog(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    def emit(self, record):
+        if record.getMessage() == "request" and getattr(record, "request_id", None):
+            self.stages[record.request_id] = record.fields.get("stages_ms", {})
+
+
+def _pcts(samples_ms: List[float]) -> Dict:
+    if not samples_ms:
+        return {"count": 0}
+    a = np.asarray(samples_ms)
+    return {"count": int(a.size), "p50_ms": round(float(np.percentile(a, 50)), 2),
+            "p95_ms": round(float(np.percentile(a, 95)), 2), "p99_ms": round(float(np.percentile(a, 99)), 2),
+            "max_ms": round(float(a.max()), 2)}
+
+
+@asynccontextmanager
+async def _asgi_client(app, timeout: float):
+    async with app.router.lifespan_context(app):
+        while getattr(app.state, "services", None) is None:
+            if getattr(app.state, "startup_error", None):
+                raise RuntimeError(app.state.startup_error)
+            await asyncio.sleep(0.01)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                     timeout=timeout) as client:
+            yield client
+
+
+@asynccontextmanager
+async def _http_client(app, timeout: float):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError("uvicorn failed to start")
+            await asyncio.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=timeout, limits=limits) as client:
+            while (await client.get("/healthz")).status_code != 200:
+                await asyncio.sleep(0.01)
+            yield client
+    finally:
+        server.should_exit = True
+        await asyncio.to_thread(thread.join, 10)
+
+
+async def run_load(app, rps: float, duration: float, path: str = "/v1/chat", k: int = 5, seed: int = 0,
+                   distinct_questions: int = 10_000, timeout: float = 120.0, transport: str = "http") -> Dict:
+    """Drive `app` open-loop at `rps` for `duration` seconds; returns throughput and latency percentiles."""
+    handler = _RequestLog()
+    logger.addHandler(handler)
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    connect = _http_client if transport == "http" else _asgi_client
+    try:
+        async with connect(app, timeout) as client:
+            return await _drive(client, handler, rps, duration, path, k, seed, distinct_questions)
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+
+
+async def _drive(client, handler, rps, duration, path, k, seed, distinct_questions) -> Dict:
+    rng = random.Random(seed)
+    results: List[tuple] = []
+
+    async def one(i: int, question: str, scheduled: float):
+        rid = f"bench-{i}"
+        try:
+            r = await client.post(path, json={"question": question, "k": k}, headers={"X-Request-ID": rid})
+            status, cache = r.status_code, r.headers.get("X-Cache")
+        except Exception as e:
+            status, cache = type(e).__name__, None
+        results.append((rid, status, cache, time.perf_counter() - scheduled))
+
+    qs = questions(int(rps * duration * 2) + 10, distinct_questions, seed)
+    start = time.perf_counter()
+    offset, tasks = 0.0, []
+    while offset < duration:
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(len(tasks), qs[len(tasks)], start + offset)))
+        offset += rng.expovariate(rps)
+    send_secs = time.perf_counter() - start
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r[1] == 200]
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r[1])] = statuses.get(str(r[1]), 0) + 1
+    stages: Dict[str, List[float]] = {}
+    for rid, *_ in ok:
+        for stage, ms in handler.stages.get(rid, {}).items():
+            stages.setdefault(stage, []).append(ms)
+    return {
+        "offered_rps": round(len(results) / send_secs, 2) if send_secs else 0.0,
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "requests": len(results), "ok": len(ok), "statuses": statuses,
+        "cache_hits": sum(1 for r in ok if r[2] == "hit"),
+        "coalesced": sum(1 for r in ok if r[2] == "coalesced"),
+        "latency": _pcts([r[3] * 1000 for r in ok]),
+        "stages": {s: _pcts(v) for s, v in sorted(stages.items())},
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rps", type=float, default=20)
+    ap.add_argument("--duration", type=float, default=20, help="seconds of arrivals")
+    ap.add_argument("--path", default="/v1/chat")
+    ap.add_argument("--transport", choices=["http", "asgi"], default="http")
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--backend", choices=["bigquery", "local"], default="bigquery")
+    ap.add_argument("--corpus", type=int, default=20000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--distinct_questions", type=int, default=10000)
+    ap.add_argument("--embed_ms", type=float, default=8, help="encoder cost per batch")
+    ap.add_argument("--embed_item_ms", type=float, default=0.5, help="encoder cost per question")
+    ap.add_argument("--bq_ms", type=float, default=250, help="BigQuery job latency")
+    ap.add_argument("--llm_ttft_ms", type=float, default=400, help="Gemini time to first token")
+    ap.add_argument("--llm_tps", type=float, default=150, help="Gemini output tokens/sec")
+    ap.add_argument("--llm_prefill_ms", type=float, default=2, help="extra ms per 1k prompt chars")
+    ap.add_argument("--answer_tokens", type=int, default=150)
+    ap.add_argument("--jitter", type=float, default=0.3, help="log-normal sigma applied to every latency")
+    ap.add_argument("--context_tokens", type=int, default=0, help="ContextPacker budget (CONTEXT_TOKEN_BUDGET); 0 = fixed limits")
+    ap.add_argument("--semantic_cache", action="store_true")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="write the JSON report here (compare with benchmarks.compare)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        services = build_fake_services(args, tmp)
+        app = create_app(services_factory=lambda: services)
+        report = asyncio.run(run_load(app, args.rps, args.duration, args.path, args.k, args.seed,
+                                      args.distinct_questions, transport=args.transport))
+    doc = save_report(report, args.out, "load_chat", vars(args))
+    print(json.dumps(doc, indent=2))
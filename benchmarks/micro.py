@@ -0,0 +1,138 @@
+# benchmarks/micro.py
+"""
+Micro-benchmarks of the pipeline hot paths, for before/after comparisons of small changes.
+
+    python -m benchmarks.micro --out bench/micro.json
+    python -m benchmarks.compare bench/micro_main.json bench/micro.json
+
+chunking:  embed_generator.chunk_text on an abstract-sized and a full-text-sized document
+cleaning:  data_cleaner.clean_record and date_key on raw arXiv-shaped records
+readers:   the JSONL/Parquet readers of each stage, over FakeGCS (local files, optional open latency)
+encoder:   LocalEmbeddings passages/sec per batch size (skipped if sentence-transformers is missing)
+
+Each case is timed like timeit: loop until `min_time` has passed, best of `repeat` runs.
+"""
+import argparse, json, os, random, tempfile, time
+from typing import Callable, Dict
+
+from benchmarks.compare import save_report
+from benchmarks.fakes import FakeGCS, synthetic_chunks
+from src.data_pipeline import data_cleaner, embed_generator
+from src.shared import embed_parquet, vector_store
+
+
+def bench(fn: Callable[[], object], min_time: float = 0.2, repeat: int = 3) -> Dict:
+    """Best-of-`repeat` per-call time of fn(); each run loops until `min_time` seconds have passed."""
+    best = float("inf")
+    for _ in range(repeat):
+        n, t0 = 0, time.perf_counter()
+        while True:
+            fn()
+            n += 1
+            elapsed = time.perf_counter() - t0
+            if elapsed >= min_time:
+                break
+        best = min(best, elapsed / n)
+    return {"per_op_us": round(best * 1e6, 3), "ops_per_sec": round(1.0 / best, 1)}
+
+
+def _words(rng: random.Random, n: int) -> str:
+    return " ".join(f"term{rng.randrange(5000)}" for _ in range(n))
+
+
+def raw_records(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [{"id": f"{2000 + i // 10000:04d}.{i % 10000:05d}", "title": f"  Paper {i}\n",
+             "abstract": "  " + _words(rng, 160).replace(" ", "  \n ", 20) + "  ",
+             "categories": "cs.CL cs.LG", "update_date": "2023-%02d-%02d" % (1 + i % 12, 1 + i % 28),
+             "authors": "A. Author and B. Author"} for i in range(n)]
+
+
+def bench_text(min_time: float, seed: int = 0) -> Dict:
+    rng = random.Random(seed)
+    abstract, full_text = _words(rng, 180), _words(rng, 6000)
+    recs = raw_records(256, seed)
+    it = iter(range(1 << 62))
+
+    def clean():
+        return data_cleaner.clean_record(recs[next(it) & 255])
+    return {
+        "chunk_text_abstract": bench(lambda: embed_generator.chunk_text(abstract), min_time),
+        "chunk_text_full_text": bench(lambda: embed_generator.chunk_text(full_text), min_time),
+        "clean_record": bench(clean, min_time),
+        "date_key": bench(lambda: data_cleaner.date_key("2023-07-14"), min_time),
+    }
+
+
+def _time_rows(make_iter: Callable[[], object]) -> Dict:
+    t0 = time.perf_counter()
+    n = sum(1 for _ in make_iter())
+    secs = time.perf_counter() - t0
+    return {"rows": n, "read_secs": round(secs, 4), "rows_per_sec": round(n / secs, 1) if secs else 0.0}
+
+
+def bench_readers(n: int, dim: int, root: str, open_ms: float = 0.0) -> Dict:
+    """Write raw, store and embeddings artifacts under `root` and time each stage's reader over them."""
+    gcs = FakeGCS(root, open_ms=open_ms)
+    rows, matrix = synthetic_chunks(n, dim)
+    raw_uri, store_uri = "gs://bench/raw.jsonl", "gs://bench/store.jsonl"
+    emb_uri, pq_uri = "gs://bench/emb.jsonl", "gs://bench/emb.parquet"
+    os.makedirs(os.path.join(root, "bench"), exist_ok=True)
+    data_cleaner.write_jsonl_gcs(gcs, raw_uri, raw_records(n))
+    with embed_generator.JsonlSink(gcs, emb_uri, store_uri) as sink:
+        sink.write(rows, matrix.tolist())
+    with embed_parquet.ParquetSink(gcs, pq_uri) as sink:
+        sink.write(rows, matrix.tolist())
+
+    out = {
+        "data_cleaner_iter_jsonl": _time_rows(lambda: data_cleaner.iter_jsonl_gcs(gcs, raw_uri)),
+        "embed_generator_iter_jsonl": _time_rows(lambda: embed_generator.iter_jsonl_gcs(gcs, store_uri)),
+        "vector_store_iter_jsonl": _time_rows(lambda: vector_store.iter_jsonl(gcs, emb_uri)),
+    }
+    try:
+        from src.data_pipeline.vector_db_loader import iter_embeddings
+    except ImportError as e:   # google-cloud-aiplatform is a pipeline-only dependency
+        out["vector_db_loader"] = {"skipped": str(e)}
+    else:
+        out["vector_db_loader_iter_embeddings_jsonl"] = _time_rows(lambda: iter_embeddings(gcs, emb_uri))
+        out["vector_db_loader_iter_embeddings_parquet"] = _time_rows(lambda: iter_embeddings(gcs, pq_uri))
+    return out
+
+
+def bench_encoder(model_name: str, batch_sizes=(1, 8, 32, 128), n: int = 256, seed: int = 0) -> Dict:
+    try:
+        from src.shared.gcp_clients import LocalEmbeddings
+        enc = LocalEmbeddings(model_name)
+    except ImportError as e:
+        return {"skipped": str(e)}
+    rng = random.Random(seed)
+    texts = [_words(rng, rng.randrange(20, 180)) for _ in range(n)]
+    enc.embed_passages(texts[:8])   # load weights / warm up
+    out = {"model": model_name}
+    for bs in batch_sizes:
+        t0 = time.perf_counter()
+        for i in range(0, n, bs):
+            enc.embed_passages(texts[i:i + bs])
+        secs = time.perf_counter() - t0
+        out[f"batch_{bs}"] = {"passages_per_sec": round(n / secs, 1), "per_batch_ms": round(secs * 1000 * bs / n, 2)}
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--min_time", type=float, default=0.2, help="seconds per timing run")
+    ap.add_argument("--rows", type=int, default=20000, help="rows per reader artifact")
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--open_ms", type=float, default=0.0, help="FakeGCS latency per open()")
+    ap.add_argument("--embed_model", default="intfloat/e5-small-v2")
+    ap.add_argument("--skip_encoder", action="store_true")
+    ap.add_argument("--out", default=None, help="write the JSON report here (compare with benchmarks.compare)")
+    args = ap.parse_args()
+
+    report = {"text": bench_text(args.min_time)}
+    with tempfile.TemporaryDirectory() as tmp:
+        report["readers"] = bench_readers(args.rows, args.dim, tmp, args.open_ms)
+    if not args.skip_encoder:
+        report["encoder"] = bench_encoder(args.embed_model)
+    doc = save_report(report, args.out, "micro", vars(args))
+    print(json.dumps(doc, indent=2))
@@ -0,0 +1,83 @@
+# benchmarks/quant_recall.py
+"""
+Recall loss against memory saved for the int8 and binary codes (src/shared/quantize.py).
+
+    # synthetic clustered 384-dim vectors
+    python -m benchmarks.quant_recall --n 200000 --rescore 0 2 5 10 20
+    # or an index dir with codes (python -m src.shared.quantize --index_dir data/index)
+    python -m benchmarks.quant_recall --index_dir data/index --out bench/quant.json
+
+recall@k is against exact float32 search. bytes_per_vector is what each query scans; rescoring
+also reads k * rescore float rows per query. compression_ratio is float32 bytes / code bytes.
+"""
+import argparse, json, os, tempfile, time
+
+import numpy as np
+
+from benchmarks.ann_recall import percentile_ms, synthetic_corpus, write_jsonl_corpus
+from benchmarks.compare import save_report
+from src.shared.quantize import QuantizedVectorSearch, build_quantized
+from src.shared.vector_store import LocalVectorSearch, build_index
+
+
+def run(index_dir: str, rescores, k: int = 10, n_queries: int = 200, seed: int = 1):
+    exact = LocalVectorSearch(index_dir)
+    n, dim = exact.matrix.shape
+    rng = np.random.default_rng(seed)
+    # queries: perturbed corpus vectors, as in ann_recall
+    q = np.asarray(exact.matrix[rng.choice(n, n_queries, replace=False)], dtype=np.float32)
+    q = q + 0.3 * rng.normal(size=q.shape).astype(np.float32) / np.sqrt(dim)
+    q = (q / np.linalg.norm(q, axis=1, keepdims=True)).astype(np.float32)
+
+    truth, exact_lat = [], []
+    for v in q:
+        t0 = time.perf_counter()
+        idx, _ = exact._scan(v[None, :], k)
+        exact_lat.append(time.perf_counter() - t0)
+        truth.append(set(idx[0].tolist()))
+
+    report = {
+        "n": n, "dim": dim, "k": k, "queries": n_queries,
+        "float32": {"bytes_per_vector": 4 * dim, "p50_ms": percentile_ms(exact_lat, 50),
+                    "p99_ms": percentile_ms(exact_lat, 99)},
+        # BigQuery's ARRAY<FLOAT64> column, for reference
+        "float64_bytes_per_vector": 8 * dim,
+    }
+    for mode in QuantizedVectorSearch.MODES:
+        s = QuantizedVectorSearch(index_dir, mode=mode)
+        per_vector = s.memory_bytes() / n
+        runs = []
+        for rescore in rescores:
+            s.rescore = rescore
+            lat, recall = [], []
+            for v, t in zip(q, truth):
+                t0 = time.perf_counter()
+                rows, _ = s._search_one(v, k)
+                lat.append(time.perf_counter() - t0)
+                recall.append(len(t & set(rows.tolist())) / k)
+            runs.append({"rescore": rescore, f"recall@{k}": float(np.mean(recall)),
+                         "p50_ms": percentile_ms(lat, 50), "p99_ms": percentile_ms(lat, 99)})
+        report[mode] = {"bytes_per_vector": round(per_vector, 2),
+                        "compression_ratio": round(4 * dim / per_vector, 1), "runs": runs}
+    return report
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index_dir", default=None, help="existing index dir with codes; omit to use a synthetic corpus")
+    ap.add_argument("--n", type=int, default=100_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--rescore", type=int, nargs="+", default=[0, 2, 5, 10, 20], help="candidates per result")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--out", default=None, help="write the JSON report here (compare with benchmarks.compare)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_dir = args.index_dir
+        if index_dir is None:
+            index_dir = os.path.join(tmp, "index")
+            build_index(*write_jsonl_corpus(synthetic_corpus(args.n, args.dim), tmp), index_dir)
+            build_quantized(index_dir)
+        report = run(index_dir, args.rescore, k=args.k, n_queries=args.queries)
+    print(json.dumps(save_report(report, args.out, "quant_recall", vars(args)), indent=2))
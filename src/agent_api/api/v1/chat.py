@@ -1,15 +1,114 @@
 # src/agent_api/api/v1/chat.py
-from fastapi import APIRouter, HTTPException
-from src.agent_api.models.chat import ChatRequest, ChatResponse
-from src.agent_api.core.rag_service import RAGService
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from src.agent_api.models.chat import ChatBatchItem, ChatBatchRequest, ChatBatchResponse, ChatRequest, ChatResponse
+from src.agent_api.core.admission import OverloadedError
+from src.agent_api.core.services import Services, get_services
 from src.agent_api.core.config import settings
+from src.agent_api.core.telemetry import log
 
 router = APIRouter()
 
+
+def _overloaded(e: OverloadedError) -> HTTPException:
+    # 429: too many requests in flight; 503: a stage could not finish within the deadline budget
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+
+
 @router.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
+async def chat(req: ChatRequest, response: Response, services: Services = Depends(get_services)):
     if not settings.project or not settings.bq_table:
         raise HTTPException(status_code=500, detail="Server misconfigured: GCP_PROJECT / BQ_TABLE missing.")
-    rag = RAGService()
-    res = await rag.answer(req.question, k=req.k or 5)
+    try:
+        res = await services.rag.answer(req.question, k=req.k or 5, filters=req.filters(),
+                                        retrieval_mode=req.retrieval_mode or settings.retrieval_mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OverloadedError as e:
+        raise _overloaded(e)
+    response.headers["X-Cache"] = res.pop("cache", "miss")
+    context = res.pop("context", None)
+    if context:
+        response.headers["X-Context-Tokens"] = str(context["context_tokens"])
+        response.headers["X-Context-Tokens-Saved"] = str(context["tokens_saved"])
     return ChatResponse(**res)
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request, services: Services = Depends(get_services)):
+    """
+    Server-sent events: `retrieval` (matches + citations) as soon as search finishes,
+    then `token` events as Gemini generates, then `done` (or `error`).
+    """
+    try:
+        # refuse with a status code while we still can; a later shed arrives as an `error` event
+        services.rag.limits.requests.check()
+    except OverloadedError as e:
+        raise _overloaded(e)
+
+    async def events():
+        stream = services.rag.answer_stream(req.question, k=req.k or 5, filters=req.filters(),
+                                            retrieval_mode=req.retrieval_mode or settings.retrieval_mode)
+        try:
+            async for event, data in stream:
+                if await request.is_disconnected():
+                    log("rag.client_disconnected")
+                    break
+                yield _sse(event, data)
+        except (ValueError, OverloadedError) as e:
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            # closes VertexLLM.generate_stream, which closes the Gemini stream
+            await stream.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _batch_item(i: int, res: dict) -> ChatBatchItem:
+    res = dict(res)
+    res.pop("cache", None)
+    res.pop("context", None)
+    return ChatBatchItem(index=i, **res)
+
+@router.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(req: ChatBatchRequest, services: Services = Depends(get_services)):
+    """
+    Many questions in one call: one embedding pass, one search job, then Gemini calls with
+    bounded concurrency. Each item carries its answer or its own error. With "stream": true
+    the response is NDJSON, one item per line in completion order.
+    """
+    if len(req.questions) > settings.chat_batch_max:
+        raise HTTPException(status_code=413, detail=f"At most {settings.chat_batch_max} questions per batch.")
+    try:
+        services.rag.limits.requests.check()
+    except OverloadedError as e:
+        raise _overloaded(e)
+    results = services.rag.answer_many(req.questions, k=req.k or 5, filters=req.filters(),
+                                       concurrency=settings.chat_batch_concurrency)
+
+    if req.stream:
+        async def lines():
+            try:
+                async for i, res in results:
+                    yield _batch_item(i, res).model_dump_json() + "\n"
+            except (ValueError, OverloadedError) as e:
+                yield json.dumps({"error": str(e)}) + "\n"
+            finally:
+                await results.aclose()
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    try:
+        items = [_batch_item(i, res) async for i, res in results]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OverloadedError as e:
+        raise _overloaded(e)
+    finally:
+        # an error or cancellation part way must not leave generation tasks holding the semaphore
+        await results.aclose()
+    return ChatBatchResponse(results=sorted(items, key=lambda it: it.index))
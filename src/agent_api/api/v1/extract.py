@@ -0,0 +1,43 @@
+# src/agent_api/api/v1/extract.py
+from fastapi import APIRouter, Depends, HTTPException
+
+from src.agent_api.core.admission import OverloadedError
+from src.agent_api.core.extract_service import NotFoundError
+from src.agent_api.core.services import Services, get_services
+from src.agent_api.models.extract import ExtractRequest, ExtractResponse, SummarizeRequest, SummarizeResponse
+
+router = APIRouter()
+
+
+def _extract_service(services: Services):
+    if services.extract is None:
+        raise HTTPException(status_code=503, detail="Extraction service is not configured.")
+    return services.extract
+
+
+@router.post("/extract", response_model=ExtractResponse)
+async def extract(req: ExtractRequest, services: Services = Depends(get_services)):
+    """Entities + sentiment: precomputed row if one exists, otherwise computed once and stored."""
+    try:
+        res = await _extract_service(services).extract(doc_id=req.id, text=req.text, title=req.title)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except NotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except OverloadedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+    return ExtractResponse(**res)
+
+
+@router.post("/summarize", response_model=SummarizeResponse)
+async def summarize(req: SummarizeRequest, services: Services = Depends(get_services)):
+    try:
+        res = await _extract_service(services).summarize(doc_id=req.id, text=req.text, title=req.title,
+                                                         max_tokens=req.max_tokens)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except NotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except OverloadedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+    return SummarizeResponse(**res)
@@ -0,0 +1,194 @@
+# src/agent_api/core/admission.py
+"""
+Admission control for the chat pipeline: a cap on requests in flight, a deadline budget per
+request, and a bounded limiter (with its own thread pool) per stage.
+
+    limits = PipelineLimits(encode=2, search=8, llm=16, max_in_flight=64, deadline_secs=20)
+    with limits.requests.admit(), deadline(limits.deadline_secs):   # 429 beyond max_in_flight
+        vec = await limits.encode.run(embedder.embed_queries, [q])  # 503 if the wait would overrun the deadline
+        async with limits.llm.slot():
+            text = await llm.generate(prompt)
+
+A request is shed before any work is queued for it: waiting longer than its budget would only
+produce a timeout after the work was done. The Retry-After hint is the expected wait.
+"""
+import asyncio
+import contextvars
+import functools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from src.agent_api.core.telemetry import log, observe_stage
+
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+
+class OverloadedError(RuntimeError):
+    """Raised instead of queueing work; routes answer status_code with a Retry-After header."""
+    def __init__(self, message: str, status_code: int = 503, retry_after: float = 1.0):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> dict:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+@contextmanager
+def deadline(budget_secs: float | None):
+    """Deadline for the current request (and tasks started from it); None or 0 = no deadline."""
+    token = _deadline.set(time.monotonic() + budget_secs if budget_secs else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left in the current request's budget, or None without a deadline."""
+    d = _deadline.get()
+    return None if d is None else d - time.monotonic()
+
+
+class _Ewma:
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.value: float | None = None
+
+    def observe(self, x: float):
+        self.value = x if self.value is None else self.value + self.alpha * (x - self.value)
+
+
+class RequestLimiter:
+    """At most max_in_flight requests at once; the next one gets 429 immediately."""
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._latency = _Ewma()
+
+    def check(self):
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            log("admission.rejected", in_flight=self.in_flight)
+            raise OverloadedError(f"too many requests in flight ({self.in_flight})", status_code=429,
+                                  retry_after=self._latency.value or 1.0)
+
+    @contextmanager
+    def admit(self):
+        self.check()
+        self.in_flight += 1
+        self.admitted += 1
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._latency.observe(time.perf_counter() - t0)
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "max_in_flight": self.max_in_flight,
+                "admitted": self.admitted, "rejected": self.rejected}
+
+
+class StageLimiter:
+    """
+    One pipeline stage: at most `limit` calls run at once, on a dedicated pool of `limit` threads
+    for blocking calls (run) or as async calls holding a slot (slot). Waiters are served FIFO.
+    A call is shed (OverloadedError, 503) when max_queue calls are already waiting, when the
+    expected wait (waiters ahead / limit * average service time) exceeds the request's remaining
+    deadline, or when the deadline passed while it waited.
+    """
+    def __init__(self, name: str, limit: int, max_queue: int = 256):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix=name)
+        self._sem = asyncio.Semaphore(limit)
+        self._service = _Ewma()
+        self.waiting = 0
+        self.active = 0
+        self.calls = 0
+        self.shed = 0
+
+    def expected_wait(self) -> float:
+        if self.active < self.limit and self.waiting == 0:
+            return 0.0
+        return (self.waiting + 1) / self.limit * (self._service.value or 0.0)
+
+    def _shed(self, reason: str, retry_after: float):
+        self.shed += 1
+        log("admission.shed", stage=self.name, reason=reason, waiting=self.waiting)
+        raise OverloadedError(f"{self.name} overloaded: {reason}", status_code=503, retry_after=retry_after)
+
+    @asynccontextmanager
+    async def slot(self):
+        self.calls += 1
+        wait, budget = self.expected_wait(), remaining()
+        if self.max_queue and self.waiting >= self.max_queue:
+            self._shed(f"{self.waiting} calls waiting", wait)
+        if budget is not None and wait > budget:
+            self._shed(f"expected wait {wait:.2f}s exceeds the {max(budget, 0.0):.2f}s left", wait)
+        t0 = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._sem.acquire()
+        finally:
+            self.waiting -= 1
+        observe_stage(f"{self.name}_wait", time.perf_counter() - t0)
+        try:
+            budget = remaining()
+            if budget is not None and budget <= 0:
+                self._shed("deadline passed while queued", self.expected_wait())
+            t1 = time.perf_counter()
+            self.active += 1
+            try:
+                yield
+            finally:
+                self.active -= 1
+                self._service.observe(time.perf_counter() - t1)
+        finally:
+            self._sem.release()
+
+    async def run(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) on this stage's threads, with the caller's context (request id, timings)."""
+        async with self.slot():
+            call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+            return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "active": self.active, "waiting": self.waiting, "calls": self.calls,
+                "shed": self.shed, "avg_service_ms": 1000.0 * (self._service.value or 0.0)}
+
+
+class PipelineLimits:
+    """Request cap, deadline budget and the encode / search / llm stage limiters of one RAGService."""
+    STAGES = ("encode", "search", "llm")
+
+    def __init__(self, encode: int = 2, search: int = 8, llm: int = 16, max_in_flight: int = 64,
+                 deadline_secs: float = 20.0, max_queue: int = 256):
+        self.requests = RequestLimiter(max_in_flight)
+        self.deadline_secs = deadline_secs
+        self.encode = StageLimiter("encode", encode, max_queue)
+        self.search = StageLimiter("search", search, max_queue)
+        self.llm = StageLimiter("llm", llm, max_queue)
+
+    @classmethod
+    def from_settings(cls, s) -> "PipelineLimits":
+        return cls(s.encode_concurrency, s.search_concurrency, s.llm_concurrency, s.chat_max_in_flight,
+                   s.chat_deadline_secs, s.stage_queue_max)
+
+    def close(self):
+        for name in self.STAGES:
+            getattr(self, name).close()
+
+    def stats(self) -> dict:
+        return {"requests": self.requests.stats(), **{name: getattr(self, name).stats() for name in self.STAGES}}
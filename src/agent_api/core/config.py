@@ -7,9 +7,71 @@ class Settings(BaseSettings):
     project: str = Field(default_factory=lambda: os.environ.get("GCP_PROJECT", "skillful-flow-470023-c0"))
     location: str = Field(default_factory=lambda: os.environ.get("GCP_REGION", "us-central1"))
     bq_table: str = Field(default_factory=lambda: os.environ.get("BQ_TABLE", "skillful-flow-470023-c.arxiv_demo.chunks"))  
+    embed_model: str = Field(default_factory=lambda: os.environ.get("EMBED_MODEL", "intfloat/e5-small-v2"))
+    # Query encoder runtime: "torch", "onnx" or "onnx-int8" (exported once into EMBED_ONNX_DIR)
+    embed_backend: str = Field(default_factory=lambda: os.environ.get("EMBED_BACKEND", "torch"))
+    embed_threads: int = int(os.environ.get("EMBED_THREADS", "0"))
+    embed_max_seq_length: int = int(os.environ.get("EMBED_MAX_SEQ_LENGTH", "0"))
+    embed_onnx_dir: str = Field(default_factory=lambda: os.environ.get("EMBED_ONNX_DIR", ""))
+    # Prebuilt encoder dir (python -m src.shared.model_snapshot); the API image sets it
+    embed_snapshot_dir: str = Field(default_factory=lambda: os.environ.get("EMBED_SNAPSHOT_DIR", ""))
     gemini_model: str = Field(default_factory=lambda: os.environ.get("GEMINI_MODEL", "gemini-2.5-flash-lite"))
+    # "bigquery" (SQL dot product), "local" (exact, src/shared/vector_store.py), "ivfpq" (src/shared/ann_index.py)
+    # or "int8" / "binary" (quantized codes + exact rescoring, src/shared/quantize.py)
+    vector_backend: str = Field(default_factory=lambda: os.environ.get("VECTOR_BACKEND", "bigquery"))
+    local_index_dir: str = Field(default_factory=lambda: os.environ.get("LOCAL_INDEX_DIR", "data/index"))
+    # BigQuery backend: "dot" (exact scan) or "vector_search" (VECTOR_SEARCH over a vector index)
+    bq_search_mode: str = Field(default_factory=lambda: os.environ.get("BQ_SEARCH_MODE", "dot"))
+    bq_cache_ttl_secs: float = float(os.environ.get("BQ_CACHE_TTL_SECS", "300"))
+    ann_nprobe: int = int(os.environ.get("ANN_NPROBE", "16"))
+    # int8 / binary backends: candidates rescored exactly per result (k * QUANT_RESCORE); 0 = codes only
+    quant_rescore: int = int(os.environ.get("QUANT_RESCORE", "10"))
+    # BM25 files built by src/shared/lexical_index.py into a local index dir; enables lexical/hybrid/rerank
+    lexical_index_dir: str = Field(default_factory=lambda: os.environ.get("LEXICAL_INDEX_DIR", ""))
+    retrieval_mode: str = Field(default_factory=lambda: os.environ.get("RETRIEVAL_MODE", "dense"))
+    retrieval_candidates: int = int(os.environ.get("RETRIEVAL_CANDIDATES", "100"))
+    # Query-embedding cache; EMBED_CACHE_PATH enables the SQLite tier shared by workers on a host
+    embed_cache_size: int = int(os.environ.get("EMBED_CACHE_SIZE", "10000"))
+    embed_cache_ttl_secs: float = float(os.environ.get("EMBED_CACHE_TTL_SECS", "86400"))
+    embed_cache_path: str = Field(default_factory=lambda: os.environ.get("EMBED_CACHE_PATH", ""))
+    # Semantic answer cache; SEMANTIC_CACHE_SIZE=0 disables it. It is dropped when the index changes: the local
+    # manifest version or the BigQuery table's modification time, checked every INDEX_VERSION_POLL_SECS, or INDEX_VERSION.
+    semantic_cache_threshold: float = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    semantic_cache_size: int = int(os.environ.get("SEMANTIC_CACHE_SIZE", "1000"))
+    semantic_cache_ttl_secs: float = float(os.environ.get("SEMANTIC_CACHE_TTL_SECS", "3600"))
+    index_version: str = Field(default_factory=lambda: os.environ.get("INDEX_VERSION", ""))
+    index_version_poll_secs: float = float(os.environ.get("INDEX_VERSION_POLL_SECS", "30"))
+    # Query-embedding micro-batching (core/embed_batcher.py)
+    embed_batch_max: int = int(os.environ.get("EMBED_BATCH_MAX", "32"))
+    embed_batch_wait_ms: float = float(os.environ.get("EMBED_BATCH_WAIT_MS", "5"))
+    embed_queue_max: int = int(os.environ.get("EMBED_QUEUE_MAX", "256"))
+    # Chat admission control (core/admission.py): concurrent calls per stage, each on its own thread pool;
+    # requests in flight beyond CHAT_MAX_IN_FLIGHT get 429; a stage call whose expected queue wait exceeds
+    # what is left of CHAT_DEADLINE_SECS (or with STAGE_QUEUE_MAX calls waiting) gets 503.
+    # CHAT_MAX_IN_FLIGHT / CHAT_DEADLINE_SECS / STAGE_QUEUE_MAX = 0 disable that check.
+    encode_concurrency: int = int(os.environ.get("ENCODE_CONCURRENCY", "2"))
+    search_concurrency: int = int(os.environ.get("SEARCH_CONCURRENCY", "8"))
+    llm_concurrency: int = int(os.environ.get("LLM_CONCURRENCY", "16"))
+    chat_max_in_flight: int = int(os.environ.get("CHAT_MAX_IN_FLIGHT", "64"))
+    chat_deadline_secs: float = float(os.environ.get("CHAT_DEADLINE_SECS", "20"))
+    stage_queue_max: int = int(os.environ.get("STAGE_QUEUE_MAX", "256"))
+    # /v1/chat/batch: max questions per request and Gemini calls in flight per batch
+    chat_batch_max: int = int(os.environ.get("CHAT_BATCH_MAX", "1000"))
+    chat_batch_concurrency: int = int(os.environ.get("CHAT_BATCH_CONCURRENCY", "8"))
+    # /v1/extract and /v1/summarize read-through store (src/shared/sql/{extractions,summaries}_table.sql); empty = cache only
+    extractions_table: str = Field(default_factory=lambda: os.environ.get("EXTRACTIONS_TABLE", ""))
+    summaries_table: str = Field(default_factory=lambda: os.environ.get("SUMMARIES_TABLE", ""))
+    extract_cache_size: int = int(os.environ.get("EXTRACT_CACHE_SIZE", "10000"))
+    # JSON logs on stdout (core/telemetry.py); DEBUG adds per-stage events
+    log_level: str = Field(default_factory=lambda: os.environ.get("LOG_LEVEL", "INFO"))
     max_context_chunks: int = int(os.environ.get("MAX_CONTEXT_CHUNKS", "5"))
     max_chunk_chars: int = int(os.environ.get("MAX_CHUNK_CHARS", "1200"))
+    # Prompt context packing (core/context_packer.py), off by default: it makes search return each hit's
+    # vector. CONTEXT_TOKEN_BUDGET=0 keeps the two limits above; e.g. 1500 packs to that many tokens.
+    # CONTEXT_MMR_LAMBDA=0 keeps retrieval order, e.g. 0.7 reranks for diversity.
+    context_token_budget: int = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "0"))
+    context_dedup_threshold: float = float(os.environ.get("CONTEXT_DEDUP_THRESHOLD", "0.95"))
+    context_mmr_lambda: float = float(os.environ.get("CONTEXT_MMR_LAMBDA", "0"))
 
 settings = Settings()
 
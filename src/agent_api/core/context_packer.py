@@ -0,0 +1,185 @@
+# src/agent_api/core/context_packer.py
+"""
+Chooses which retrieved text goes into the Gemini prompt, under a token budget.
+
+    hits (retrieval order) -> [MMR reorder] -> drop near-duplicates -> fill the budget
+                           -> merge adjacent chunks of the same paper into one passage
+
+Near-duplicates are detected with the hit embeddings when the searcher returns them
+(`return_vectors`), and with word-set Jaccard similarity otherwise (e.g. BM25 hits).
+Tokens are estimated at ~4 characters per token, the same rule as VertexEmbeddings.estimate_tokens.
+"""
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from src.shared.lexical_index import tokenize
+
+PASSAGE_TEMPLATE = "- TITLE: {title}\n  EXCERPT: {text}"
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text or "") // 4 + 1
+
+
+def legacy_context_tokens(hits: List[Dict], max_chunks: int, max_chunk_chars: int) -> int:
+    """Tokens the fixed first-N-chunks / N-characters context would have used (baseline for tokens_saved)."""
+    return sum(estimate_tokens(PASSAGE_TEMPLATE.format(title=(h.get("title") or "").strip(),
+                                                       text=(h.get("chunk_text") or "").strip()[:max_chunk_chars]))
+               for h in hits[:max_chunks])
+
+
+def _doc_and_index(hit: Dict) -> Tuple[str, int | None]:
+    if hit.get("doc_id") is not None and hit.get("chunk_index") is not None:
+        return str(hit["doc_id"]), int(hit["chunk_index"])
+    doc, sep, idx = str(hit.get("id") or "").rpartition("#")
+    if sep and idx.isdigit():
+        return doc, int(idx)
+    return str(hit.get("id")), None
+
+
+class _Candidate:
+    __slots__ = ("rank", "hit", "text", "vec", "words")
+
+    def __init__(self, rank: int, hit: Dict):
+        self.rank = rank
+        self.hit = hit
+        self.text = (hit.get("chunk_text") or "").strip()
+        vec = hit.get("embedding")
+        self.vec = None
+        if vec is not None:
+            v = np.asarray(vec, dtype=np.float32)
+            n = float(np.linalg.norm(v))
+            self.vec = v / n if n > 0 else None
+        self.words = None
+
+    def similarity(self, other: "_Candidate") -> float:
+        if self.vec is not None and other.vec is not None and self.vec.shape == other.vec.shape:
+            return float(self.vec @ other.vec)
+        if self.words is None:
+            self.words = frozenset(tokenize(self.text))
+        if other.words is None:
+            other.words = frozenset(tokenize(other.text))
+        union = len(self.words | other.words)
+        return len(self.words & other.words) / union if union else 1.0
+
+
+class ContextPacker:
+    """
+    pack(hits, query_vec) -> (passages, stats). passages are [{"title", "text", "ids"}], best first.
+    token_budget:    estimated tokens for all passages together
+    dedup_threshold: drop a hit this similar (cosine, or Jaccard without embeddings) to one already kept
+    mmr_lambda:      None keeps retrieval order; otherwise Maximal Marginal Relevance with this
+                     relevance weight (1.0 = pure relevance, lower = more diverse)
+    """
+    def __init__(self, token_budget: int = 1500, dedup_threshold: float = 0.95, mmr_lambda: float | None = None,
+                 merge_adjacent: bool = True, min_fill_tokens: int = 32):
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self.mmr_lambda = mmr_lambda
+        self.merge_adjacent = merge_adjacent
+        self.min_fill_tokens = min_fill_tokens
+        self._lock = threading.Lock()
+        self.totals = {"requests": 0, "context_tokens": 0, "tokens_saved": 0, "duplicates": 0, "merged": 0}
+
+    def _mmr(self, cands: List[_Candidate], query_vec) -> List[_Candidate]:
+        q = None if query_vec is None else np.asarray(query_vec, dtype=np.float32).reshape(-1)
+        n = len(cands)
+
+        def relevance(c: _Candidate) -> float:
+            if q is not None and c.vec is not None and c.vec.shape == q.shape:
+                return float(c.vec @ q)
+            if "dot" in c.hit:
+                return float(c.hit["dot"])
+            return 1.0 - c.rank / n          # no score (e.g. BM25 or fused hits): rank order
+
+        rel = {id(c): relevance(c) for c in cands}
+        best_sim = {id(c): -np.inf for c in cands}
+        out, rest = [], list(cands)
+        lam = float(self.mmr_lambda)
+        while rest:
+            pick = max(rest, key=lambda c: lam * rel[id(c)] - (1.0 - lam) * max(best_sim[id(c)], 0.0))
+            rest.remove(pick)
+            out.append(pick)
+            for c in rest:
+                best_sim[id(c)] = max(best_sim[id(c)], c.similarity(pick))
+        return out
+
+    def _passages(self, kept: List[_Candidate]) -> List[Dict]:
+        """Group kept hits into passages, joining runs of consecutive chunks of one paper."""
+        groups: Dict[str, List[Tuple[int | None, _Candidate]]] = {}
+        position = {id(c): pos for pos, c in enumerate(kept)}
+        order: List[Tuple[int, int]] = []
+        for c in kept:
+            doc, idx = _doc_and_index(c.hit)
+            groups.setdefault(doc, []).append((idx, c))
+        passages = []
+        for doc, members in groups.items():
+            if not self.merge_adjacent or any(idx is None for idx, _ in members):
+                runs = [[m] for m in members]
+            else:
+                members.sort(key=lambda m: m[0])
+                runs = [[members[0]]]
+                for m in members[1:]:
+                    if m[0] == runs[-1][-1][0] + 1:
+                        runs[-1].append(m)
+                    else:
+                        runs.append([m])
+            for run in runs:
+                cands = [c for _, c in run]
+                passages.append({
+                    "title": (cands[0].hit.get("title") or "").strip(),
+                    "text": " ".join(c.text for c in cands),
+                    "ids": [c.hit.get("id") for c in cands],
+                })
+                order.append((min(position[id(c)] for c in cands), len(passages) - 1))
+        # a passage sits where its best chunk was picked (retrieval or MMR order)
+        return [passages[i] for _, i in sorted(order)]
+
+    def pack(self, hits: List[Dict], query_vec=None, baseline_tokens: int | None = None) -> Tuple[List[Dict], Dict]:
+        cands = [_Candidate(i, h) for i, h in enumerate(hits)]
+        if self.mmr_lambda is not None and len(cands) > 1:
+            cands = self._mmr(cands, query_vec)
+
+        kept: List[_Candidate] = []
+        used, duplicates = 0, 0
+        for c in cands:
+            if not c.text:
+                continue
+            if any(c.similarity(k) >= self.dedup_threshold for k in kept):
+                duplicates += 1
+                continue
+            cost = estimate_tokens(PASSAGE_TEMPLATE.format(title=(c.hit.get("title") or "").strip(), text=c.text))
+            room = self.token_budget - used
+            if cost > room:
+                if room < self.min_fill_tokens:
+                    break
+                # fill the rest of the budget with the head of this chunk, cut at a word boundary
+                overhead = cost - estimate_tokens(c.text)
+                c.text = c.text[: max(room - overhead - 1, 0) * 4].rsplit(" ", 1)[0]
+                if not c.text:
+                    break
+                cost = overhead + estimate_tokens(c.text)
+            kept.append(c)
+            used += cost
+
+        passages = self._passages(kept)
+        tokens = sum(estimate_tokens(PASSAGE_TEMPLATE.format(**p)) for p in passages)
+        stats = {"candidates": len(hits), "chunks": len(kept), "passages": len(passages),
+                 "duplicates": duplicates, "merged": len(kept) - len(passages), "context_tokens": tokens}
+        if baseline_tokens is not None:
+            stats["tokens_saved"] = baseline_tokens - tokens
+        with self._lock:
+            self.totals["requests"] += 1
+            self.totals["context_tokens"] += tokens
+            self.totals["tokens_saved"] += stats.get("tokens_saved", 0)
+            self.totals["duplicates"] += duplicates
+            self.totals["merged"] += stats["merged"]
+        return passages, stats
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self.totals)
+        out["avg_context_tokens"] = round(out["context_tokens"] / out["requests"], 1) if out["requests"] else 0.0
+        return out
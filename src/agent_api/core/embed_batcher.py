@@ -0,0 +1,156 @@
+# src/agent_api/core/embed_batcher.py
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from src.agent_api.core.admission import OverloadedError, remaining
+
+
+class QueueFullError(OverloadedError):
+    """Raised when the embedding queue is at capacity; callers should shed the request (503)."""
+
+
+class EmbeddingBatcher:
+    """
+    Async micro-batcher in front of an embedder's embed_queries().
+
+    Concurrent requests are gathered for up to max_batch texts or max_wait_ms (whichever
+    comes first) and encoded with one embed_queries() call on a dedicated worker thread,
+    so the event loop never runs the model and sentence-transformers sees real batches.
+    At most max_queue texts may be waiting; beyond that embed_queries() raises QueueFullError.
+    It is also raised when the batches queued ahead would not finish within the caller's deadline
+    (core/admission.deadline), the same check the encode stage applies to unbatched calls.
+    executor: run batches there instead (the encode stage's pool, see core/admission.py); not shut down by close().
+    """
+    BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+    def __init__(self, embedder, max_batch: int = 32, max_wait_ms: float = 5.0, max_queue: int = 256,
+                 executor: ThreadPoolExecutor | None = None):
+        self.embedder = embedder
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._pending = 0
+        # metrics
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.batch_size_counts = {b: 0 for b in self.BATCH_BUCKETS}
+        self.queue_waits = 0
+        self.queue_wait_sum = 0.0
+        self.queue_wait_max = 0.0
+        self.encode_secs: float | None = None   # moving average of one batch's encode time
+
+    @property
+    def queue_depth(self) -> int:
+        return self._pending
+
+    def _ensure_started(self):
+        # Created lazily so the queue and worker task belong to the serving event loop.
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._arrived = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def expected_wait(self, n: int = 1) -> float:
+        """Seconds until n more texts would be encoded: the batches queued ahead of them, plus theirs."""
+        return math.ceil((self._pending + n) / self.max_batch) * (self.encode_secs or 0.0)
+
+    async def embed_queries(self, texts) -> List[List[float]]:
+        texts = list(texts)
+        if self._pending + len(texts) > self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(f"embedding queue full ({self._pending} waiting)")
+        wait, budget = self.expected_wait(len(texts)), remaining()
+        if budget is not None and wait > budget:
+            self.rejected += 1
+            raise QueueFullError(f"expected encode wait {wait:.2f}s exceeds the {max(budget, 0.0):.2f}s left",
+                                 retry_after=wait)
+        self._ensure_started()
+        fut = asyncio.get_running_loop().create_future()
+        self._pending += len(texts)
+        self._queue.put_nowait((texts, fut, time.perf_counter()))
+        self._arrived.set()
+        return await fut
+
+    async def _next_batch(self):
+        first = await self._queue.get()
+        batch, size = [first], len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch:
+            while size < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                batch.append(item)
+                size += len(item[0])
+            remaining = deadline - time.perf_counter()
+            if size >= self.max_batch or remaining <= 0:
+                break
+            # wait on an Event rather than queue.get(), so a timeout can never drop an item
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            started = time.perf_counter()
+            flat = [t for texts, _, _ in batch for t in texts]
+            self._pending -= len(flat)
+            self._record(len(flat), [started - enqueued for _, _, enqueued in batch])
+            try:
+                vecs = await loop.run_in_executor(self._executor, self.embedder.embed_queries, flat)
+                took = time.perf_counter() - started
+                self.encode_secs = took if self.encode_secs is None else 0.8 * self.encode_secs + 0.2 * took
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            i = 0
+            for texts, fut, _ in batch:
+                if not fut.done():   # caller may have been cancelled
+                    fut.set_result(vecs[i:i + len(texts)])
+                i += len(texts)
+
+    def _record(self, size: int, waits: List[float]):
+        self.batches += 1
+        self.items += size
+        bucket = next((b for b in self.BATCH_BUCKETS if size <= b), self.BATCH_BUCKETS[-1])
+        self.batch_size_counts[bucket] += 1
+        self.queue_waits += len(waits)
+        self.queue_wait_sum += sum(waits)
+        self.queue_wait_max = max(self.queue_wait_max, max(waits))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        waits = self.queue_waits or 1
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "rejected": self.rejected,
+            "queue_depth": self._pending,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_size_le": {str(b): c for b, c in self.batch_size_counts.items()},
+            "avg_queue_wait_ms": 1000.0 * self.queue_wait_sum / waits,
+            "max_queue_wait_ms": 1000.0 * self.queue_wait_max,
+            "avg_encode_ms": 1000.0 * (self.encode_secs or 0.0),
+        }
@@ -0,0 +1,207 @@
+# src/agent_api/core/extract_service.py
+"""
+Read-through store behind /v1/extract and /v1/summarize.
+
+    in-process TTL cache -> BigQuery (extractions / summaries tables) -> compute and write back
+
+Requests with an `id` are keyed by that id. Requests with raw `text` are keyed by sha1(text),
+the same content hash nlp_extractor writes, so text that matches a precomputed chunk is a hit.
+Only results for an id are written back (the tables hold one row per chunk id); results for raw
+text stay in the in-process cache. Concurrent misses for the same key are coalesced into one
+computation (SingleFlight).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Callable, Dict
+
+from src.agent_api.core.single_flight import SingleFlight
+from src.agent_api.core.telemetry import log
+from src.shared.cache import TTLCache
+
+SUMMARY_PROMPT = (
+    "Summarize the following arXiv text for a researcher in 3-5 sentences. "
+    "Keep technical terms; do not add facts that are not in the text.\n\n"
+    "Title: {title}\n\nText:\n{text}\n\nSummary:"
+)
+
+
+def content_hash(text: str) -> str:
+    # must match src/data_pipeline/nlp_extractor.content_hash
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+class NotFoundError(LookupError):
+    """The requested id is not in the chunks table."""
+
+
+class BigQueryExtractionStore:
+    """
+    Precomputed rows in BigQuery. Table DDL: src/shared/sql/extractions_table.sql and
+    src/shared/sql/summaries_table.sql.
+    All methods are blocking; ExtractService calls them on a worker thread.
+    """
+    def __init__(self, project: str, chunks_table: str, extractions_table: str, summaries_table: str,
+                 client=None):
+        from google.cloud import bigquery
+        self._bq = bigquery
+        self.client = client or bigquery.Client(project=project)
+        self.chunks_table = chunks_table
+        self.extractions_table = extractions_table
+        self.summaries_table = summaries_table
+
+    def _query(self, sql: str, **params):
+        cfg = self._bq.QueryJobConfig(query_parameters=[
+            self._bq.ScalarQueryParameter(name, "INT64" if isinstance(v, int) else "STRING", v)
+            for name, v in params.items()
+        ])
+        return list(self.client.query(sql, job_config=cfg).result())
+
+    def get_text(self, doc_id: str) -> Dict | None:
+        rows = self._query(f"SELECT title, chunk_text FROM `{self.chunks_table}` WHERE id = @id LIMIT 1", id=doc_id)
+        return {"title": rows[0]["title"], "text": rows[0]["chunk_text"]} if rows else None
+
+    def get_extraction(self, key_col: str, key: str) -> Dict | None:
+        rows = self._query(
+            f"SELECT title, entities, sentiment_score, sentiment_magnitude FROM `{self.extractions_table}` "
+            f"WHERE {key_col} = @key ORDER BY extracted_at DESC LIMIT 1", key=key)
+        if not rows:
+            return None
+        r = rows[0]
+        entities = r["entities"]
+        return {
+            "title": r["title"],
+            "entities": json.loads(entities) if isinstance(entities, str) else entities,
+            "sentiment": {"score": r["sentiment_score"], "magnitude": r["sentiment_magnitude"]},
+        }
+
+    def _insert(self, table: str, row: Dict):
+        # write-back is best effort: the answer is already computed and cached in process
+        try:
+            errors = self.client.insert_rows_json(table, [row])
+        except Exception as e:
+            errors = [repr(e)]
+        if errors:
+            log("extract.write_failed", logging.WARNING, table=table, errors=errors)
+
+    def put_extraction(self, row: Dict):
+        self._insert(self.extractions_table, {**row, "extracted_at": datetime.now(timezone.utc).isoformat()})
+
+    def get_summary(self, key_col: str, key: str, max_tokens: int) -> Dict | None:
+        rows = self._query(
+            f"SELECT title, summary FROM `{self.summaries_table}` WHERE {key_col} = @key "
+            f"AND max_tokens = @max_tokens ORDER BY created_at DESC LIMIT 1", key=key, max_tokens=max_tokens)
+        return {"title": rows[0]["title"], "summary": rows[0]["summary"]} if rows else None
+
+    def put_summary(self, row: Dict):
+        self._insert(self.summaries_table, {**row, "created_at": datetime.now(timezone.utc).isoformat()})
+
+
+class ExtractService:
+    """
+    analyzer(text) -> {"entities", "sentiment", ...}: defaults to nlp_extractor.analyze (Cloud Natural Language).
+    store: BigQueryExtractionStore or None (then only the in-process cache persists results,
+    and requests by id cannot be served).
+    llm_stage: the chat pipeline's llm StageLimiter (core/admission.py), so summaries count against
+    the same Gemini concurrency limit and are shed (OverloadedError) like chat calls.
+    """
+    def __init__(self, llm, store=None, analyzer: Callable[[str], Dict] | None = None,
+                 cache_size: int = 10000, cache_ttl_secs: float = 86400, llm_stage=None):
+        self.llm = llm
+        self.llm_stage = llm_stage
+        self.store = store
+        self._analyzer = analyzer
+        self.cache = TTLCache(maxsize=cache_size, ttl_secs=cache_ttl_secs)
+        self.flight = SingleFlight()
+        self.computed = 0
+
+    @property
+    def analyzer(self):
+        if self._analyzer is None:
+            from src.data_pipeline.nlp_extractor import analyze   # imports the Language client lazily
+            self._analyzer = analyze
+        return self._analyzer
+
+    @staticmethod
+    def _key(doc_id: str | None, text: str | None):
+        # raw text wins when both are sent: it is what gets analyzed
+        if text:
+            return "content_hash", content_hash(text)
+        if doc_id:
+            return "id", doc_id
+        raise ValueError("Provide either `id` or `text`.")
+
+    async def _source(self, doc_id: str | None, text: str | None, title: str | None) -> Dict:
+        if text:
+            return {"title": title, "text": text}
+        found = await asyncio.to_thread(self.store.get_text, doc_id) if self.store is not None else None
+        if not found or not found.get("text"):
+            raise NotFoundError(f"Unknown id: {doc_id}")
+        return {"title": found.get("title") or title, "text": found["text"]}
+
+    async def _read_through(self, cache_key, load, compute):
+        hit = self.cache.get(cache_key)
+        if hit is not None:
+            return hit
+
+        async def fill():
+            value = await asyncio.to_thread(load) if self.store is not None else None
+            if value is None:
+                value = await compute()
+                self.computed += 1
+            self.cache.set(cache_key, value)
+            return value
+
+        return await self.flight.do(cache_key, fill)
+
+    async def extract(self, doc_id: str | None = None, text: str | None = None, title: str | None = None) -> Dict:
+        key_col, key = self._key(doc_id, text)
+
+        async def compute():
+            src = await self._source(doc_id, text, title)
+            ext = await asyncio.to_thread(self.analyzer, src["text"])
+            out = {"title": src["title"], "entities": ext["entities"], "sentiment": ext["sentiment"]}
+            if self.store is not None and not text:
+                await asyncio.to_thread(self.store.put_extraction, {
+                    "id": doc_id, "title": src["title"], "content_hash": content_hash(src["text"]),
+                    "entities": json.dumps(out["entities"], ensure_ascii=False),
+                    "sentiment_score": out["sentiment"]["score"],
+                    "sentiment_magnitude": out["sentiment"]["magnitude"],
+                    "language_code": ext.get("language_code"),
+                })
+            return out
+
+        load = (lambda: self.store.get_extraction(key_col, key)) if self.store is not None else None
+        res = await self._read_through(("extract", key_col, key), load, compute)
+        return {**res, "id": doc_id, "title": self._title(text, title, res)}
+
+    async def summarize(self, doc_id: str | None = None, text: str | None = None, title: str | None = None,
+                        max_tokens: int = 256) -> Dict:
+        key_col, key = self._key(doc_id, text)
+
+        async def compute():
+            src = await self._source(doc_id, text, title)
+            prompt = SUMMARY_PROMPT.format(title=src["title"] or "", text=src["text"])
+            async with self.llm_stage.slot() if self.llm_stage is not None else nullcontext():
+                summary = (await self.llm.generate(prompt, max_output_tokens=max_tokens)).strip()
+            if self.store is not None and not text:
+                await asyncio.to_thread(self.store.put_summary, {
+                    "id": doc_id, "title": src["title"], "content_hash": content_hash(src["text"]),
+                    "max_tokens": max_tokens, "summary": summary,
+                })
+            return {"title": src["title"], "summary": summary}
+
+        load = (lambda: self.store.get_summary(key_col, key, max_tokens)) if self.store is not None else None
+        res = await self._read_through(("summary", key_col, key, max_tokens), load, compute)
+        return {"id": doc_id, "title": self._title(text, title, res), "summary": res["summary"]}
+
+    @staticmethod
+    def _title(text: str | None, title: str | None, res: Dict) -> str | None:
+        # the stored title of the chunk; a raw-text request's own title, since that text is the source
+        return (title if text else None) or res.get("title")
+
+    def stats(self) -> dict:
+        return {"cache": self.cache.stats(), "single_flight": self.flight.stats(), "computed": self.computed}
@@ -1,8 +1,17 @@
 # src/agent_api/core/rag_service.py
-from typing import List, Dict
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, List, Dict, Tuple
 from textwrap import dedent
 
+from src.agent_api.core.admission import OverloadedError, PipelineLimits, deadline, remaining
 from src.agent_api.core.config import settings
+from src.agent_api.core.context_packer import PASSAGE_TEMPLATE, legacy_context_tokens
+from src.agent_api.core.single_flight import SingleFlight
+from src.agent_api.core.telemetry import CACHE_LOOKUPS, HITS_RETURNED, PROMPT_CHARS, log, observe_stage, span
+from src.shared.cache import filters_key
+from src.shared.lexical_index import rrf_fuse
 from src.shared.gcp_clients import LocalEmbeddings, BigQueryVectorSearch, VertexLLM
 
 class RAGService:
@@ -10,30 +19,68 @@ class RAGService:
                  project: str | None = None,
                  location: str | None = None,
                  bq_table: str | None = None,
-                 embed_model: str = "intfloat/e5-small-v2",
+                 embed_model: str | None = None,
                  gemini_model: str | None = None,
                  max_context_chunks: int | None = None,
-                 max_chunk_chars: int | None = None):
+                 max_chunk_chars: int | None = None,
+                 embedder=None,
+                 searcher=None,
+                 llm=None,
+                 semantic_cache=None,
+                 batcher=None,
+                 lexical=None,
+                 retrieval_candidates: int | None = None,
+                 packer=None,
+                 limits: PipelineLimits | None = None):
         project = project or settings.project
         location = location or settings.location
         bq_table = bq_table or settings.bq_table
+        embed_model = embed_model or settings.embed_model
         gemini_model = gemini_model or settings.gemini_model
         self.max_context_chunks = max_context_chunks or settings.max_context_chunks
         self.max_chunk_chars = max_chunk_chars or settings.max_chunk_chars
 
+        # Clients may be injected (see core/services.py) so they are built once per process.
         # Embeddings (local CPU; 384-dim, normalized)
-        self.embedder = LocalEmbeddings(embed_model)
-        # BigQuery vector search (manual dot product SQL)
-        self.searcher = BigQueryVectorSearch(project=project, table=bq_table)
+        self.embedder = embedder or LocalEmbeddings(embed_model)
+        # BigQuery vector search (parameterized SQL; see BigQueryVectorSearch)
+        self.searcher = searcher or BigQueryVectorSearch(project=project, table=bq_table, mode=settings.bq_search_mode)
         # Gemini (Vertex AI)
-        self.llm = VertexLLM(project=project, location=location, model=gemini_model)
-
-    def _build_prompt(self, question: str, hits: List[Dict]) -> str:
-        bullets = []
-        for h in hits[: self.max_context_chunks]:
-            title = (h.get("title") or "").strip()
-            chunk = (h.get("chunk_text") or "").strip()[: self.max_chunk_chars]
-            bullets.append(f"- TITLE: {title}\n  EXCERPT: {chunk}")
+        self.llm = llm or VertexLLM(project=project, location=location, model=gemini_model)
+        # Optional answer cache for near-duplicate questions (core/semantic_cache.py)
+        self.semantic_cache = semantic_cache
+        # Optional async micro-batcher in front of embedder (core/embed_batcher.py)
+        self.batcher = batcher
+        # Optional BM25 index (src/shared/lexical_index.py) for retrieval_mode lexical / hybrid / rerank
+        self.lexical = lexical
+        self.retrieval_candidates = retrieval_candidates or settings.retrieval_candidates
+        # Optional token-budgeted context packer (core/context_packer.py); None = first N chunks, N chars each
+        self.packer = packer
+        # Request cap, deadline and per-stage thread pools / limits (core/admission.py)
+        self.limits = limits or PipelineLimits.from_settings(settings)
+        # Identical concurrent /v1/chat requests share one pipeline run
+        self.single_flight = SingleFlight()
+
+    def _pack(self, hits: List[Dict], q_vec=None) -> Tuple[List[str], Dict]:
+        """Context bullets for the prompt, and their token stats (tokens_saved vs. the fixed limits)."""
+        baseline = legacy_context_tokens(hits, self.max_context_chunks, self.max_chunk_chars)
+        if self.packer is None:
+            bullets = [PASSAGE_TEMPLATE.format(title=(h.get("title") or "").strip(),
+                                               text=(h.get("chunk_text") or "").strip()[: self.max_chunk_chars])
+                       for h in hits[: self.max_context_chunks]]
+            return bullets, {"context_tokens": baseline, "tokens_saved": 0}
+        passages, stats = self.packer.pack(hits, q_vec, baseline_tokens=baseline)
+        log("rag.context", logging.DEBUG, **stats)
+        return [PASSAGE_TEMPLATE.format(**p) for p in passages], stats
+
+    def _build_prompt(self, question: str, hits: List[Dict], q_vec=None) -> Tuple[str, Dict]:
+        with span("prompt"):
+            prompt, stats = self._render_prompt(question, hits, q_vec)
+        PROMPT_CHARS.observe(len(prompt))
+        return prompt, stats
+
+    def _render_prompt(self, question: str, hits: List[Dict], q_vec=None) -> Tuple[str, Dict]:
+        bullets, stats = self._pack(hits, q_vec)
         context = "\n".join(bullets) if bullets else "None"
 
         prompt = dedent(f"""
@@ -53,23 +100,222 @@ class RAGService:
         - Cite supporting titles inline like [Title].
         - Avoid guessing; prefer cautious wording if uncertain.
         """).strip()
-        return prompt
+        return prompt, stats
+
+    @staticmethod
+    def _public(hits: List[Dict]) -> List[Dict]:
+        # hit vectors are only for packing; they are not returned or cached
+        return [{key: v for key, v in h.items() if key != "embedding"} for h in hits]
+
+    async def _embed_query(self, question: str):
+        with span("embed"):
+            if self.batcher is not None:
+                return (await self.batcher.embed_queries([question]))[0]
+            return (await self.limits.encode.run(self.embedder.embed_queries, [question]))[0]
 
-    async def answer(self, question: str, k: int = 5) -> Dict:
+    def _lookup_cache(self, q_vec, k: int, scope) -> Dict | None:
+        with span("cache_lookup"):
+            cached = self.semantic_cache.lookup(q_vec, k, scope)
+        CACHE_LOOKUPS.inc(cache="semantic", result="miss" if cached is None else "hit")
+        return cached
+
+    RETRIEVAL_MODES = ("dense", "lexical", "hybrid", "rerank")
+
+    @staticmethod
+    def _scope(filters: Dict | None, mode: str):
+        # cached answers are only reused for the same retrieval mode
+        return {**(filters or {}), "retrieval_mode": mode} if mode != "dense" else filters
+
+    def _search(self, question: str, q_vec, k: int, filters: Dict | None, mode: str) -> List[Dict]:
+        """
+        dense:   vector search only
+        lexical: BM25 only
+        hybrid:  reciprocal rank fusion of the dense and BM25 top `retrieval_candidates`
+        rerank:  BM25 top `retrieval_candidates`, rescored by exact dot product (local index only)
+        """
+        if mode not in self.RETRIEVAL_MODES:
+            raise ValueError(f"retrieval_mode must be one of {self.RETRIEVAL_MODES}")
+        if mode != "dense":
+            if self.lexical is None:
+                raise ValueError(f"retrieval_mode={mode} needs a BM25 index (LEXICAL_INDEX_DIR)")
+            if filters:
+                raise ValueError("categories / update_date filters are only supported with retrieval_mode=dense")
+        if mode == "lexical":
+            return self.lexical.search(question, k=k)
+        if mode == "rerank":
+            if not hasattr(self.searcher, "search_rows"):
+                raise ValueError("retrieval_mode=rerank requires a local VECTOR_BACKEND (local, ivfpq, int8, binary)")
+            if not self.lexical.shares_rows_with(self.searcher):
+                raise ValueError("retrieval_mode=rerank needs LEXICAL_INDEX_DIR built over the LOCAL_INDEX_DIR index")
+            rows, _ = self.lexical.top_rows(question, self.retrieval_candidates)
+            return self.searcher.search_rows(q_vec, rows, k=k)
+        n = self.retrieval_candidates if mode == "hybrid" else k
+        if filters:
+            hits = self.searcher.search(q_vec, k=n, filters=filters)  # returns [{id,title,chunk_text,dot}, ...]
+        else:
+            hits = self.searcher.search(q_vec, k=n)
+        if mode == "hybrid":
+            hits = rrf_fuse([hits, self.lexical.search(question, k=n)], k=k)
+        return hits
+
+    async def _retrieve(self, question: str, k: int, filters: Dict | None, mode: str = "dense"):
+        """Embed + (semantic cache | vector search). Returns (q_vec, cached_response, hits)."""
         # 1) Embed question
-        # q_vec = self.embedder.embed_texts_sync([question])[0]
-        print("[RAG] embedding query...")
-        q_vec = self.embedder.embed_queries([question])[0]
+        q_vec = await self._embed_query(question)
+        if self.semantic_cache is not None:
+            cached = self._lookup_cache(q_vec, k, self._scope(filters, mode))
+            if cached is not None:
+                log("rag.semantic_cache_hit", logging.DEBUG)
+                return q_vec, cached, []
         # 2) Search BQ
-        print("[RAG] calling BigQuery KNN...")
-        hits = self.searcher.search(q_vec, k=k)  # returns [{id,title,chunk_text,dot}, ...]
-        print(f"[RAG] got {len(hits)} hits; calling Gemini...")
+        with span("search"):
+            hits = await self.limits.search.run(self._search, question, q_vec, k, filters, mode)
+        HITS_RETURNED.observe(len(hits), mode=mode)
+        log("rag.retrieved", logging.DEBUG, mode=mode, hits=len(hits))
+        return q_vec, None, hits
+
+    async def answer(self, question: str, k: int = 5, filters: Dict | None = None,
+                     retrieval_mode: str = "dense") -> Dict:
+        """
+        Concurrent calls with the same (question, k, filters, mode) share one run; the later ones
+        get cache="coalesced". Raises OverloadedError (429 / 503) instead of queueing past the deadline.
+        Every caller, coalesced or not, is admitted on its own and waits no longer than its own deadline.
+        """
+        key = (question, k, filters_key(filters), retrieval_mode)
+        with self.limits.requests.admit(), deadline(self.limits.deadline_secs):
+            coalesced = key in self.single_flight
+            try:
+                # the shared run goes on for the other callers if this one gives up
+                res = await self.single_flight.do(key, lambda: self._answer(question, k, filters, retrieval_mode),
+                                                  timeout=remaining())
+            except asyncio.TimeoutError:
+                raise OverloadedError(f"no answer within the {self.limits.deadline_secs:g}s deadline",
+                                      status_code=503, retry_after=self.limits.deadline_secs)
+        return {**res, "cache": "coalesced"} if coalesced else dict(res)
+
+    async def _answer(self, question: str, k: int, filters: Dict | None, retrieval_mode: str) -> Dict:
+        q_vec, cached, hits = await self._retrieve(question, k, filters, retrieval_mode)
+        if cached is not None:
+            return {**cached, "cache": "hit"}
         # 3) Build prompt for Gemini
-        prompt = self._build_prompt(question, hits)
+        prompt, context = self._build_prompt(question, hits, q_vec)
         # 4) Generate
-        text = await self.llm.generate(prompt)
+        with span("generate"):
+            async with self.limits.llm.slot():
+                text = await self.llm.generate(prompt)
         # 5) Return with simple citations (titles)
         citations = [h.get("title") for h in hits if h.get("title")]
-        print("[RAG] Gemini done.")
-        return {"answer": text, "citations": citations, "matches": hits[:k]}
-        
+        res = {"answer": text, "citations": citations, "matches": self._public(hits[:k])}
+        if self.semantic_cache is not None:
+            self.semantic_cache.store(q_vec, k, self._scope(filters, retrieval_mode), res)
+        # "cache" and "context" are reported as X-Cache / X-Context-* headers, not part of ChatResponse
+        return {**res, "cache": "miss", "context": context}
+
+    async def answer_stream(self, question: str, k: int = 5, filters: Dict | None = None,
+                            retrieval_mode: str = "dense") -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        Same pipeline as answer(), as (event, data) pairs:
+        ("retrieval", {matches, citations, cache}) as soon as search returns,
+        then ("token", {text}) per Gemini chunk, then ("done", {answer}).
+        Admitted and shed like answer(), but not coalesced.
+        """
+        with self.limits.requests.admit(), deadline(self.limits.deadline_secs):
+            async for event in self._answer_stream(question, k, filters, retrieval_mode):
+                yield event
+
+    async def _answer_stream(self, question: str, k: int, filters: Dict | None,
+                             retrieval_mode: str) -> AsyncIterator[Tuple[str, Dict]]:
+        q_vec, cached, hits = await self._retrieve(question, k, filters, retrieval_mode)
+        if cached is not None:
+            yield "retrieval", {"matches": cached["matches"], "citations": cached["citations"], "cache": "hit"}
+            yield "token", {"text": cached["answer"]}
+            yield "done", {"answer": cached["answer"]}
+            return
+
+        citations = [h.get("title") for h in hits if h.get("title")]
+        matches = self._public(hits[:k])
+        prompt, context = self._build_prompt(question, hits, q_vec)
+        yield "retrieval", {"matches": matches, "citations": citations, "cache": "miss", "context": context}
+        parts = []
+        t0 = time.perf_counter()
+        with span("generate"):
+            async with self.limits.llm.slot():
+                async for text in self.llm.generate_stream(prompt):
+                    if not parts:
+                        observe_stage("first_token", time.perf_counter() - t0)
+                    parts.append(text)
+                    yield "token", {"text": text}
+        answer = "".join(parts)
+        if self.semantic_cache is not None:
+            self.semantic_cache.store(q_vec, k, self._scope(filters, retrieval_mode), {"answer": answer, "citations": citations, "matches": matches})
+        yield "done", {"answer": answer}
+
+    async def _retrieve_many(self, questions: List[str], k: int, filters: Dict | None):
+        """
+        Batch version of _retrieve: one embed_queries() call for every question and one
+        search_many() (single matmul / single BigQuery job) for every semantic-cache miss.
+        """
+        # straight to the embedder: a large batch would overflow the request micro-batcher's queue
+        with span("embed"):
+            q_vecs = await self.limits.encode.run(self.embedder.embed_queries, list(questions))
+        cached = [None] * len(questions)
+        if self.semantic_cache is not None:
+            cached = [self._lookup_cache(v, k, filters) for v in q_vecs]
+        todo = [i for i, c in enumerate(cached) if c is None]
+        hits: List[List[Dict]] = [[] for _ in questions]
+        if todo:
+            vecs = [q_vecs[i] for i in todo]
+            kwargs = {"filters": filters} if filters else {}
+            with span("search"):
+                if hasattr(self.searcher, "search_many"):
+                    found = await self.limits.search.run(self.searcher.search_many, vecs, k=k, **kwargs)
+                else:
+                    found = [await self.limits.search.run(self.searcher.search, v, k=k, **kwargs) for v in vecs]
+            for i, h in zip(todo, found):
+                hits[i] = h
+                HITS_RETURNED.observe(len(h), mode="dense")
+            log("rag.retrieved", logging.DEBUG, mode="dense", queries=len(todo))
+        return q_vecs, cached, hits
+
+    async def answer_many(self, questions: List[str], k: int = 5, filters: Dict | None = None,
+                          concurrency: int = 8) -> AsyncIterator[Tuple[int, Dict]]:
+        """
+        Answer a batch of questions, yielding (index, result) in completion order.
+        result is answer()'s dict, or {"error": ...} if that item's generation failed.
+        Retrieval errors (bad filters, ...) are raised for the whole batch. The batch counts as one
+        request in flight and has no deadline; its Gemini calls share the llm stage limit.
+        """
+        with self.limits.requests.admit():
+            async for item in self._answer_many(questions, k, filters, concurrency):
+                yield item
+
+    async def _answer_many(self, questions: List[str], k: int, filters: Dict | None,
+                           concurrency: int) -> AsyncIterator[Tuple[int, Dict]]:
+        q_vecs, cached, hits = await self._retrieve_many(questions, k, filters)
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(i: int) -> Tuple[int, Dict]:
+            if cached[i] is not None:
+                return i, {**cached[i], "cache": "hit"}
+            try:
+                async with sem:
+                    prompt, context = self._build_prompt(questions[i], hits[i], q_vecs[i])
+                    with span("generate"):
+                        async with self.limits.llm.slot():
+                            text = await self.llm.generate(prompt)
+            except Exception as e:
+                return i, {"error": f"{type(e).__name__}: {e}"}
+            res = {"answer": text, "citations": [h.get("title") for h in hits[i] if h.get("title")],
+                   "matches": self._public(hits[i][:k])}
+            if self.semantic_cache is not None:
+                self.semantic_cache.store(q_vecs[i], k, filters, res)
+            return i, {**res, "cache": "miss", "context": context}
+
+        tasks = [asyncio.ensure_future(one(i)) for i in range(len(questions))]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield await fut
+        finally:
+            for t in tasks:
+                t.cancel()
+        log("rag.batch_done", questions=len(questions))
@@ -0,0 +1,107 @@
+# src/agent_api/core/semantic_cache.py
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from src.shared.cache import filters_key
+
+
+class SemanticCache:
+    """
+    Answer cache keyed on the query embedding rather than the question text.
+
+    A lookup hits when a cached question with the same k and retrieval filters has
+    cosine similarity >= threshold with the new one, so paraphrases skip search and
+    Gemini entirely. Entries expire after ttl_secs, the oldest are evicted beyond
+    capacity, and everything is dropped when version_fn() (the index version) changes.
+    """
+    def __init__(self, threshold: float = 0.95, capacity: int = 1000, ttl_secs: float = 3600,
+                 version_fn: Callable[[], Optional[str]] | None = None):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl_secs = ttl_secs
+        self.version_fn = version_fn or (lambda: None)
+        self._version = self.version_fn()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()   # id -> (scope, vec, response, created)
+        self._scopes: Dict[tuple, list] = {}                         # scope -> [ids]
+        self._matrices: Dict[tuple, np.ndarray] = {}                 # scope -> stacked vecs (lazy)
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def _check_version(self):
+        version = self.version_fn()
+        if version != self._version:
+            self._clear()
+            self._version = version
+            self.invalidations += 1
+
+    def _clear(self):
+        self._entries.clear()
+        self._scopes.clear()
+        self._matrices.clear()
+
+    def _drop(self, entry_id: int):
+        scope = self._entries.pop(entry_id)[0]
+        ids = self._scopes[scope]
+        ids.remove(entry_id)
+        if not ids:
+            del self._scopes[scope]
+        self._matrices.pop(scope, None)
+
+    def _expire(self):
+        if not self.ttl_secs:
+            return
+        oldest = time.monotonic() - self.ttl_secs
+        for entry_id, (_, _, _, created) in list(self._entries.items()):
+            if created >= oldest:
+                break   # insertion-ordered, so the rest are newer
+            self._drop(entry_id)
+
+    def lookup(self, vec, k: int, filters: Dict | None = None) -> Optional[Dict]:
+        scope = (int(k), filters_key(filters))
+        with self._lock:
+            self._check_version()
+            self._expire()
+            ids = self._scopes.get(scope)
+            if ids:
+                mat = self._matrices.get(scope)
+                if mat is None:
+                    mat = self._matrices[scope] = np.stack([self._entries[i][1] for i in ids])
+                sims = mat @ self._unit(vec)
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    self.hits += 1
+                    return copy.deepcopy(self._entries[ids[best]][2])
+            self.misses += 1
+            return None
+
+    def store(self, vec, k: int, filters: Dict | None, response: Dict):
+        if self.capacity <= 0:
+            return
+        scope = (int(k), filters_key(filters))
+        with self._lock:
+            self._check_version()
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (scope, self._unit(vec), copy.deepcopy(response), time.monotonic())
+            self._scopes.setdefault(scope, []).append(entry_id)
+            self._matrices.pop(scope, None)
+            while len(self._entries) > self.capacity:
+                self._drop(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "capacity": self.capacity, "hits": self.hits,
+                "misses": self.misses, "invalidations": self.invalidations, "version": self._version}
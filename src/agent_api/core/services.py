@@ -0,0 +1,146 @@
+# src/agent_api/core/services.py
+from fastapi import HTTPException, Request
+
+from src.agent_api.core.admission import PipelineLimits
+from src.agent_api.core.config import settings
+from src.agent_api.core.context_packer import ContextPacker
+from src.agent_api.core.embed_batcher import EmbeddingBatcher
+from src.agent_api.core.extract_service import BigQueryExtractionStore, ExtractService
+from src.agent_api.core.rag_service import RAGService
+from src.agent_api.core.semantic_cache import SemanticCache
+from src.shared.embed_cache import CachedEmbeddings
+from src.shared.gcp_clients import LocalEmbeddings, BigQueryVectorSearch, VertexLLM
+
+
+class Services:
+    """
+    Process-wide clients, built once at startup and shared by every request.
+    """
+    def __init__(self, rag: RAGService, extract: ExtractService | None = None):
+        self.rag = rag
+        self.extract = extract
+
+    def warm_up(self):
+        # First encode pays for lazy weight init / tokenizer setup; do it before traffic arrives.
+        # Go around any cache wrappers so the model itself is exercised.
+        embedder = self.rag.embedder
+        while hasattr(embedder, "inner"):
+            embedder = embedder.inner
+        embedder.embed_queries(["warmup"])
+
+    async def close(self):
+        if self.rag.batcher is not None:
+            await self.rag.batcher.close()
+        self.rag.limits.close()
+
+    def executors(self) -> dict:
+        """The thread pools these services own, by name (for executor_gauges)."""
+        return {name: getattr(self.rag.limits, name).executor for name in self.rag.limits.STAGES}
+
+    def stats(self) -> dict:
+        """Cache hit/miss counters, batcher and admission metrics, for sizing."""
+        out = {"admission": self.rag.limits.stats(), "single_flight": self.rag.single_flight.stats()}
+        if self.rag.batcher is not None:
+            out["embed_batcher"] = self.rag.batcher.stats()
+        if hasattr(self.rag.embedder, "stats"):
+            out["embed_cache"] = self.rag.embedder.stats()
+        if self.rag.semantic_cache is not None:
+            out["semantic_cache"] = self.rag.semantic_cache.stats()
+        cache = getattr(self.rag.searcher, "cache", None)
+        if cache is not None:
+            out["search_cache"] = cache.stats()
+        if self.rag.packer is not None:
+            out["context_packer"] = self.rag.packer.stats()
+        if self.extract is not None:
+            out["extract"] = self.extract.stats()
+        return out
+
+
+def build_searcher():
+    backend = settings.vector_backend.lower()
+    if backend == "local":
+        from src.shared.vector_store import LocalVectorSearch
+        return LocalVectorSearch(settings.local_index_dir)
+    if backend == "ivfpq":
+        from src.shared.ann_index import IVFPQVectorSearch
+        return IVFPQVectorSearch(settings.local_index_dir, nprobe=settings.ann_nprobe)
+    if backend in ("int8", "binary"):
+        from src.shared.quantize import QuantizedVectorSearch
+        return QuantizedVectorSearch(settings.local_index_dir, mode=backend, rescore=settings.quant_rescore)
+    if backend == "bigquery":
+        return BigQueryVectorSearch(project=settings.project, table=settings.bq_table,
+                                    mode=settings.bq_search_mode, cache_ttl_secs=settings.bq_cache_ttl_secs)
+    raise ValueError(f"Unknown VECTOR_BACKEND: {settings.vector_backend}")
+
+
+def index_version_fn(searcher, static_version: str = ""):
+    """Live index version for the semantic cache: the searcher's polled version, plus INDEX_VERSION."""
+    current = getattr(searcher, "current_version", lambda: None)
+    return lambda: "/".join(v for v in (current(), static_version) if v) or None
+
+
+def build_services() -> Services:
+    # encode / search / llm each get their own bounded thread pool instead of the loop's default executor
+    limits = PipelineLimits.from_settings(settings)
+    encoder = LocalEmbeddings(settings.embed_model, backend=settings.embed_backend, threads=settings.embed_threads,
+                              max_seq_length=settings.embed_max_seq_length, cache_dir=settings.embed_onnx_dir or None,
+                              snapshot_dir=settings.embed_snapshot_dir or None)
+    embedder = CachedEmbeddings(
+        encoder,
+        model_name=encoder.model_id,
+        maxsize=settings.embed_cache_size,
+        ttl_secs=settings.embed_cache_ttl_secs,
+        disk_path=settings.embed_cache_path or None,
+    )
+    searcher = build_searcher()
+    searcher.version_poll_secs = settings.index_version_poll_secs
+    packer = None
+    if settings.context_token_budget > 0:
+        packer = ContextPacker(token_budget=settings.context_token_budget,
+                               dedup_threshold=settings.context_dedup_threshold,
+                               mmr_lambda=settings.context_mmr_lambda or None)
+        # hits carry their vectors so dedup / MMR need no extra embedding calls
+        searcher.return_vectors = True
+    lexical = None
+    if settings.lexical_index_dir:
+        from src.shared.lexical_index import LexicalIndex
+        # share the rows mmap with the dense searcher when both use the same index dir
+        same_dir = getattr(searcher, "index_dir", None) == settings.lexical_index_dir
+        lexical = LexicalIndex(settings.lexical_index_dir, rows=searcher if same_dir else None)
+        # rerank rescores BM25 row numbers in the dense matrix; refuse to start on mismatched indexes
+        if settings.retrieval_mode == "rerank" and not lexical.shares_rows_with(searcher):
+            raise ValueError("RETRIEVAL_MODE=rerank needs LEXICAL_INDEX_DIR built over the LOCAL_INDEX_DIR index")
+    llm = VertexLLM(project=settings.project, location=settings.location, model=settings.gemini_model,
+                    executor=limits.llm.executor)
+    semantic_cache = None
+    if settings.semantic_cache_size > 0:
+        semantic_cache = SemanticCache(
+            threshold=settings.semantic_cache_threshold,
+            capacity=settings.semantic_cache_size,
+            ttl_secs=settings.semantic_cache_ttl_secs,
+            version_fn=index_version_fn(searcher, settings.index_version),
+        )
+    batcher = EmbeddingBatcher(
+        embedder,
+        max_batch=settings.embed_batch_max,
+        max_wait_ms=settings.embed_batch_wait_ms,
+        max_queue=settings.embed_queue_max,
+        executor=limits.encode.executor,
+    )
+    store = None
+    if settings.extractions_table and settings.summaries_table:
+        store = BigQueryExtractionStore(settings.project, settings.bq_table,
+                                        settings.extractions_table, settings.summaries_table)
+    # summaries share the chat pipeline's Gemini threads, so they take llm-stage slots too
+    extract = ExtractService(llm, store=store, cache_size=settings.extract_cache_size, llm_stage=limits.llm)
+    return Services(rag=RAGService(embedder=embedder, searcher=searcher, llm=llm,
+                                   semantic_cache=semantic_cache, batcher=batcher, lexical=lexical,
+                                   packer=packer, limits=limits),
+                    extract=extract)
+
+
+def get_services(request: Request) -> Services:
+    services = getattr(request.app.state, "services", None)
+    if services is None:
+        raise HTTPException(status_code=503, detail="Service is warming up.", headers={"Retry-After": "5"})
+    return services
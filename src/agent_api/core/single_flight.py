@@ -0,0 +1,36 @@
+# src/agent_api/core/single_flight.py
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs fn(), later callers
+    await the same result (or exception) instead of repeating the work.
+    The computation runs as its own task, so one caller disconnecting does not cancel it for the rest.
+    """
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._inflight)
+
+    def __contains__(self, key: Hashable):
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable], timeout: float | None = None):
+        """fn()'s result, shared with concurrent callers of the same key; this caller waits at most timeout."""
+        self.calls += 1
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.coalesced += 1
+        else:
+            fut = asyncio.ensure_future(fn())
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.wait_for(asyncio.shield(fut), timeout)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
@@ -0,0 +1,267 @@
+# src/agent_api/core/telemetry.py
+"""
+Timing spans, Prometheus metrics and request-id-tagged JSON logs for the API.
+
+    with span("search"):              # observes rag_stage_seconds{stage="search"} and adds to the request's timings
+        hits = searcher.search(...)
+    log("rag.retrieved", hits=5)      # one JSON line (Cloud Logging reads severity/message), tagged with request_id
+
+RequestContextMiddleware takes X-Request-ID from the request (or makes one), echoes it in the
+response, counts the request and logs a single "request" line with per-stage timings once the
+body has been sent, so streamed responses include generation time.
+
+No client library: the text exposition format is small, and every update is a dict lookup and an
+add under one lock, a few microseconds per request.
+"""
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Tuple
+
+_request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+_timings: ContextVar[Dict[str, float] | None] = ContextVar("timings", default=None)
+_lock = threading.Lock()
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}" if body else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help, self.kind = name, help, "counter"
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(k)} {v:g}" for k, v in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with _lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.kind = name, help, "histogram"
+        self.buckets = tuple(buckets)
+        self.values: Dict[tuple, list] = {}   # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        i = bisect_left(self.buckets, value)
+        with _lock:
+            v = self.values.get(key)
+            if v is None:
+                v = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            v[i] += 1
+            v[-1] += value
+
+    def samples(self) -> List[str]:
+        out = []
+        for key, v in sorted(self.values.items()):
+            cumulative = 0
+            for le, n in zip(self.buckets, v):
+                cumulative += n
+                out.append(f"{self.name}_bucket{_labels(key + (('le', f'{le:g}'),))} {cumulative}")
+            cumulative += v[len(self.buckets)]
+            out.append(f"{self.name}_bucket{_labels(key + (('le', '+Inf'),))} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(key)} {v[-1]:g}")
+            out.append(f"{self.name}_count{_labels(key)} {cumulative}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, extra: Iterable[Tuple[str, Dict, float]] = ()) -> str:
+        """Text exposition format. `extra` are (name, labels, value) gauges computed at scrape time."""
+        lines = []
+        with _lock:
+            for m in self.metrics:
+                lines += [f"# HELP {m.name} {m.help}", f"# TYPE {m.name} {m.kind}", *m.samples()]
+        seen = set()
+        for name, labels, value in extra:
+            if name not in seen:
+                lines.append(f"# TYPE {name} gauge")
+                seen.add(name)
+            lines.append(f"{name}{_labels(sorted(labels.items()))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+HTTP_REQUESTS = REGISTRY.register(Counter("http_requests_total", "HTTP requests by route, method and status."))
+HTTP_SECONDS = REGISTRY.register(Histogram("http_request_seconds", "HTTP request latency until the body is sent."))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge("http_requests_in_flight", "HTTP requests being served."))
+STAGE_SECONDS = REGISTRY.register(Histogram("rag_stage_seconds", "Latency of each RAG stage."))
+HITS_RETURNED = REGISTRY.register(Histogram("rag_hits_returned", "Hits returned by retrieval.", COUNT_BUCKETS))
+PROMPT_CHARS = REGISTRY.register(Histogram("rag_prompt_chars", "Characters in the Gemini prompt.", SIZE_BUCKETS))
+CACHE_LOOKUPS = REGISTRY.register(Counter("rag_cache_lookups_total", "Semantic cache lookups by result."))
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block: rag_stage_seconds{stage} and the current request's timings."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def observe_stage(stage: str, elapsed: float):
+    """Record a stage measured elsewhere (e.g. time to first token)."""
+    STAGE_SECONDS.observe(elapsed, stage=stage)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+# ---------- logs ----------
+logger = logging.getLogger("agent_api")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {"severity": record.levelname, "message": record.getMessage(), "time": round(record.created, 3)}
+        if getattr(record, "request_id", None):
+            out["request_id"] = record.request_id
+        out.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            out["exception"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: str = "INFO"):
+    if not any(isinstance(h.formatter, JsonFormatter) for h in logger.handlers):
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level.upper())
+
+
+def log(event: str, level: int = logging.INFO, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"request_id": _request_id.get(), "fields": fields})
+
+
+def current_request_id() -> str | None:
+    return _request_id.get()
+
+
+# ---------- scrape-time gauges ----------
+def _flatten(prefix: str, value, out: List[Tuple[str, Dict, float]]):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}_{''.join(c if c.isalnum() else '_' for c in str(k))}", v, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out.append((prefix, {}, float(value)))
+
+
+def stats_gauges(stats: Dict, prefix: str = "agent") -> List[Tuple[str, Dict, float]]:
+    """Services.stats() (cache hits, batcher queue depth, ...) as flat gauges, e.g. agent_embed_batcher_queue_depth."""
+    out: List[Tuple[str, Dict, float]] = []
+    _flatten(prefix, stats, out)
+    return out
+
+
+def executor_gauges(executors: Dict[str, object]) -> List[Tuple[str, Dict, float]]:
+    """
+    Queue depth and threads of the app's ThreadPoolExecutors, by name. These are not public
+    ThreadPoolExecutor attributes, so other executors (or a future CPython) just report nothing.
+    """
+    out: List[Tuple[str, Dict, float]] = []
+    for name, executor in executors.items():
+        queue, threads = getattr(executor, "_work_queue", None), getattr(executor, "_threads", None)
+        if queue is not None and hasattr(queue, "qsize"):
+            out.append(("executor_queue_depth", {"executor": name}, float(queue.qsize())))
+        if threads is not None:
+            out.append(("executor_threads", {"executor": name}, float(len(threads))))
+    return out
+
+
+# ---------- middleware ----------
+QUIET_PATHS = frozenset({"/healthz", "/metrics"})   # probes and scrapes log at DEBUG
+
+
+def _route_label(scope) -> str:
+    # matched routes only, so unknown paths cannot blow up label cardinality
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    return getattr(route, "path", None) if scope.get("path_params") else scope["path"]
+
+
+class RequestContextMiddleware:
+    """Pure ASGI (does not buffer streamed bodies)."""
+    def __init__(self, app, header: str = "x-request-id"):
+        self.app = app
+        self.header = header.encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rid = next((v.decode("latin-1") for k, v in scope.get("headers", []) if k == self.header), None)
+        rid = rid or uuid.uuid4().hex
+        rid_token, timings_token = _request_id.set(rid), _timings.set({})
+        status = 500
+        t0 = time.perf_counter()
+        HTTP_IN_FLIGHT.inc(1)
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (self.header, rid.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed = time.perf_counter() - t0
+            HTTP_IN_FLIGHT.inc(-1)
+            route = _route_label(scope)
+            HTTP_REQUESTS.inc(route=route, method=scope["method"], status=str(status))
+            HTTP_SECONDS.observe(elapsed, route=route)
+            stages = {k: round(v * 1000, 2) for k, v in (_timings.get() or {}).items()}
+            quiet = scope["path"] in QUIET_PATHS and status < 400
+            log("request", logging.DEBUG if quiet else logging.INFO, method=scope["method"], path=scope["path"],
+                status=status, duration_ms=round(elapsed * 1000, 2), stages_ms=stages)
+            _request_id.reset(rid_token)
+            _timings.reset(timings_token)
@@ -1,10 +1,82 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable
+
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
 from src.agent_api.api.v1.chat import router as chat_router
+from src.agent_api.api.v1.extract import router as extract_router
+from src.agent_api.core.config import settings
+from src.agent_api.core.services import Services, build_services, get_services
+from src.agent_api.core.telemetry import (REGISTRY, RequestContextMiddleware, configure_logging, executor_gauges,
+                                          log, stats_gauges)
+
+
+async def _start_services(app: FastAPI, factory: Callable[[], Services]):
+    # Runs in the background so the port opens (and /healthz answers 503) while models load.
+    try:
+        services = await asyncio.to_thread(factory)
+        await asyncio.to_thread(services.warm_up)
+        app.state.services = services
+        log("startup.ready")
+    except Exception as e:
+        app.state.startup_error = repr(e)
+        log("startup.failed", logging.ERROR, error=repr(e))
+
+
+def create_app(services_factory: Callable[[], Services] = build_services) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.services = None
+        app.state.startup_error = None
+        # asyncio.to_thread work; the app owns it so /metrics can report on it
+        app.state.default_executor = ThreadPoolExecutor(thread_name_prefix="asyncio")
+        asyncio.get_running_loop().set_default_executor(app.state.default_executor)
+        task = asyncio.create_task(_start_services(app, services_factory))
+        yield
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        if app.state.services is not None:
+            await app.state.services.close()
+
+    configure_logging(settings.log_level)
+    app = FastAPI(title="ArXiv Research Agent (GCP)", lifespan=lifespan)
+    app.add_middleware(RequestContextMiddleware)
+    app.include_router(chat_router, prefix="/v1")
+    app.include_router(extract_router, prefix="/v1")
+
+    @app.get("/healthz")
+    def healthz(request: Request):
+        ready = getattr(request.app.state, "services", None) is not None
+        body = {"ok": ready, "ready": ready}
+        error = getattr(request.app.state, "startup_error", None)
+        if error:
+            body["error"] = error
+        return JSONResponse(body, status_code=200 if ready else 503)
+
+    @app.get("/stats")
+    def stats(services: Services = Depends(get_services)):
+        return services.stats()
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics(request: Request):
+        """Prometheus text format: request/stage histograms, counters, and /stats as gauges."""
+        services = getattr(request.app.state, "services", None)
+        executors = {"default": getattr(request.app.state, "default_executor", None)}
+        if services is not None:
+            executors.update(services.executors())
+        extra = executor_gauges(executors)
+        if services is not None:
+            extra += stats_gauges(services.stats())
+        return PlainTextResponse(REGISTRY.render(extra), media_type="text/plain; version=0.0.4")
 
-app = FastAPI(title="ArXiv Research Agent (GCP)")
-app.include_router(chat_router, prefix="/v1")
+    return app
 
-@app.get("/healthz")
-def healthz():
-    return {"ok": True}
 
+app = create_app()
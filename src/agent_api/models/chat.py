@@ -1,12 +1,45 @@
 # src/agent_api/models/chat.py
-from pydantic import BaseModel
-from typing import List, Any, Optional
+from datetime import date
+from pydantic import BaseModel, Field
+from typing import List, Any, Literal, Optional, Dict
 
-class ChatRequest(BaseModel):
+class _Filters(BaseModel):
+    categories: Optional[List[str]] = Field(None, description="Keep chunks with any of these arXiv categories, e.g. ['cs.CL']")
+    update_date_from: Optional[date] = None
+    update_date_to: Optional[date] = None
+
+    def filters(self) -> Dict:
+        """Retrieval filters, with unset ones dropped."""
+        f = {
+            "categories": self.categories,
+            "update_date_from": self.update_date_from,
+            "update_date_to": self.update_date_to,
+        }
+        return {k: v for k, v in f.items() if v}
+
+class ChatRequest(_Filters):
     question: str
     k: Optional[int] = 5
+    retrieval_mode: Optional[Literal["dense", "lexical", "hybrid", "rerank"]] = Field(
+        None, description="dense (default: RETRIEVAL_MODE), lexical (BM25), hybrid (RRF of both) "
+                          "or rerank (BM25 candidates rescored by embeddings)")
 
 class ChatResponse(BaseModel):
     answer: str
     citations: List[str]
     matches: List[Any]
+
+class ChatBatchRequest(_Filters):
+    questions: List[str] = Field(..., min_length=1)
+    k: Optional[int] = 5
+    stream: bool = Field(False, description="Return NDJSON lines as items finish instead of one JSON body")
+
+class ChatBatchItem(BaseModel):
+    index: int
+    answer: Optional[str] = None
+    citations: Optional[List[str]] = None
+    matches: Optional[List[Any]] = None
+    error: Optional[str] = None
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatBatchItem]
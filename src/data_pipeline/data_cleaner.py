@@ -1,5 +1,6 @@
-import argparse, json
-from typing import Dict, Iterable
+import argparse, heapq, json, math, os, re, shutil, tempfile, time, zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Tuple
 from datetime import datetime
 from src.shared.gcp_clients import GCSClient
 from tqdm import tqdm
@@ -56,10 +57,143 @@ def run(input_uri: str, output_uri: str, limit: int | None = None):
     write_jsonl_gcs(gcs, output_uri, latest_by_id.values())
     print(f"Wrote cleaned dataset to {output_uri}")
 
+# ---------- Parallel, bounded-memory mode ----------
+# Map: byte ranges of the input are parsed and cleaned by a process pool, and each cleaned record
+#      is spilled to one of P hash partitions (by id) as [offset, date_key, record].
+# Reduce: each partition is deduplicated on its own (so peak memory ~ one partition), keeping the
+#      record with the greatest date (ties: earliest in the file), emitted in first-seen order.
+# Merge: partitions are k-way merged by first-seen offset, so the output is identical to run().
+
+_ISO_DATE = re.compile(rb"\d{4}-\d{2}-\d{2}")
+_MIN_DATE = "0001-01-01"   # datetime.min, for missing/unparseable dates
+
+
+def date_key(value) -> str:
+    """
+    String that orders like datetime.strptime(value, "%Y-%m-%d") in run(). Zero-padded ISO dates
+    are already in that form; other spellings strptime accepts (e.g. "2020-1-5") are normalized.
+    """
+    if isinstance(value, str) and len(value) == 10 and _ISO_DATE.fullmatch(value.encode()):
+        month, day = int(value[5:7]), int(value[8:10])
+        if 1 <= month <= 12 and 1 <= day <= 28:
+            return value
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except Exception:
+        return _MIN_DATE
+
+
+def _partition(id_key: str, partitions: int) -> int:
+    return zlib.crc32(id_key.encode("utf-8")) % partitions
+
+
+def _clean_range(input_uri: str, start: int, end: int, spill_dir: str, task: int, partitions: int) -> int:
+    """Clean the lines that *start* in [start, end) and spill them by partition."""
+    gcs = GCSClient()
+    outs = [open(os.path.join(spill_dir, f"map-{task:05d}-{p:04d}.jsonl"), "w", encoding="utf-8")
+            for p in range(partitions)]
+    n = 0
+    try:
+        with gcs.open(input_uri, "rb") as f:
+            if start > 0:
+                f.seek(start - 1)
+                f.readline()             # finish the line that straddles `start`
+            pos = f.tell()
+            while pos < end:
+                line = f.readline()
+                if not line:
+                    break
+                offset, pos = pos, pos + len(line)
+                if not line.strip():
+                    continue
+                clean = clean_record(json.loads(line))
+                if not clean:
+                    continue
+                id_key = json.dumps(clean["id"])
+                outs[_partition(id_key, partitions)].write(
+                    json.dumps([offset, date_key(clean["update_date"]), clean], ensure_ascii=False) + "\n")
+                n += 1
+    finally:
+        for o in outs:
+            o.close()
+    return n
+
+
+def _reduce_partition(spill_dir: str, part: int, tasks: int) -> Tuple[str, int]:
+    """Dedup one partition; write [first_offset, record] lines sorted by first_offset."""
+    best: Dict[str, list] = {}   # id_key -> [first_offset, best_date, best_offset, record]
+    for task in range(tasks):
+        path = os.path.join(spill_dir, f"map-{task:05d}-{part:04d}.jsonl")
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                offset, dkey, rec = json.loads(line)
+                id_key = json.dumps(rec["id"])
+                cur = best.get(id_key)
+                if cur is None:
+                    best[id_key] = [offset, dkey, offset, rec]
+                    continue
+                cur[0] = min(cur[0], offset)
+                # same rule as run(): a later record wins only with a strictly newer date
+                if dkey > cur[1] or (dkey == cur[1] and offset < cur[2]):
+                    cur[1], cur[2], cur[3] = dkey, offset, rec
+        os.remove(path)
+    out_path = os.path.join(spill_dir, f"reduce-{part:04d}.jsonl")
+    with open(out_path, "w", encoding="utf-8") as out:
+        for first, _, _, rec in sorted(best.values(), key=lambda v: v[0]):
+            out.write(json.dumps([first, rec], ensure_ascii=False) + "\n")
+    return out_path, len(best)
+
+
+def _iter_reduced(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def run_parallel(input_uri: str, output_uri: str, workers: int = os.cpu_count() or 1,
+                 memory_budget_mb: int = 1024, spill_dir: str | None = None,
+                 range_mb: int = 64) -> Dict:
+    """
+    Same output as run() (same records, same order), using a process pool over byte ranges
+    and hash-partitioned spill files so no process holds more than ~memory_budget_mb of records.
+    """
+    gcs = GCSClient()
+    size = gcs.size(input_uri)
+    range_bytes = max(1, int(range_mb * 1024 * 1024))
+    ranges = [(s, min(s + range_bytes, size)) for s in range(0, size, range_bytes)] or [(0, 0)]
+    # Cleaned records (mostly the abstract) are ~ input size; dicts in memory ~3x that.
+    # at least one partition per worker so the reduce step is parallel too
+    partitions = max(workers, math.ceil(3 * size / (memory_budget_mb * 1024 * 1024)), 1)
+    tmp = tempfile.mkdtemp(prefix="clean-spill-", dir=spill_dir)
+    t0 = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            cleaned = sum(pool.map(_clean_range, *zip(*[
+                (input_uri, s, e, tmp, i, partitions) for i, (s, e) in enumerate(ranges)])))
+            reduced = list(pool.map(_reduce_partition, [tmp] * partitions, range(partitions), [len(ranges)] * partitions))
+
+        kept = sum(n for _, n in reduced)
+        print(f"Keeping {kept} cleaned records ({cleaned} before dedup, {partitions} partitions).")
+        merged = heapq.merge(*[_iter_reduced(p) for p, _ in reduced], key=lambda v: v[0])
+        write_jsonl_gcs(gcs, output_uri, (rec for _, rec in merged))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(f"Wrote cleaned dataset to {output_uri} in {time.perf_counter() - t0:.1f}s")
+    return {"cleaned": cleaned, "kept": kept, "partitions": partitions, "ranges": len(ranges)}
+
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--input", required=True, help="gs://.../raw/arxiv.jsonl")
     ap.add_argument("--output", required=True, help="gs://.../clean/arxiv_clean.jsonl")
     ap.add_argument("--limit", type=int, default=None, help="limit records for quick tests")
+    ap.add_argument("--workers", type=int, default=1, help=">1 enables the parallel, bounded-memory mode")
+    ap.add_argument("--memory_budget_mb", type=int, default=1024, help="parallel mode: approx. memory per process")
+    ap.add_argument("--spill_dir", default=None, help="parallel mode: local scratch dir (default: system temp)")
     args = ap.parse_args()
-    run(args.input, args.output, limit=args.limit)
+    if args.workers > 1 and args.limit:
+        ap.error("--limit reads the first N records in order; it cannot be combined with --workers > 1")
+    if args.workers > 1:
+        run_parallel(args.input, args.output, workers=args.workers,
+                     memory_budget_mb=args.memory_budget_mb, spill_dir=args.spill_dir)
+    else:
+        run(args.input, args.output, limit=args.limit)
@@ -1,7 +1,10 @@
-import argparse, json
-from typing import Dict, Iterable, List
+import argparse, json, posixpath, queue, threading, time
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List
 from tqdm import tqdm
 
+from src.data_pipeline import embed_manifest
+from src.shared import embed_parquet, quantize as quant
 from src.shared.gcp_clients import (
     GCSClient,
     VertexEmbeddings,
@@ -23,6 +26,191 @@ def chunk_text(txt: str, max_words: int = 180) -> List[str]:
     words = (txt or "").split()
     return [" ".join(words[i:i+max_words]) for i in range(0, len(words), max_words)]
 
+_DONE = object()
+
+
+def iter_chunk_batches(records: Iterable[Dict], batch_size: int, stats: Dict,
+                       keep: Callable[[Dict], bool] | None = None) -> Iterator[List[Dict]]:
+    """
+    Chunk every abstract and group the chunks into batches of batch_size *across* documents
+    (most abstracts are a single chunk, so per-document batches would all be size 1).
+    keep(row) -> False skips a chunk (e.g. unchanged since the last run).
+    """
+    batch: List[Dict] = []
+    for rec in records:
+        abstract = (rec.get("abstract") or "").strip()
+        if not abstract:
+            continue
+        stats["docs"] += 1
+        doc_id = rec.get("id")
+        title = (rec.get("title") or "").strip()
+        for idx, chunk in enumerate(chunk_text(abstract)):
+            row = {
+                "id": f"{doc_id}#{idx}",
+                "doc_id": doc_id,
+                "title": title,
+                "chunk_index": idx,
+                "chunk_text": chunk,
+            }
+            if keep is not None and not keep(row):
+                stats["skipped"] += 1
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+class JsonlSink:
+    """Writer-stage sink: embeddings rows and store rows to two JSONL files."""
+    def __init__(self, gcs: GCSClient, embeddings_uri: str, store_uri: str):
+        self._files = (gcs.open(embeddings_uri, "w"), gcs.open(store_uri, "w"))
+        self._emb = self._store = None
+
+    def __enter__(self):
+        self._emb, self._store = (f.__enter__() for f in self._files)
+        return self
+
+    def write(self, batch: List[Dict], vecs: List[List[float]]):
+        for row, vec in zip(batch, vecs):
+            self._emb.write(json.dumps({"id": row["id"], "embedding": vec}, ensure_ascii=False) + "\n")
+            self._store.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def __exit__(self, *exc):
+        for f in self._files:
+            f.__exit__(*exc)
+        return False
+
+
+def _put(q: queue.Queue, item, failed: threading.Event):
+    # bounded put that gives up if another stage has failed (avoids deadlock on a full queue)
+    while not failed.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def stream_embeddings(
+    embedder,
+    gcs: GCSClient,
+    input_uri: str,
+    embeddings_uri: str,
+    store_uri: str,
+    batch_size: int = 16,
+    limit: int | None = None,
+    queue_depth: int = 8,
+    keep: Callable[[Dict], bool] | None = None,
+    sink=None,
+) -> Dict:
+    """
+    Reader thread -> encoder (this thread) -> writer thread, connected by bounded queues.
+    At most ~2 * queue_depth batches plus the embedder's lookahead (see in_flight below) are in
+    memory at any time, and rows are written as soon as they are encoded, so memory stays flat
+    regardless of corpus size.
+    sink defaults to JsonlSink(embeddings_uri, store_uri); see embed_manifest.CheckpointSink.
+    """
+    stats = {"docs": 0, "chunks": 0, "skipped": 0}
+    sink = sink if sink is not None else JsonlSink(gcs, embeddings_uri, store_uri)
+    to_encode: queue.Queue = queue.Queue(maxsize=queue_depth)
+    to_write: queue.Queue = queue.Queue(maxsize=queue_depth)
+    failed = threading.Event()
+    errors: List[BaseException] = []
+
+    def reader():
+        try:
+            for batch in iter_chunk_batches(iter_jsonl_gcs(gcs, input_uri, limit=limit), batch_size, stats, keep=keep):
+                if not _put(to_encode, batch, failed):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            failed.set()
+        finally:
+            _put(to_encode, _DONE, failed)
+
+    def writer():
+        try:
+            with sink:
+                while True:
+                    try:
+                        item = to_write.get(timeout=0.5)
+                    except queue.Empty:
+                        if failed.is_set():
+                            return
+                        continue
+                    if item is _DONE:
+                        break
+                    batch, vecs = item
+                    sink.write(batch, vecs)
+                    stats["chunks"] += len(batch)
+        except BaseException as e:
+            errors.append(e)
+            failed.set()
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=reader, name="embed-reader", daemon=True),
+               threading.Thread(target=writer, name="embed-writer", daemon=True)]
+    for t in threads:
+        t.start()
+
+    in_flight = deque()
+
+    def texts():
+        # pulls batches off the reader queue; rows wait in in_flight until their vectors return
+        while not failed.is_set():
+            try:
+                batch = to_encode.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if batch is _DONE:
+                return
+            in_flight.append(batch)
+            yield [r["chunk_text"] for r in batch]
+
+    # embed_batches reads ahead of what it yields: VertexEmbeddings keeps up to max_concurrency
+    # requests in flight, LocalEmbeddings pools batches up to sort_window texts for one length-sorted
+    # encode. in_flight holds those batches' rows, so it is bounded by the lookahead, not by queue_depth.
+    # Embedders without embed_batches encode one batch at a time.
+    embed_batches = getattr(embedder, "embed_batches", None) or (lambda it: (embedder.embed_texts_sync(t) for t in it))
+
+    progress = tqdm(desc="embedding", unit="chunk")
+    try:
+        for vecs in embed_batches(texts()):
+            batch = in_flight.popleft()
+            if not _put(to_write, (batch, vecs), failed):
+                break
+            progress.update(len(batch))
+    except BaseException as e:
+        errors.append(e)
+        failed.set()
+    finally:
+        _put(to_write, _DONE, failed)
+        for t in threads:
+            t.join()
+        progress.close()
+
+    if errors:
+        raise errors[0]
+
+    elapsed = max(time.perf_counter() - t0, 1e-9)
+    stats.update(
+        elapsed_secs=round(elapsed, 3),
+        docs_per_sec=round(stats["docs"] / elapsed, 2),
+        chunks_per_sec=round(stats["chunks"] / elapsed, 2),
+    )
+    return stats
+
+
+def default_codes_uri(embeddings_uri: str) -> str:
+    """<embeddings>.codes.parquet next to the embeddings; only the file name's extension is replaced."""
+    head, name = posixpath.split(embeddings_uri.rstrip("/"))
+    return posixpath.join(head, posixpath.splitext(name)[0] + ".codes.parquet")
+
+
 def run(
     project: str,
     location: str,
@@ -32,53 +220,95 @@ def run(
     store_uri: str,
     batch_size: int = 16,
     limit: int | None = None,
-    batch_sleep_secs: float = 1.5,
     max_retries: int = 6,
     provider: str = "vertex",
     local_model: str = "intfloat/e5-small-v2",
+    local_backend: str = "torch",
+    local_threads: int = 0,
+    max_seq_length: int = 0,
+    queue_depth: int = 8,
+    requests_per_min: float | None = 600,
+    tokens_per_min: float | None = None,
+    max_concurrency: int = 8,
+    manifest_uri: str | None = None,
+    deletes_uri: str | None = None,
+    checkpoint_dir: str | None = None,
+    checkpoint_every: int = 5000,
+    output_format: str = "jsonl",
+    embedder=None,
+    quantize: bool = False,
+    codes_uri: str | None = None,
 ):
+    """
+    output_format="parquet" writes one sharded Parquet artifact to embeddings_uri
+    (store columns + FixedSizeList<float32> embedding; see src/shared/embed_parquet.py)
+    and store_uri is unused.
+    quantize=True also writes int8 + binary codes to codes_uri (default: <embeddings>.codes.parquet),
+    for `python -m src.shared.quantize --codes`.
+    """
     gcs = GCSClient()
+    if output_format == "parquet" and manifest_uri:
+        raise ValueError("--format parquet is not supported with --manifest (incremental deltas are JSONL)")
+    if quantize and manifest_uri:
+        raise ValueError("--quantize is not supported with --manifest (codes must cover the whole corpus)")
 
-    if provider.lower() == "local":
-        embedder = LocalEmbeddings(model_name=local_model)
-    else:
-        embedder = VertexEmbeddings(
-            project=project,
-            location=location,
-            model=embed_model,
-            batch_sleep_secs=batch_sleep_secs,
-            max_retries=max_retries,
+    if embedder is None:
+        if provider.lower() == "local":
+            embedder = LocalEmbeddings(model_name=local_model, backend=local_backend, threads=local_threads,
+                                       max_seq_length=max_seq_length)
+        else:
+            embedder = VertexEmbeddings(
+                project=project,
+                location=location,
+                model=embed_model,
+                requests_per_min=requests_per_min,
+                tokens_per_min=tokens_per_min,
+                max_concurrency=max_concurrency,
+                max_retries=max_retries,
+            )
+
+    if not manifest_uri:
+        sink = embed_parquet.ParquetSink(gcs, embeddings_uri) if output_format == "parquet" else None
+        if quantize:
+            codes_uri = codes_uri or default_codes_uri(embeddings_uri)
+            sink = quant.QuantizedSink(sink or JsonlSink(gcs, embeddings_uri, store_uri), gcs, codes_uri)
+        stats = stream_embeddings(
+            embedder, gcs, input_uri, embeddings_uri, store_uri,
+            batch_size=batch_size, limit=limit, queue_depth=queue_depth, sink=sink,
         )
+    else:
+        # Incremental: embed only new/changed chunks, checkpointing parts so a crash can resume.
+        model_name = getattr(embedder, "model_id", None) or (local_model if provider.lower() == "local" else embed_model)
+        checkpoint_dir = checkpoint_dir or manifest_uri + ".checkpoint"
+        deletes_uri = deletes_uri or embeddings_uri.rsplit(".", 1)[0] + ".deletes.jsonl"
+        manifest = embed_manifest.load_manifest(gcs, manifest_uri)
+        current = {**manifest, **embed_manifest.load_checkpoint(gcs, checkpoint_dir)}
+        seen = set()
 
-    store_rows, embed_rows = [], []
+        def keep(row):
+            seen.add(row["id"])
+            return current.get(row["id"]) != embed_manifest.content_hash(row["chunk_text"], model_name)
 
-    for rec in tqdm(iter_jsonl_gcs(gcs, input_uri, limit=limit), desc="processing"):
-        doc_id = rec.get("id")
-        title = (rec.get("title") or "").strip()
-        abstract = (rec.get("abstract") or "").strip()
-        if not abstract:
-            continue
+        sink = embed_manifest.CheckpointSink(gcs, checkpoint_dir, model_name, every=checkpoint_every)
+        stats = stream_embeddings(
+            embedder, gcs, input_uri, embeddings_uri, store_uri,
+            batch_size=batch_size, limit=limit, queue_depth=queue_depth, keep=keep, sink=sink,
+        )
+        # with --limit we did not see the whole corpus, so absence does not mean deleted
+        delta = embed_manifest.finalize(gcs, checkpoint_dir, manifest_uri, manifest,
+                                        seen if not limit else None, embeddings_uri, store_uri, deletes_uri)
+        stats.update(delta)
+        print(f"Delta: {delta['upserts']} upserts, {delta['deletes']} deletes -> {deletes_uri}; "
+              f"{stats['skipped']} unchanged chunks skipped")
 
-        chunks = chunk_text(abstract)
-        for i in range(0, len(chunks), batch_size):
-            batch = chunks[i:i+batch_size]
-            vecs = embedder.embed_texts_sync(batch)
-            for j, vec in enumerate(vecs):
-                idx = i + j
-                vector_id = f"{doc_id}#{idx}"
-                embed_rows.append({"id": vector_id, "embedding": vec})
-                store_rows.append({
-                    "id": vector_id,
-                    "doc_id": doc_id,
-                    "title": title,
-                    "chunk_index": idx,
-                    "chunk_text": batch[j],
-                })
-
-    write_jsonl_gcs(gcs, embeddings_uri, embed_rows)
-    write_jsonl_gcs(gcs, store_uri, store_rows)
     print(f"Wrote embeddings -> {embeddings_uri}")
-    print(f"Wrote store -> {store_uri}")
+    if quantize:
+        print(f"Wrote int8/binary codes -> {codes_uri}")
+    if output_format != "parquet":
+        print(f"Wrote store -> {store_uri}")
+    print(f"{stats['docs']} docs, {stats['chunks']} chunks in {stats['elapsed_secs']}s "
+          f"({stats['docs_per_sec']} docs/s, {stats['chunks_per_sec']} chunks/s)")
+    return stats
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
@@ -87,14 +317,31 @@ if __name__ == "__main__":
     ap.add_argument("--embed_model", default="text-embedding-004")
     ap.add_argument("--input", required=True)
     ap.add_argument("--embeddings", required=True)
-    ap.add_argument("--store", required=True)
+    ap.add_argument("--store", default=None, help="store JSONL (jsonl format only)")
+    ap.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl",
+                    help="parquet: --embeddings is a *.parquet shard directory holding vectors and store rows")
     ap.add_argument("--limit", type=int, default=None)
     ap.add_argument("--batch_size", type=int, default=16)
-    ap.add_argument("--batch_sleep_secs", type=float, default=1.5)
     ap.add_argument("--max_retries", type=int, default=6)
     ap.add_argument("--provider", choices=["vertex","local"], default="vertex")
     ap.add_argument("--local_model", default="intfloat/e5-small-v2")
+    ap.add_argument("--local_backend", choices=["torch", "onnx", "onnx-int8"], default="torch",
+                    help="local: inference runtime (onnx / onnx-int8 export once to ~/.cache/arxiv-agent/onnx)")
+    ap.add_argument("--local_threads", type=int, default=0, help="local: intra-op threads (0 = all cores)")
+    ap.add_argument("--max_seq_length", type=int, default=0, help="local: truncate chunks to this many tokens (0 = model max)")
+    ap.add_argument("--rpm", type=float, default=600, help="vertex: requests per minute budget")
+    ap.add_argument("--tpm", type=float, default=None, help="vertex: tokens per minute budget")
+    ap.add_argument("--max_concurrency", type=int, default=8, help="vertex: upper bound on batches in flight")
+    ap.add_argument("--manifest", default=None, help="enables incremental runs: id/content-hash manifest (JSONL)")
+    ap.add_argument("--deletes", default=None, help="incremental: where to write removed ids (default: next to --embeddings)")
+    ap.add_argument("--checkpoint_dir", default=None, help="incremental: part files for resume (default: <manifest>.checkpoint)")
+    ap.add_argument("--checkpoint_every", type=int, default=5000, help="incremental: chunks per checkpoint part")
+    ap.add_argument("--queue_depth", type=int, default=8, help="batches buffered between read/encode/write stages")
+    ap.add_argument("--quantize", action="store_true", help="also write int8 + binary codes (src/shared/quantize.py)")
+    ap.add_argument("--codes", default=None, help="with --quantize: codes artifact (default: <embeddings>.codes.parquet)")
     args = ap.parse_args()
+    if args.format == "jsonl" and not args.store:
+        ap.error("--store is required with --format jsonl")
     run(
         project=args.project,
         location=args.location,
@@ -104,8 +351,21 @@ if __name__ == "__main__":
         store_uri=args.store,
         batch_size=args.batch_size,
         limit=args.limit,
-        batch_sleep_secs=args.batch_sleep_secs,
         max_retries=args.max_retries,
         provider=args.provider,
         local_model=args.local_model,
+        local_backend=args.local_backend,
+        local_threads=args.local_threads,
+        max_seq_length=args.max_seq_length,
+        queue_depth=args.queue_depth,
+        requests_per_min=args.rpm,
+        tokens_per_min=args.tpm,
+        max_concurrency=args.max_concurrency,
+        manifest_uri=args.manifest,
+        deletes_uri=args.deletes,
+        checkpoint_dir=args.checkpoint_dir,
+        checkpoint_every=args.checkpoint_every,
+        output_format=args.format,
+        quantize=args.quantize,
+        codes_uri=args.codes,
     )
@@ -0,0 +1,154 @@
+# src/data_pipeline/embed_manifest.py
+"""
+Incremental / resumable embedding runs.
+
+The manifest is a JSONL file of {"id": vector_id, "hash": sha1(model + chunk_text)} for every
+chunk currently embedded. A run with --manifest only embeds chunks whose hash is new or changed
+and lists vanished ids as deletes. It writes an append-friendly delta:
+    --embeddings / --store   upserted rows only (same schema as a full run)
+    --deletes                {"id": ...} per removed chunk
+
+While running, output goes to numbered part files in a checkpoint dir. Every `checkpoint_every`
+chunks the current part is closed and its manifest-NNNNN.jsonl is written last, which marks the
+part complete. A run that was interrupted and restarted with the same arguments treats completed
+parts as already embedded and continues from there.
+"""
+import hashlib, json
+from typing import Dict, Iterable, List
+
+from src.shared.gcp_clients import GCSClient
+
+
+def content_hash(chunk_text: str, model_name: str) -> str:
+    return hashlib.sha1(f"{model_name}\x00{chunk_text or ''}".encode("utf-8")).hexdigest()
+
+
+def load_manifest(gcs: GCSClient, uri: str) -> Dict[str, str]:
+    if not gcs.exists(uri):
+        return {}
+    out = {}
+    with gcs.open(uri, "r") as f:
+        for line in f:
+            if line.strip():
+                rec = json.loads(line)
+                out[rec["id"]] = rec["hash"]
+    return out
+
+
+def write_manifest(gcs: GCSClient, uri: str, manifest: Dict[str, str]):
+    with gcs.open(uri, "w") as f:
+        for vid, h in manifest.items():
+            f.write(json.dumps({"id": vid, "hash": h}) + "\n")
+
+
+def _part(checkpoint_dir: str, kind: str, n: int) -> str:
+    return f"{checkpoint_dir.rstrip('/')}/{kind}-{n:05d}.jsonl"
+
+
+def completed_parts(gcs: GCSClient, checkpoint_dir: str) -> List[int]:
+    return sorted(int(p.rsplit("-", 1)[1].split(".")[0])
+                  for p in gcs.glob(f"{checkpoint_dir.rstrip('/')}/manifest-*.jsonl"))
+
+
+def load_checkpoint(gcs: GCSClient, checkpoint_dir: str) -> Dict[str, str]:
+    """id -> hash for everything already written by completed parts of an interrupted run."""
+    done: Dict[str, str] = {}
+    for n in completed_parts(gcs, checkpoint_dir):
+        done.update(load_manifest(gcs, _part(checkpoint_dir, "manifest", n)))
+    return done
+
+
+class CheckpointSink:
+    """
+    Writer-stage sink for embed_generator.stream_embeddings that rotates part files
+    every `every` chunks. A part counts as complete once its manifest file exists.
+    """
+    def __init__(self, gcs: GCSClient, checkpoint_dir: str, model_name: str, every: int = 5000):
+        self.gcs = gcs
+        self.checkpoint_dir = checkpoint_dir
+        self.model_name = model_name
+        self.every = every
+        existing = completed_parts(gcs, checkpoint_dir)
+        self._next_part = (existing[-1] + 1) if existing else 0
+        self._files = None
+        self._entries: List[tuple] = []
+
+    def _open_part(self):
+        n = self._next_part
+        self._files = (
+            self.gcs.open(_part(self.checkpoint_dir, "embeddings", n), "w").open(),
+            self.gcs.open(_part(self.checkpoint_dir, "store", n), "w").open(),
+        )
+        self._entries = []
+
+    def _close_part(self):
+        if self._files is None:
+            return
+        for f in self._files:
+            f.close()
+        self._files = None
+        # written last: its presence is what makes the part count as done
+        write_manifest(self.gcs, _part(self.checkpoint_dir, "manifest", self._next_part), dict(self._entries))
+        print(f"[checkpoint] part {self._next_part}: {len(self._entries)} chunks")
+        self._next_part += 1
+
+    def __enter__(self):
+        return self
+
+    def write(self, batch: List[Dict], vecs: List[List[float]]):
+        if self._files is None:
+            self._open_part()
+        f_emb, f_store = self._files
+        for row, vec in zip(batch, vecs):
+            f_emb.write(json.dumps({"id": row["id"], "embedding": vec}, ensure_ascii=False) + "\n")
+            f_store.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._entries.append((row["id"], content_hash(row["chunk_text"], self.model_name)))
+        if len(self._entries) >= self.every:
+            self._close_part()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._close_part()
+        elif self._files is not None:
+            for f in self._files:   # incomplete part: no manifest, so it is redone on resume
+                f.close()
+            self._files = None
+        return False
+
+
+def _concat(gcs: GCSClient, sources: Iterable[str], dest: str):
+    with gcs.open(dest, "w") as out:
+        for src in sources:
+            with gcs.open(src, "r") as f:
+                for line in f:
+                    out.write(line)
+
+
+def finalize(gcs: GCSClient, checkpoint_dir: str, manifest_uri: str, manifest: Dict[str, str],
+             seen_ids: set | None, embeddings_uri: str, store_uri: str, deletes_uri: str) -> Dict:
+    """
+    Publish the delta and the new manifest, then clear the checkpoint dir.
+    seen_ids=None (partial run, e.g. --limit) means deletes can't be inferred and none are emitted.
+    """
+    parts = completed_parts(gcs, checkpoint_dir)
+    _concat(gcs, [_part(checkpoint_dir, "embeddings", n) for n in parts], embeddings_uri)
+    _concat(gcs, [_part(checkpoint_dir, "store", n) for n in parts], store_uri)
+
+    new_manifest = dict(manifest)
+    upserts = 0
+    for n in parts:
+        entries = load_manifest(gcs, _part(checkpoint_dir, "manifest", n))
+        upserts += len(entries)
+        new_manifest.update(entries)
+
+    deletes = [vid for vid in manifest if vid not in seen_ids] if seen_ids is not None else []
+    with gcs.open(deletes_uri, "w") as f:
+        for vid in deletes:
+            f.write(json.dumps({"id": vid}) + "\n")
+            new_manifest.pop(vid, None)
+
+    write_manifest(gcs, manifest_uri, new_manifest)
+    for n in parts:
+        for kind in ("embeddings", "store", "manifest"):
+            gcs.rm(_part(checkpoint_dir, kind, n))
+    return {"upserts": upserts, "deletes": len(deletes), "manifest_size": len(new_manifest)}
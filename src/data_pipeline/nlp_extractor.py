@@ -1,24 +1,174 @@
 # src/data_pipeline/nlp_extractor.py
+"""
+Batch NLP extraction: chunks from BigQuery -> Cloud Natural Language -> `arxiv_demo.extractions`.
+
+    python -m src.data_pipeline.nlp_extractor --project $GCP_PROJECT \
+      --source $GCP_PROJECT.arxiv_demo.chunks --table $GCP_PROJECT.arxiv_demo.extractions
+
+One LanguageServiceClient is shared by all workers, and each distinct chunk text costs a single
+annotateText call (entities + document sentiment); every chunk id with that text gets its own row.
+Chunks whose (id, content hash) is already in the table are skipped, so reruns only pay for new or
+changed text. Table DDL: src/shared/sql/extractions_table.sql
+"""
+import argparse, hashlib, json, threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List
+
 from google.cloud import language_v2 as language
 from google.cloud import bigquery
-import json
+from tqdm import tqdm
 
-def analyze(text: str):
-    client = language.LanguageServiceClient()
-    doc = {"content": text, "type_": language.Document.Type.PLAIN_TEXT}
-    ents = client.analyze_entities(document=doc).entities
-    sent = client.analyze_sentiment(document=doc).document_sentiment
+from src.shared.rate_limit import RateLimiter
+
+FEATURES = {"extract_entities": True, "extract_document_sentiment": True}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _default_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = language.LanguageServiceClient()
+        return _client
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+def to_extraction(resp) -> Dict:
+    # language_v2 entities carry no salience; the mention count is the closest signal
     return {
         "entities": [
-            {"name": e.name, "type": language.Entity.Type(e.type_).name, "salience": e.salience}
-            for e in ents
+            {"name": e.name, "type": language.Entity.Type(e.type_).name, "mentions": len(e.mentions)}
+            for e in resp.entities
         ],
-        "sentiment": {"score": sent.score, "magnitude": sent.magnitude},
+        "sentiment": {"score": resp.document_sentiment.score, "magnitude": resp.document_sentiment.magnitude},
+        "language_code": resp.language_code,
     }
 
-def write_bq(project: str, table: str, rows: list[dict]):
-    bq = bigquery.Client(project=project)
-    bq.insert_rows_json(table, rows)
 
-# Batch over a sample of documents/chunks:
-# read chunk_text + id,title from BQ, run analyze(), write to `${project}.arxiv_demo.extractions`
+def analyze(text: str, client=None) -> Dict:
+    client = client or _default_client()
+    doc = {"content": text, "type_": language.Document.Type.PLAIN_TEXT}
+    return to_extraction(client.annotate_text(document=doc, features=FEATURES))
+
+
+def write_bq(project: str, table: str, rows: list[dict], client=None):
+    bq = client or bigquery.Client(project=project)
+    errors = bq.insert_rows_json(table, rows)
+    if errors:
+        raise RuntimeError(f"insert into {table} failed for {len(errors)} rows: {errors[:3]}")
+
+
+class ExtractionWriter:
+    """Buffers extraction rows and streams them to BigQuery in batches of flush_rows."""
+    def __init__(self, project: str, table: str, client=None, flush_rows: int = 500):
+        self.project = project
+        self.table = table
+        self.client = client or bigquery.Client(project=project)
+        self.flush_rows = flush_rows
+        self.written = 0
+        self._rows: List[Dict] = []
+
+    def existing_keys(self) -> set:
+        job = self.client.query(f"SELECT DISTINCT id, content_hash FROM `{self.table}`")
+        return {(r["id"], r["content_hash"]) for r in job.result()}
+
+    def add(self, row: Dict):
+        self._rows.append(row)
+        if len(self._rows) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            write_bq(self.project, self.table, self._rows, client=self.client)
+            self.written += len(self._rows)
+            self._rows = []
+
+
+def read_chunks(client, source_table: str, limit: int | None = None) -> Iterable[Dict]:
+    """One item per distinct chunk text: {"chunk_text", "chunks": [{"id", "title"}, ...]}."""
+    sql = (f"SELECT chunk_text, ARRAY_AGG(STRUCT(id, title)) AS chunks FROM `{source_table}` "
+           f"GROUP BY chunk_text")
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    for r in client.query(sql).result():
+        yield {"chunk_text": r["chunk_text"], "chunks": [{"id": c["id"], "title": c["title"]} for c in r["chunks"]]}
+
+
+def run(project: str, source_table: str, table: str, limit: int | None = None,
+        concurrency: int = 8, requests_per_min: float | None = 600, flush_rows: int = 500,
+        language_client=None, bq_client=None) -> Dict:
+    bq = bq_client or bigquery.Client(project=project)
+    client = language_client or _default_client()
+    limiter = RateLimiter(requests_per_min=requests_per_min)
+    writer = ExtractionWriter(project, table, client=bq, flush_rows=flush_rows)
+    done = writer.existing_keys()
+    stats = {"chunks": 0, "skipped": 0, "analyzed": 0, "failed": 0}
+
+    def work(text: str, chunks: List[Dict], h: str) -> List[Dict]:
+        limiter.acquire()
+        ext = analyze(text, client=client)
+        extracted = {
+            "content_hash": h,
+            "entities": json.dumps(ext["entities"], ensure_ascii=False),
+            "sentiment_score": ext["sentiment"]["score"],
+            "sentiment_magnitude": ext["sentiment"]["magnitude"],
+            "language_code": ext["language_code"],
+            "extracted_at": datetime.now(timezone.utc).isoformat(),
+        }
+        return [{"id": c["id"], "title": c["title"], **extracted} for c in chunks]
+
+    def collect(futures):
+        for fut in futures:
+            try:
+                for row in fut.result():
+                    writer.add(row)
+                stats["analyzed"] += 1
+            except Exception as e:
+                # left out of the table, so the next run retries it
+                stats["failed"] += 1
+                print(f"[nlp_extractor] {fut.chunk_ids}: {type(e).__name__}: {e}")
+            progress.update(len(fut.chunk_ids))
+
+    pending = set()
+    progress = tqdm(desc="extracting", unit="chunk")
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="nlp") as pool:
+        for group in read_chunks(bq, source_table, limit):
+            # identical text elsewhere in the corpus is analyzed once, and written for every id
+            text, h = group["chunk_text"], content_hash(group["chunk_text"])
+            todo = [c for c in group["chunks"] if text and (c["id"], h) not in done]
+            stats["chunks"] += len(group["chunks"])
+            stats["skipped"] += len(group["chunks"]) - len(todo)
+            if not todo:
+                continue
+            if len(pending) >= 2 * concurrency:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            fut = pool.submit(work, text, todo, h)
+            fut.chunk_ids = [c["id"] for c in todo]
+            pending.add(fut)
+        collect(wait(pending)[0])
+    writer.flush()
+    progress.close()
+    stats["written"] = writer.written
+    print(f"[nlp_extractor] {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--project", required=True)
+    ap.add_argument("--source", required=True, help="chunks table: project.dataset.chunks")
+    ap.add_argument("--table", required=True, help="extractions table: project.arxiv_demo.extractions")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--rpm", type=float, default=600, help="Natural Language requests per minute budget")
+    ap.add_argument("--flush_rows", type=int, default=500, help="rows per streaming insert")
+    args = ap.parse_args()
+    run(args.project, args.source, args.table, limit=args.limit, concurrency=args.concurrency,
+        requests_per_min=args.rpm, flush_rows=args.flush_rows)
@@ -1,10 +1,13 @@
-import argparse, json
-from typing import Dict, Iterable, List
+import argparse, json, os, random, threading, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Tuple
 
+from google.api_core import exceptions as gexc
 from google.cloud import aiplatform
 from google.cloud.aiplatform_v1.types import IndexDatapoint
 from tqdm import tqdm
 
+from src.shared import embed_parquet
 from src.shared.gcp_clients import GCSClient
 
 # ---------- IO ----------
@@ -15,6 +18,19 @@ def iter_jsonl_gcs(gcs: GCSClient, uri: str, limit: int | None = None):
                 break
             yield json.loads(line)
 
+def iter_embeddings(gcs: GCSClient, uri: str, limit: int | None = None):
+    """{"id", "embedding"} records from embeddings JSONL or a *.parquet artifact."""
+    if not embed_parquet.is_parquet(uri):
+        yield from iter_jsonl_gcs(gcs, uri, limit=limit)
+        return
+    n = 0
+    for ids, mat in embed_parquet.iter_embeddings(gcs, uri):
+        for vid, vec in zip(ids, mat.tolist()):
+            if limit and n >= limit:
+                return
+            yield {"id": vid, "embedding": vec}
+            n += 1
+
 # ---------- Index lifecycle ----------
 def create_index(project: str, location: str, display_name: str, dim: int, distance: str):
     """
@@ -67,53 +83,222 @@ def make_datapoint(dp_id: str, vector: List[float]) -> IndexDatapoint:
     # Note: IndexDatapoint takes a plain list of floats for feature_vector
     return IndexDatapoint(datapoint_id=dp_id, feature_vector=vector)
 
+class UpsertLedger:
+    """
+    Append-only JSONL of acknowledged upsert batches: {"batch": n, "first_id": ..., "count": ...},
+    after a {"target": {...}} header naming the endpoint, deployed index and embeddings file.
+    Batches are numbered in file order, so a rerun with the same input and batch_size skips
+    every batch already acknowledged (first_id guards against a changed input). A ledger written
+    for another target (or without a header) is not resumed: it is replaced by a fresh one.
+    """
+    def __init__(self, path: str | None, target: Dict | None = None):
+        self.path = path
+        self.target = target or {}
+        self._done: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._f = None
+        if path:
+            resume = read_ledger_target(path) == self.target
+            if resume:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        rec = json.loads(line) if line.strip() else {}
+                        if "batch" in rec:
+                            self._done[rec["batch"]] = rec["first_id"]
+            elif os.path.exists(path):
+                print(f" Ledger {path} was written for another target; starting a fresh one.")
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._f = open(path, "a" if resume else "w", encoding="utf-8")
+            if not resume:
+                self._f.write(json.dumps({"target": self.target}) + "\n")
+                self._f.flush()
+
+    def __len__(self):
+        return len(self._done)
+
+    def is_done(self, batch: int, first_id: str) -> bool:
+        return self._done.get(batch) == first_id
+
+    def ack(self, batch: int, first_id: str, count: int):
+        with self._lock:
+            self._done[batch] = first_id
+            if self._f is not None:
+                self._f.write(json.dumps({"batch": batch, "first_id": first_id, "count": count}) + "\n")
+                self._f.flush()
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+
+
+def read_ledger_target(path: str | None) -> Dict | None:
+    """The target recorded in a ledger's header, or None without a ledger (or an old one without a header)."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        first = f.readline()
+    return json.loads(first).get("target") if first.strip() else None
+
+
+# Transient errors worth retrying; anything else (e.g. InvalidArgument) fails the load at once.
+RETRYABLE = (
+    gexc.ServiceUnavailable, gexc.ResourceExhausted, gexc.DeadlineExceeded,
+    gexc.InternalServerError, gexc.Aborted, gexc.TooManyRequests, ConnectionError, TimeoutError,
+)
+
+
+def call_with_retry(fn, *args, max_retries: int = 6, max_backoff_secs: float = 32.0,
+                    sleep=time.sleep, on_retry=None, **kwargs):
+    for attempt in range(max_retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except RETRYABLE as e:
+            if attempt >= max_retries:
+                raise
+            # jittered exponential backoff
+            delay = min(2 ** attempt, max_backoff_secs) * random.uniform(0.5, 1.0)
+            print(f" {type(e).__name__}: retrying in {delay:.1f}s ({attempt + 1}/{max_retries})")
+            if on_retry is not None:
+                on_retry()
+            sleep(delay)
+
+
+def iter_upsert_batches(gcs: GCSClient, emb_uri: str, dim: int, batch_size: int,
+                        limit: int | None = None) -> Iterator[List[Tuple[str, List[float]]]]:
+    batch = []
+    for rec in iter_embeddings(gcs, emb_uri, limit=limit):
+        vec = rec.get("embedding")
+        if not vec or len(vec) != dim:
+            continue
+        batch.append((rec["id"], vec))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 def upsert_embeddings(endpoint: aiplatform.MatchingEngineIndexEndpoint,
                       deployed_index_id: str,
                       emb_uri: str,
                       dim: int,
                       batch_size: int = 100,
-                      limit: int | None = None):
+                      limit: int | None = None,
+                      max_in_flight: int = 4,
+                      max_retries: int = 6,
+                      max_backoff_secs: float = 32.0,
+                      ledger_path: str | None = None,
+                      index_name: str | None = None,
+                      sleep=time.sleep) -> Dict:
+    """
+    Stream the embeddings file and keep up to max_in_flight upsert batches running on a thread pool
+    while the next ones are read. Each batch retries transient errors with jittered backoff, and
+    acknowledged batches go to the ledger so a rerun continues where a failed load stopped, as long
+    as it targets the same endpoint, deployed index and embeddings file (see ledger_target).
+    """
     gcs = GCSClient()
-    batch: List[IndexDatapoint] = []
-    total = 0
+    ledger = UpsertLedger(ledger_path, ledger_target(endpoint, deployed_index_id, emb_uri, index_name))
+    stats = {"upserted": 0, "batches": 0, "skipped_batches": 0, "retries": 0}
+    lock = threading.Lock()
 
-    for rec in tqdm(iter_jsonl_gcs(gcs, emb_uri, limit=limit), desc="upserting"):
-        vec = rec.get("embedding")
-        if not vec or len(vec) != dim:
-            continue
-        batch.append(make_datapoint(rec["id"], vec))
+    def on_retry():
+        with lock:
+            stats["retries"] += 1
 
+    def send(n: int, batch: List[Tuple[str, List[float]]]) -> int:
+        datapoints = [make_datapoint(dp_id, vec) for dp_id, vec in batch]
+        call_with_retry(endpoint.upsert_datapoints, deployed_index_id=deployed_index_id, datapoints=datapoints,
+                        sync=True, max_retries=max_retries, max_backoff_secs=max_backoff_secs,
+                        sleep=sleep, on_retry=on_retry)
+        ledger.ack(n, batch[0][0], len(batch))
+        return len(batch)
+
+    def drain(done):
+        for fut in done:
+            n = fut.result()   # re-raises a batch that exhausted its retries
+            stats["upserted"] += n
+            stats["batches"] += 1
+            progress.update(n)
+
+    pending = set()
+    progress = tqdm(desc="upserting", unit="dp")
+    pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="upsert")
+    try:
+        for n, batch in enumerate(iter_upsert_batches(gcs, emb_uri, dim, batch_size, limit)):
+            if ledger.is_done(n, batch[0][0]):
+                stats["skipped_batches"] += 1
+                continue
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                drain(done)
+            pending.add(pool.submit(send, n, batch))
+        done, pending = wait(pending)
+        drain(done)
+    finally:
+        for fut in pending:
+            fut.cancel()
+        pool.shutdown(wait=True)
+        ledger.close()
+        progress.close()
+
+    print(f" Upserted {stats['upserted']} datapoints in {stats['batches']} batches "
+          f"({stats['skipped_batches']} already in the ledger, {stats['retries']} retries).")
+    return stats
+
+def ledger_target(endpoint, deployed_index_id: str, emb_uri: str, index_name: str | None = None) -> Dict:
+    return {"endpoint": endpoint.resource_name, "deployed_index_id": deployed_index_id, "emb_uri": emb_uri,
+            "index": index_name}
+
+def remove_deleted(endpoint: aiplatform.MatchingEngineIndexEndpoint,
+                   deployed_index_id: str,
+                   deletes_uri: str,
+                   batch_size: int = 1000):
+    """Apply the deletes of an incremental embed_generator run (JSONL of {"id": ...})."""
+    gcs = GCSClient()
+    batch: List[str] = []
+    total = 0
+    for rec in iter_jsonl_gcs(gcs, deletes_uri):
+        batch.append(rec["id"])
         if len(batch) >= batch_size:
-            endpoint.upsert_datapoints(
-                deployed_index_id=deployed_index_id,
-                datapoints=batch,
-                sync=True,
-            )
+            call_with_retry(endpoint.remove_datapoints, deployed_index_id=deployed_index_id, datapoint_ids=batch)
             total += len(batch)
             batch = []
-
     if batch:
-        endpoint.upsert_datapoints(
-            deployed_index_id=deployed_index_id,
-            datapoints=batch,
-            sync=True,
-        )
+        call_with_retry(endpoint.remove_datapoints, deployed_index_id=deployed_index_id, datapoint_ids=batch)
         total += len(batch)
-
-    print(f" Upserted {total} datapoints.")
+    print(f" Removed {total} datapoints.")
 
 # ---------- Runner ----------
 def run(project: str, location: str, dim: int, distance: str,
         embeddings_uri: str, index_name: str, endpoint_name: str, deployed_index_id: str,
-        batch_size: int = 100, limit: int | None = None):
+        batch_size: int = 100, limit: int | None = None,
+        deletes_uri: str | None = None, existing_endpoint: str | None = None,
+        max_in_flight: int = 4, ledger_path: str | None = None):
 
     aiplatform.init(project=project, location=location)
 
-    index = create_index(project, location, index_name, dim, distance)
-    endpoint = create_index_endpoint(project, location, endpoint_name)
-    deploy_index(index, endpoint, deployed_index_id)
+    # a ledger from a failed load of the same input names the index it was filling: resume into it
+    previous = read_ledger_target(ledger_path) or {}
+    index_resource = None
+    if existing_endpoint:
+        # incremental delta on top of an already deployed index
+        endpoint = aiplatform.MatchingEngineIndexEndpoint(existing_endpoint)
+        if previous.get("endpoint") == existing_endpoint:
+            index_resource = previous.get("index")
+    elif previous.get("emb_uri") == embeddings_uri and previous.get("deployed_index_id") == deployed_index_id:
+        print(f" Resuming the load into {previous['endpoint']} recorded in {ledger_path}")
+        endpoint = aiplatform.MatchingEngineIndexEndpoint(previous["endpoint"])
+        index_resource = previous.get("index")
+    else:
+        index = create_index(project, location, index_name, dim, distance)
+        endpoint = create_index_endpoint(project, location, endpoint_name)
+        deploy_index(index, endpoint, deployed_index_id)
+        index_resource = index.resource_name
 
-    upsert_embeddings(endpoint, deployed_index_id, embeddings_uri, dim, batch_size=batch_size, limit=limit)
+    upsert_embeddings(endpoint, deployed_index_id, embeddings_uri, dim, batch_size=batch_size, limit=limit,
+                      max_in_flight=max_in_flight, ledger_path=ledger_path, index_name=index_resource)
+    if deletes_uri:
+        remove_deleted(endpoint, deployed_index_id, deletes_uri)
 
     print("Done. Save these for Module 4:")
     print(f"INDEX_ENDPOINT_NAME={endpoint.resource_name}")
@@ -130,12 +315,18 @@ if __name__ == "__main__":
     default="COSINE_DISTANCE",
     choices=["COSINE_DISTANCE", "DOT_PRODUCT_DISTANCE", "SQUARED_L2_DISTANCE"],
 )
-    ap.add_argument("--embeddings", required=True)
+    ap.add_argument("--embeddings", required=True, help="embeddings JSONL or a *.parquet artifact")
     ap.add_argument("--index_name", default="arxiv-index-small")
     ap.add_argument("--endpoint_name", default="arxiv-index-endpoint-small")
     ap.add_argument("--deployed_index_id", default="arxiv-small")
     ap.add_argument("--batch_size", type=int, default=100)
     ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--deletes", default=None, help="incremental delta: JSONL of ids to remove")
+    ap.add_argument("--existing_endpoint", default=None, help="resource name of a deployed endpoint to update instead of creating one")
+    ap.add_argument("--max_in_flight", type=int, default=4, help="upsert batches sent concurrently")
+    ap.add_argument("--ledger", default=None,
+                    help="progress ledger (local JSONL); a rerun skips acknowledged batches "
+                         "(default: upsert-ledger-<deployed_index_id>.jsonl)")
     args = ap.parse_args()
 
     run(
@@ -149,4 +340,8 @@ if __name__ == "__main__":
         deployed_index_id=args.deployed_index_id,
         batch_size=args.batch_size,
         limit=args.limit,
+        deletes_uri=args.deletes,
+        existing_endpoint=args.existing_endpoint,
+        max_in_flight=args.max_in_flight,
+        ledger_path=args.ledger or f"upsert-ledger-{args.deployed_index_id}.jsonl",
     )
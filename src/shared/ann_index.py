@@ -0,0 +1,196 @@
+# src/shared/ann_index.py
+"""
+Approximate nearest-neighbour search: IVF coarse quantizer + product-quantized residuals.
+
+Offline build (reads the embeddings/store JSONL written by embed_generator):
+
+    python -m src.shared.ann_index \
+      --embeddings gs://$BUCKET/embeddings/arxiv_embeddings.jsonl \
+      --store gs://$BUCKET/store/arxiv_store.jsonl \
+      --out data/ann --nlist 1024 --m 48
+
+The output directory is a vector_store index (float matrix + rows sidecar) plus:
+    ivf_centroids.npy   (nlist, dim) float32
+    pq_codebooks.npy    (m, ksub, dim / m) float32, trained on residuals x - centroid
+    ivf_codes.npy       (n, m) uint8, grouped by inverted list
+    ivf_rows.npy        (n,) int64 row number (into rows.jsonl) for each code
+    ivf_offsets.npy     (nlist + 1,) int64 start of each list in ivf_codes / ivf_rows
+    ivf_manifest.json
+
+Queries only touch the centroids, the codebooks and the codes of the `nprobe` probed lists,
+so memory is ~m + 8 bytes per vector instead of 4 * dim.
+"""
+import argparse, json, os, time
+from typing import Dict, List
+
+import numpy as np
+
+from src.shared.vector_store import (
+    MATRIX_FILE, LocalVectorSearch, build_index, top_k,
+)
+
+CENTROIDS_FILE = "ivf_centroids.npy"
+CODEBOOKS_FILE = "pq_codebooks.npy"
+CODES_FILE = "ivf_codes.npy"
+LIST_ROWS_FILE = "ivf_rows.npy"
+LIST_OFFSETS_FILE = "ivf_offsets.npy"
+IVF_MANIFEST_FILE = "ivf_manifest.json"
+
+
+# ---------- k-means ----------
+def _assign(x: np.ndarray, centroids: np.ndarray, block: int = 65536) -> np.ndarray:
+    """Nearest centroid (L2) for each row of x."""
+    c_norms = (centroids * centroids).sum(axis=1)
+    out = np.empty(x.shape[0], dtype=np.int32)
+    for i in range(0, x.shape[0], block):
+        xb = np.asarray(x[i:i + block], dtype=np.float32)
+        out[i:i + block] = np.argmin(c_norms[None, :] - 2.0 * (xb @ centroids.T), axis=1)
+    return out
+
+
+def kmeans(x: np.ndarray, k: int, iters: int = 20, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    x = np.asarray(x, dtype=np.float32)
+    n, d = x.shape
+    k = min(k, n)
+    centroids = x[rng.choice(n, k, replace=False)].copy()
+    for _ in range(iters):
+        assign = _assign(x, centroids)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.stack([np.bincount(assign, weights=x[:, j], minlength=k) for j in range(d)], axis=1)
+        nonempty = counts > 0
+        centroids[nonempty] = (sums[nonempty] / counts[nonempty, None]).astype(np.float32)
+        # re-seed empty clusters from random points so nlist stays meaningful
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            centroids[empty] = x[rng.choice(n, len(empty), replace=False)]
+    return centroids
+
+
+# ---------- product quantizer ----------
+def train_pq(residuals: np.ndarray, m: int, ksub: int = 256, iters: int = 20, seed: int = 0) -> np.ndarray:
+    n, d = residuals.shape
+    if d % m:
+        raise ValueError(f"dim {d} is not divisible by m={m}")
+    dsub = d // m
+    ksub = min(ksub, n, 256)
+    return np.stack([
+        kmeans(residuals[:, j * dsub:(j + 1) * dsub], ksub, iters=iters, seed=seed + j)
+        for j in range(m)
+    ])
+
+
+def pq_encode(residuals: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    m, _, dsub = codebooks.shape
+    codes = np.empty((residuals.shape[0], m), dtype=np.uint8)
+    for j in range(m):
+        codes[:, j] = _assign(residuals[:, j * dsub:(j + 1) * dsub], codebooks[j])
+    return codes
+
+
+# ---------- build ----------
+def build_ivfpq(index_dir: str, nlist: int = 1024, m: int = 48, train_size: int = 100_000,
+                iters: int = 20, seed: int = 0, block: int = 65536) -> Dict:
+    """Train IVF-PQ on the float matrix of an existing vector_store index dir and encode every row."""
+    matrix = np.load(os.path.join(index_dir, MATRIX_FILE), mmap_mode="r")
+    n, dim = matrix.shape
+    rng = np.random.default_rng(seed)
+    sample_idx = np.sort(rng.choice(n, min(train_size, n), replace=False))
+    sample = np.asarray(matrix[sample_idx], dtype=np.float32)
+
+    t0 = time.time()
+    centroids = kmeans(sample, nlist, iters=iters, seed=seed)
+    sample_assign = _assign(sample, centroids)
+    codebooks = train_pq(sample - centroids[sample_assign], m, iters=iters, seed=seed)
+    print(f"[ann] trained nlist={len(centroids)} m={m} ksub={codebooks.shape[1]} in {time.time() - t0:.1f}s")
+
+    # Encode in blocks, then regroup by inverted list.
+    assign = np.empty(n, dtype=np.int32)
+    codes = np.empty((n, m), dtype=np.uint8)
+    for i in range(0, n, block):
+        xb = np.asarray(matrix[i:i + block], dtype=np.float32)
+        a = _assign(xb, centroids)
+        assign[i:i + block] = a
+        codes[i:i + block] = pq_encode(xb - centroids[a], codebooks)
+
+    order = np.argsort(assign, kind="stable")
+    offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assign, minlength=len(centroids)), out=offsets[1:])
+
+    np.save(os.path.join(index_dir, CENTROIDS_FILE), centroids)
+    np.save(os.path.join(index_dir, CODEBOOKS_FILE), codebooks)
+    np.save(os.path.join(index_dir, CODES_FILE), codes[order])
+    np.save(os.path.join(index_dir, LIST_ROWS_FILE), order.astype(np.int64))
+    np.save(os.path.join(index_dir, LIST_OFFSETS_FILE), offsets)
+    manifest = {"count": n, "dim": dim, "nlist": len(centroids), "m": m,
+                "ksub": int(codebooks.shape[1]), "version": f"ivfpq-{int(time.time())}-{n}"}
+    with open(os.path.join(index_dir, IVF_MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+# ---------- search ----------
+class IVFPQVectorSearch(LocalVectorSearch):
+    """
+    Same contract as BigQueryVectorSearch: search(query_vec, k) -> [{id,title,chunk_text,dot,...}].
+    `dot` is the PQ-approximated inner product. Raise `nprobe` for recall, lower it for latency.
+    """
+    VERSION_FILE = IVF_MANIFEST_FILE
+
+    def __init__(self, index_dir: str, nprobe: int = 16):
+        super().__init__(index_dir)
+        with open(os.path.join(index_dir, IVF_MANIFEST_FILE)) as f:
+            self.ivf_manifest = json.load(f)
+        self.index_version = self._version = self.ivf_manifest.get("version")
+        self.nprobe = nprobe
+        self.centroids = np.load(os.path.join(index_dir, CENTROIDS_FILE))
+        self.codebooks = np.load(os.path.join(index_dir, CODEBOOKS_FILE))
+        self.codes = np.load(os.path.join(index_dir, CODES_FILE), mmap_mode="r")
+        self.list_rows = np.load(os.path.join(index_dir, LIST_ROWS_FILE), mmap_mode="r")
+        self.list_offsets = np.load(os.path.join(index_dir, LIST_OFFSETS_FILE))
+        self._c_half_norms = 0.5 * (self.centroids * self.centroids).sum(axis=1)
+        self._m_range = np.arange(self.codebooks.shape[0])[None, :]
+
+    def memory_bytes(self) -> int:
+        """Bytes that have to be resident to serve queries (excludes the rows sidecar)."""
+        return int(self.codes.nbytes + self.list_rows.nbytes + self.centroids.nbytes
+                   + self.codebooks.nbytes + self.list_offsets.nbytes)
+
+    def _search_one(self, q: np.ndarray, k: int):
+        m, _, dsub = self.codebooks.shape
+        coarse = self.centroids @ q
+        probe = top_k(coarse - self._c_half_norms, min(self.nprobe, len(self.centroids)))
+        # Inner-product LUT is the same for every list: q·(c + r) = q·c + sum_j q_j·r_j
+        lut = np.einsum("jkd,jd->jk", self.codebooks, q.reshape(m, dsub))
+        probe = [c for c in probe if self.list_offsets[c + 1] > self.list_offsets[c]]
+        if not probe:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        spans = [(int(self.list_offsets[c]), int(self.list_offsets[c + 1])) for c in probe]
+        codes = np.concatenate([self.codes[a:b] for a, b in spans])
+        rows = np.concatenate([self.list_rows[a:b] for a, b in spans])
+        base = np.repeat(coarse[probe], [b - a for a, b in spans])
+        scores = base + lut[self._m_range, codes].sum(axis=1)
+        best = top_k(scores, min(k, len(scores)))
+        return rows[best], scores[best]
+
+    def search_many(self, query_vecs, k: int = 5, filters: Dict | None = None) -> List[List[Dict]]:
+        self._check_filters(filters)
+        queries = np.asarray(query_vecs, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        if k <= 0:
+            return [[] for _ in range(queries.shape[0])]
+        return [self._hits(*self._search_one(q, k)) for q in queries]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--embeddings", required=True)
+    ap.add_argument("--store", required=True)
+    ap.add_argument("--out", required=True, help="local directory for the index files")
+    ap.add_argument("--nlist", type=int, default=1024)
+    ap.add_argument("--m", type=int, default=48, help="PQ sub-quantizers; must divide the embedding dim")
+    ap.add_argument("--train_size", type=int, default=100_000)
+    ap.add_argument("--iters", type=int, default=20)
+    args = ap.parse_args()
+    build_index(args.embeddings, args.store, args.out)
+    m = build_ivfpq(args.out, nlist=args.nlist, m=args.m, train_size=args.train_size, iters=args.iters)
+    print(f"Built IVF-PQ index: {m['count']} vectors, nlist={m['nlist']}, m={m['m']} -> {args.out}")
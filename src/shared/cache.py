@@ -0,0 +1,61 @@
+# src/shared/cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+
+def filters_key(filters: Dict | None) -> tuple:
+    """Hashable, order-independent form of retrieval filters (unset ones dropped)."""
+    return tuple(sorted(
+        (k, tuple(v) if isinstance(v, (list, tuple)) else str(v))
+        for k, v in (filters or {}).items() if v
+    ))
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache with per-entry TTL.
+    maxsize bounds the number of entries; ttl_secs=0 disables expiry.
+    """
+    _MISSING = object()
+
+    def __init__(self, maxsize: int = 1024, ttl_secs: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl_secs = ttl_secs
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            item = self._data.get(key, self._MISSING)
+            if item is not self._MISSING:
+                stored_at, value = item
+                if not self.ttl_secs or time.monotonic() - stored_at < self.ttl_secs:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
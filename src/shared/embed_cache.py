@@ -0,0 +1,136 @@
+# src/shared/embed_cache.py
+"""
+Query-embedding cache in front of LocalEmbeddings.embed_queries.
+
+Tier 1: in-process LRU with TTL (src/shared/cache.py).
+Tier 2 (optional): SQLite file in WAL mode. It survives restarts, and every uvicorn worker on
+the host can read and write it concurrently.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from src.shared.cache import TTLCache
+
+
+def normalize_question(text: str, lowercase: bool = True) -> str:
+    # e5 tokenizers are uncased, so case and whitespace differences embed identically
+    text = " ".join((text or "").split())
+    return text.lower() if lowercase else text
+
+
+def question_key(text: str, model_name: str, lowercase: bool = True) -> str:
+    norm = normalize_question(text, lowercase)
+    return hashlib.sha1(f"{model_name}\x00{norm}".encode("utf-8")).hexdigest()
+
+
+class SQLiteEmbeddingStore:
+    """Key -> float32 vector blobs in a SQLite file shared by all workers on a host."""
+    def __init__(self, path: str, ttl_secs: float = 7 * 86400):
+        self.path = path
+        self.ttl_secs = ttl_secs
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, vec BLOB NOT NULL, created REAL NOT NULL)")
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        if not keys:
+            return {}
+        oldest = time.time() - self.ttl_secs if self.ttl_secs else 0.0
+        marks = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, vec FROM query_embeddings WHERE key IN ({marks}) AND created >= ?",
+                [*keys, oldest],
+            ).fetchall()
+        found = {k: np.frombuffer(v, dtype=np.float32).tolist() for k, v in rows}
+        self.hits += len(found)
+        self.misses += len(set(keys)) - len(found)
+        return found
+
+    def set_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = time.time()
+        rows = [(k, np.asarray(v, dtype=np.float32).tobytes(), now) for k, v in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO query_embeddings (key, vec, created) VALUES (?, ?, ?)", rows)
+
+    def purge_expired(self) -> int:
+        if not self.ttl_secs:
+            return 0
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM query_embeddings WHERE created < ?", (time.time() - self.ttl_secs,))
+        return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+        return {"size": size, "hits": self.hits, "misses": self.misses}
+
+
+class CachedEmbeddings:
+    """
+    Wraps an embedder (LocalEmbeddings) and caches embed_queries() results by normalized question.
+    Misses from one call are encoded together in a single embed_queries() call.
+    Everything else (embed_passages, model, ...) is delegated to the wrapped embedder.
+    """
+    def __init__(self, inner, model_name: str, maxsize: int = 10000, ttl_secs: float = 86400,
+                 disk_path: str | None = None, disk_ttl_secs: float = 7 * 86400, lowercase: bool = True):
+        self.inner = inner
+        self.model_name = model_name
+        self.lowercase = lowercase
+        self.memory = TTLCache(maxsize=maxsize, ttl_secs=ttl_secs)
+        self.disk = SQLiteEmbeddingStore(disk_path, ttl_secs=disk_ttl_secs) if disk_path else None
+        self.encoded = 0
+
+    def __getattr__(self, name):
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def embed_queries(self, texts) -> List[List[float]]:
+        keys = [question_key(t, self.model_name, self.lowercase) for t in texts]
+        out: Dict[str, List[float]] = {}
+        for key in keys:
+            if key not in out:
+                vec = self.memory.get(key)
+                if vec is not None:
+                    out[key] = vec
+
+        missing = [k for k in dict.fromkeys(keys) if k not in out]
+        if missing and self.disk is not None:
+            found = self.disk.get_many(missing)
+            for key, vec in found.items():
+                self.memory.set(key, vec)
+            out.update(found)
+            missing = [k for k in missing if k not in found]
+
+        if missing:
+            first_text = {}
+            for key, text in zip(keys, texts):
+                first_text.setdefault(key, text)
+            vecs = self.inner.embed_queries([first_text[k] for k in missing])
+            self.encoded += len(missing)
+            fresh = dict(zip(missing, vecs))
+            for key, vec in fresh.items():
+                self.memory.set(key, vec)
+            if self.disk is not None:
+                self.disk.set_many(fresh)
+            out.update(fresh)
+
+        return [out[k] for k in keys]
+
+    def stats(self) -> dict:
+        s = {"memory": self.memory.stats(), "encoded": self.encoded}
+        if self.disk is not None:
+            s["disk"] = self.disk.stats()
+        return s
@@ -0,0 +1,188 @@
+# src/shared/embed_parquet.py
+"""
+Columnar embedding artifacts: sharded Parquet with one row per chunk.
+
+    gs://bucket/embeddings/arxiv.parquet/part-00000.parquet, part-00001.parquet, ...
+
+(a directory named *.parquet, as Spark/BigQuery exports do; a single .parquet file also reads).
+
+Columns: id, doc_id, title, chunk_index, chunk_text (the store row) and
+embedding: FixedSizeList<float32>[dim]. Vectors are raw little-endian float32, so a
+record batch's embeddings are viewed as an (n, dim) NumPy array without copying or parsing.
+export_jsonl() writes the classic embeddings/store JSONL pair for older consumers.
+"""
+import json
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.shared.gcp_clients import GCSClient
+
+STORE_COLUMNS = ("id", "doc_id", "title", "chunk_index", "chunk_text")
+
+
+def schema(dim: int) -> pa.Schema:
+    return pa.schema([
+        ("id", pa.string()),
+        ("doc_id", pa.string()),
+        ("title", pa.string()),
+        ("chunk_index", pa.int32()),
+        ("chunk_text", pa.string()),
+        ("embedding", pa.list_(pa.float32(), dim)),
+    ])
+
+
+def is_parquet(uri: str) -> bool:
+    return uri.rstrip("/").endswith(".parquet")
+
+
+def shard_uri(out_uri: str, n: int) -> str:
+    return f"{out_uri.rstrip('/')}/part-{n:05d}.parquet"
+
+
+def list_shards(gcs: GCSClient, uri: str) -> List[str]:
+    if gcs.isfile(uri):
+        return [uri]
+    return gcs.glob(f"{uri.rstrip('/')}/part-*.parquet")
+
+
+def to_record_batch(rows: List[Dict], vecs, dim: int | None = None) -> pa.RecordBatch:
+    mat = np.asarray(vecs, dtype=np.float32)
+    dim = dim or mat.shape[1]
+    mat = mat.reshape(len(rows), dim)
+    embedding = pa.FixedSizeListArray.from_arrays(pa.array(mat.reshape(-1)), dim)
+    cols = [pa.array([r.get(c) for r in rows], type=t)
+            for c, t in zip(STORE_COLUMNS, schema(dim).types[:len(STORE_COLUMNS)])]
+    return pa.RecordBatch.from_arrays(cols + [embedding], schema=schema(dim))
+
+
+def embedding_matrix(batch) -> np.ndarray:
+    """(n, dim) float32 view of a RecordBatch's embedding column (zero-copy)."""
+    col = batch.column("embedding") if isinstance(batch, pa.RecordBatch) else batch
+    if isinstance(col, pa.ChunkedArray):
+        col = col.combine_chunks()   # copies only if the table has several chunks
+    flat = col.flatten().to_numpy(zero_copy_only=True)
+    return flat.reshape(len(col), col.type.list_size)
+
+
+class ParquetSink:
+    """
+    Writer-stage sink for embed_generator.stream_embeddings: buffers rows into row groups
+    of `row_group_rows` and starts a new shard every `shard_rows` rows.
+    """
+    def __init__(self, gcs: GCSClient, out_uri: str, shard_rows: int = 200_000,
+                 row_group_rows: int = 8192, compression: str = "zstd"):
+        self.gcs = gcs
+        self.out_uri = out_uri
+        self.shard_rows = shard_rows
+        self.row_group_rows = row_group_rows
+        self.compression = compression
+        self.dim = None
+        self.shards = 0
+        self._rows: List[Dict] = []
+        self._vecs: List = []
+        self._file = self._writer = None
+        self._in_shard = 0
+
+    def __enter__(self):
+        return self
+
+    def _open_shard(self):
+        self._file = self.gcs.open(shard_uri(self.out_uri, self.shards), "wb").open()
+        # float32 noise does not compress; only the text columns are worth the CPU
+        compression = {c: self.compression for c in STORE_COLUMNS}
+        compression["embedding"] = "NONE"
+        self._writer = pq.ParquetWriter(self._file, schema(self.dim), compression=compression,
+                                        use_dictionary=["doc_id", "title"])
+        self._in_shard = 0
+        self.shards += 1
+
+    def _close_shard(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._file.close()
+            self._writer = self._file = None
+
+    def _flush(self):
+        if not self._rows:
+            return
+        if self._writer is None:
+            self._open_shard()
+        self._writer.write_batch(to_record_batch(self._rows, self._vecs, self.dim),
+                                 row_group_size=self.row_group_rows)
+        self._in_shard += len(self._rows)
+        self._rows, self._vecs = [], []
+        if self._in_shard >= self.shard_rows:
+            self._close_shard()
+
+    def write(self, batch: List[Dict], vecs: List[List[float]]):
+        if self.dim is None and len(vecs):
+            self.dim = len(vecs[0])
+        self._rows.extend(batch)
+        self._vecs.extend(vecs)
+        if len(self._rows) >= min(self.row_group_rows, self.shard_rows - self._in_shard):
+            self._flush()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._flush()
+        self._close_shard()
+        return False
+
+
+def iter_batches(gcs: GCSClient, uri: str, columns: List[str] | None = None,
+                 batch_rows: int = 65536) -> Iterator[pa.RecordBatch]:
+    """Stream record batches across all shards; memory is one batch, not the file."""
+    for shard in list_shards(gcs, uri):
+        if shard.startswith("gs://"):
+            with gcs.open(shard, "rb") as f:
+                yield from pq.ParquetFile(f).iter_batches(batch_size=batch_rows, columns=columns)
+        else:
+            yield from pq.ParquetFile(shard, memory_map=True).iter_batches(batch_size=batch_rows, columns=columns)
+
+
+def iter_rows(gcs: GCSClient, uri: str) -> Iterator[Tuple[Dict, np.ndarray]]:
+    """(store_row, float32 vector view) pairs, the shape vector_store._write_index consumes."""
+    for batch in iter_batches(gcs, uri):
+        mat = embedding_matrix(batch)
+        meta = batch.select(list(STORE_COLUMNS)).to_pylist()
+        for i, row in enumerate(meta):
+            yield row, mat[i]
+
+
+def iter_embeddings(gcs: GCSClient, uri: str) -> Iterator[Tuple[List[str], np.ndarray]]:
+    """(ids, (n, dim) matrix) per batch, reading only the id and embedding columns."""
+    for batch in iter_batches(gcs, uri, columns=["id", "embedding"]):
+        yield batch.column("id").to_pylist(), embedding_matrix(batch)
+
+
+def read_matrix(gcs: GCSClient, uri: str) -> Tuple[List[str], np.ndarray]:
+    ids, mats = [], []
+    for batch_ids, mat in iter_embeddings(gcs, uri):
+        ids.extend(batch_ids)
+        mats.append(mat)
+    return ids, (np.concatenate(mats) if mats else np.zeros((0, 0), dtype=np.float32))
+
+
+def export_jsonl(gcs: GCSClient, uri: str, embeddings_uri: str, store_uri: str) -> int:
+    """Write the legacy {"id","embedding"} / store JSONL pair from a Parquet artifact."""
+    n = 0
+    with gcs.open(embeddings_uri, "w") as f_emb, gcs.open(store_uri, "w") as f_store:
+        for row, vec in iter_rows(gcs, uri):
+            f_emb.write(json.dumps({"id": row["id"], "embedding": vec.tolist()}, ensure_ascii=False) + "\n")
+            f_store.write(json.dumps(row, ensure_ascii=False) + "\n")
+            n += 1
+    return n
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Export a Parquet embedding artifact to embeddings/store JSONL")
+    ap.add_argument("--parquet", required=True)
+    ap.add_argument("--embeddings", required=True)
+    ap.add_argument("--store", required=True)
+    args = ap.parse_args()
+    n = export_jsonl(GCSClient(), args.parquet, args.embeddings, args.store)
+    print(f"Exported {n} rows -> {args.embeddings}, {args.store}")
@@ -1,23 +1,137 @@
 # --- add these near the top if missing ---
-from typing import List, Dict
-from google.cloud import bigquery
+from typing import AsyncIterator, Iterable, Iterator, List, Dict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
-from vertexai import init as vertex_init
-from vertexai.generative_models import GenerativeModel, GenerationConfig
+import os
+import random
+import threading
+import time
+from src.shared.cache import TTLCache, filters_key
+from src.shared.rate_limit import AIMDConcurrency, RateLimiter
+# google.cloud.bigquery, vertexai and sentence_transformers take seconds to import, so they are
+# imported where a client is built; importing this module (and the API) stays cheap
+
+# GCS (or local path) file access, as used by the data pipeline
+class GCSClient:
+    """
+    Opens gs://bucket/path or plain local paths through fsspec/gcsfs.
+    Usage: `with gcs.open(uri, "r") as f: ...`
+    """
+    def __init__(self, project: str | None = None):
+        self.project = project
+
+    def open(self, uri: str, mode: str = "r"):
+        import fsspec
+        kwargs = {} if "b" in mode else {"encoding": "utf-8"}
+        if uri.startswith("gs://") and self.project:
+            kwargs["project"] = self.project
+        if not uri.startswith("gs://") and "w" in mode:
+            kwargs["auto_mkdir"] = True
+        return fsspec.open(uri, mode, **kwargs)
+
+    def _fs(self, uri: str):
+        from fsspec.core import url_to_fs
+        kwargs = {"project": self.project} if uri.startswith("gs://") and self.project else {}
+        return url_to_fs(uri, **kwargs)
+
+    def exists(self, uri: str) -> bool:
+        fs, path = self._fs(uri)
+        return fs.exists(path)
+
+    def isfile(self, uri: str) -> bool:
+        fs, path = self._fs(uri)
+        return fs.isfile(path)
+
+    def size(self, uri: str) -> int:
+        fs, path = self._fs(uri)
+        return fs.size(path)
+
+    def glob(self, pattern: str) -> List[str]:
+        """Sorted matches, returned with the gs:// prefix when the pattern has one."""
+        fs, path = self._fs(pattern)
+        prefix = "gs://" if pattern.startswith("gs://") else ""
+        return sorted(prefix + p for p in fs.glob(path))
+
+    def rm(self, uri: str):
+        fs, path = self._fs(uri)
+        if fs.exists(path):
+            fs.rm(path)
+
 
 # Local CPU embeddings using sentence-transformers
 class LocalEmbeddings:
     """
     sentence-transformers local encoder (intfloat/e5-small-v2, 384-dim).
     Use .embed_passages() for chunks and .embed_queries() for user queries.
+
+    backend: "torch" (fp32 PyTorch), "onnx" (ONNX Runtime) or "onnx-int8" (dynamically
+    quantized int8 weights). The ONNX export / quantization runs once and is saved under
+    cache_dir/<model>; later starts load the saved files.
+    snapshot_dir: a prebuilt copy of the model (src/shared/model_snapshot.py) loaded instead of
+    resolving model_name against the hub cache; it also stands in for cache_dir/<model>.
+    threads: intra-op threads (0 = library default). max_seq_length: truncate inputs (0 = model default).
     """
-    def __init__(self, model_name: str = "intfloat/e5-small-v2"):
+    BACKENDS = ("torch", "onnx", "onnx-int8")
+
+    def __init__(self, model_name: str = "intfloat/e5-small-v2", backend: str = "torch", threads: int = 0,
+                 max_seq_length: int = 0, batch_size: int = 32, sort_window: int = 256,
+                 cache_dir: str | None = None, quantization: str = "avx2", snapshot_dir: str | None = None,
+                 model=None):
+        # model: pre-built SentenceTransformer (or a test double); skips loading
+        if backend not in self.BACKENDS:
+            raise ValueError(f"backend must be one of {self.BACKENDS}, got {backend!r}")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.sort_window = sort_window
+        if model is None:
+            model = self._load(model_name, backend, threads, cache_dir, quantization, snapshot_dir)
+        self.model = model
+        # vectors differ slightly between backends, and truncation changes those of long texts,
+        # so caches / manifests key on both: "model[:backend][:L<max_seq_length>]"
+        parts = [model_name] + ([backend] if backend != "torch" else [])
+        if max_seq_length and max_seq_length != getattr(model, "max_seq_length", None):
+            self.model.max_seq_length = max_seq_length
+            parts.append(f"L{max_seq_length}")
+        self.model_id = ":".join(parts)
+
+    @staticmethod
+    def _load(model_name: str, backend: str, threads: int, cache_dir: str | None, quantization: str,
+              snapshot_dir: str | None = None):
         from sentence_transformers import SentenceTransformer
-        self.model = SentenceTransformer(model_name)
+        if backend == "torch":
+            if threads:
+                import torch
+                torch.set_num_threads(threads)
+            # a local dir skips the hub lookups; its safetensors weights are memory-mapped
+            return SentenceTransformer(snapshot_dir or model_name, device="cpu")
+
+        import onnxruntime as ort
+        cache_dir = cache_dir or os.path.join(os.path.expanduser("~"), ".cache", "arxiv-agent", "onnx")
+        local = snapshot_dir or os.path.join(cache_dir, model_name.replace("/", "--"))
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        kwargs = {"provider": "CPUExecutionProvider", "session_options": options}
+        if not os.path.exists(os.path.join(local, "onnx", "model.onnx")):
+            SentenceTransformer(model_name, backend="onnx", device="cpu").save_pretrained(local)
+        if backend == "onnx":
+            return SentenceTransformer(local, backend="onnx", device="cpu", model_kwargs=kwargs)
+
+        file_name = f"model_qint8_{quantization}.onnx"
+        if not os.path.exists(os.path.join(local, "onnx", file_name)):
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+            export_dynamic_quantized_onnx_model(SentenceTransformer(local, backend="onnx", device="cpu"),
+                                                quantization, local)
+        return SentenceTransformer(local, backend="onnx", device="cpu",
+                                   model_kwargs={**kwargs, "file_name": f"onnx/{file_name}"})
 
     def _encode(self, texts):
-        # normalize=True -> unit vectors, so dot product ≈ cosine
-        return self.model.encode(texts, normalize_embeddings=True).tolist()
+        # normalize=True -> unit vectors, so dot product ≈ cosine.
+        # encode() sorts its input by length before batching, so padding is per similar-length batch.
+        return self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True).tolist()
 
     def embed_passages(self, texts):
         return self._encode([f"passage: {t or ''}" for t in texts])
@@ -29,52 +143,345 @@ class LocalEmbeddings:
     def embed_texts_sync(self, texts):
         return self.embed_passages(texts)
 
+    def embed_batches(self, batches: Iterable[List[str]]) -> Iterator[List[List[float]]]:
+        """
+        Passage-encode a stream of batches, yielding results in input order. Batches are pooled
+        until `sort_window` texts, so the length sort inside encode() spans many small pipeline
+        batches and short chunks are not padded to the longest one in a mixed batch.
+        """
+        window: List[List[str]] = []
+        pending = 0
+        for batch in batches:
+            window.append(list(batch))
+            pending += len(window[-1])
+            if pending >= self.sort_window:
+                yield from self._split(window)
+                window, pending = [], 0
+        if window:
+            yield from self._split(window)
+
+    def _split(self, window: List[List[str]]) -> Iterator[List[List[float]]]:
+        vecs = self.embed_passages([t for batch in window for t in batch])
+        start = 0
+        for batch in window:
+            yield vecs[start:start + len(batch)]
+            start += len(batch)
+
+
+# Vertex AI text embeddings for the data pipeline (replaces gcp_clients_old.VertexEmbeddings)
+class VertexEmbeddings:
+    """
+    Vertex AI embeddings with a requests/min + tokens/min token bucket, several batches in
+    flight on a thread pool, and AIMD concurrency: the in-flight limit halves on
+    ResourceExhausted (429) and grows by ~1 per window of successes.
+    """
+    def __init__(
+        self,
+        project: str,
+        location: str,
+        model: str = "text-embedding-004",
+        requests_per_min: float | None = 600,
+        tokens_per_min: float | None = None,
+        max_concurrency: int = 8,
+        initial_concurrency: int = 2,
+        max_retries: int = 6,
+        max_backoff_secs: float = 64.0,
+        embedding_model=None,
+        sleep=time.sleep,
+    ):
+        # embedding_model: pre-built TextEmbeddingModel (or a test double); skips vertex_init
+        self.project = project
+        self.location = location
+        self.model_name = model
+        self.max_retries = max_retries
+        self.max_backoff_secs = max_backoff_secs
+        self._sleep = sleep
+        if embedding_model is None:
+            from vertexai import init as vertex_init
+            from vertexai.language_models import TextEmbeddingModel
+            vertex_init(project=project, location=location)
+            embedding_model = TextEmbeddingModel.from_pretrained(model)
+        self._model = embedding_model
+        self.limiter = RateLimiter(requests_per_min=requests_per_min, tokens_per_min=tokens_per_min)
+        self.concurrency = AIMDConcurrency(initial=initial_concurrency, maximum=max_concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="vertex-embed")
+        self.requests = 0
+        self.throttled = 0
+
+    @staticmethod
+    def estimate_tokens(texts: List[str]) -> int:
+        # ~4 characters per token is close enough for budgeting
+        return sum(len(t or "") for t in texts) // 4 + len(texts)
+
+    def _embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        from google.api_core.exceptions import ResourceExhausted
+        for attempt in range(self.max_retries + 1):
+            self.concurrency.acquire()
+            try:
+                self.limiter.acquire(self.estimate_tokens(texts))
+                self.requests += 1
+                res = self._model.get_embeddings(texts)
+            except ResourceExhausted:
+                self.throttled += 1
+                self.concurrency.on_throttle()
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                self.concurrency.on_success()
+                return [e.values for e in res]
+            finally:
+                self.concurrency.release()
+            # jittered exponential backoff, outside the concurrency slot
+            sleep = min(2 ** (attempt + 1), self.max_backoff_secs) * random.uniform(0.5, 1.0)
+            print(f"[VertexEmbeddings] quota hit; concurrency -> {self.concurrency.limit}, backing off {sleep:.1f}s")
+            self._sleep(sleep)
+
+    def embed_texts_sync(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_with_retry(list(texts))
+
+    def embed_batches(self, batches: Iterable[List[str]]) -> Iterator[List[List[float]]]:
+        """
+        Embed a stream of batches concurrently, yielding results in input order.
+        Batches are pulled lazily, at most max_concurrency ahead of the consumer.
+        """
+        window = deque()
+        it = iter(batches)
+        exhausted = False
+        while True:
+            while not exhausted and len(window) < self.concurrency.maximum:
+                try:
+                    batch = next(it)
+                except StopIteration:
+                    exhausted = True
+                    break
+                window.append(self._pool.submit(self._embed_with_retry, list(batch)))
+            if not window:
+                return
+            yield window.popleft().result()
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "throttled": self.throttled,
+                "concurrency": self.concurrency.limit}
+
 
-# BigQuery “manual” vector search (no special vector funcs required)
+# BigQuery vector search: manual dot product SQL or VECTOR_SEARCH over a vector index.
+# The query vector and filters are sent as query parameters, so the SQL text is stable
+# (BigQuery can reuse its query cache) and the request payload stays small.
+# Expected table layout (partitioned by update_date, clustered by categories): src/shared/sql/chunks_table.sql
 class BigQueryVectorSearch:
-    def __init__(self, project: str, table: str):
+    MODES = ("dot", "vector_search")
+
+    def __init__(self, project: str, table: str, mode: str = "dot", client=None,
+                 cache_ttl_secs: float = 300.0, cache_size: int = 1024, cache_decimals: int = 4,
+                 fraction_lists_to_search: float | None = None, return_vectors: bool = False):
         """
         table: fully-qualified table, e.g., "my-proj.arxiv_demo.chunks"
+        mode: "dot" (full scan, exact) or "vector_search" (VECTOR_SEARCH, needs a vector index)
+        client: anything with .query(sql, job_config=...) -> job with .result(); defaults to bigquery.Client
+        cache_decimals: query vectors are rounded to this many decimals to build the cache key
+        return_vectors: also select each hit's embedding (used by the context packer's dedup / MMR)
         """
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}, got {mode!r}")
         self.project = project
         self.table = table
-        self.client = bigquery.Client(project=project)
+        self.mode = mode
+        self.fraction_lists_to_search = fraction_lists_to_search
+        from google.cloud import bigquery
+        self._bq = bigquery
+        self.client = client or bigquery.Client(project=project)
+        self.cache = TTLCache(maxsize=cache_size, ttl_secs=cache_ttl_secs)
+        self.cache_decimals = cache_decimals
+        self.return_vectors = return_vectors
+        # current_version() asks BigQuery for the table's last modification at most this often
+        self.version_poll_secs = 30.0
+        self._version, self._version_read_at = None, float("-inf")
+
+    def current_version(self) -> str | None:
+        """
+        The table's last modification time (MERGE deltas and reloads update it in place). When it
+        changes, cached search results are dropped; callers use it to invalidate their own caches.
+        """
+        now = time.monotonic()
+        if now - self._version_read_at >= self.version_poll_secs:
+            self._version_read_at = now
+            try:
+                modified = self.client.get_table(self.table).modified
+            except Exception as e:   # keep serving with the last version seen
+                print(f"[BigQueryVectorSearch] get_table failed: {type(e).__name__}: {e}")
+                return self._version
+            version = modified.isoformat() if modified else None
+            if self._version is not None and version != self._version:
+                self.cache.clear()
+            self._version = version
+        return self._version
 
-    def search(self, query_vec, k: int = 5) -> List[Dict]:
-        # Build the BigQuery array literal for the query vector
-        vec_lit = ",".join(str(float(x)) for x in query_vec)
-        sql = f"""
-        DECLARE q ARRAY<FLOAT64>;
-        SET q = [{vec_lit}];
+    def _where(self, filters: Dict | None):
+        """WHERE clauses + query parameters for the optional categories / update_date filters."""
+        clauses, params = [], []
+        filters = filters or {}
+        if filters.get("categories"):
+            # arXiv stores categories as one space-separated string, e.g. "cs.CL cs.LG"
+            clauses.append("EXISTS (SELECT 1 FROM UNNEST(SPLIT(categories, ' ')) AS c WHERE c IN UNNEST(@categories))")
+            params.append(self._bq.ArrayQueryParameter("categories", "STRING", list(filters["categories"])))
+        if filters.get("update_date_from"):
+            clauses.append("update_date >= @update_date_from")
+            params.append(self._bq.ScalarQueryParameter("update_date_from", "DATE", filters["update_date_from"]))
+        if filters.get("update_date_to"):
+            clauses.append("update_date <= @update_date_to")
+            params.append(self._bq.ScalarQueryParameter("update_date_to", "DATE", filters["update_date_to"]))
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
 
+    def _vec_col(self, alias: str = "") -> str:
+        if not self.return_vectors:
+            return ""
+        return f" {alias}.embedding AS embedding," if alias else " embedding,"
+
+    def _sql(self, k: int, where: str) -> str:
+        if self.mode == "vector_search":
+            options = ""
+            if self.fraction_lists_to_search:
+                options = f""",
+          options => '{{"fraction_lists_to_search": {float(self.fraction_lists_to_search)}}}'"""
+            # DOT_PRODUCT distance is the negated dot product
+            return f"""
+        SELECT base.id AS id, base.title AS title, base.chunk_text AS chunk_text,{self._vec_col('base')} -distance AS dot
+        FROM VECTOR_SEARCH(
+          (SELECT * FROM `{self.table}` {where}),
+          'embedding',
+          (SELECT @query_vec AS embedding),
+          top_k => {int(k)},
+          distance_type => 'DOT_PRODUCT'{options}
+        )
+        ORDER BY dot DESC;
+        """
+        return f"""
         SELECT
           id,
           title,
-          chunk_text,
+          chunk_text,{self._vec_col()}
           (
             SELECT SUM(e * qe)
             FROM UNNEST(embedding) AS e WITH OFFSET pos
-            JOIN UNNEST(q)        AS qe WITH OFFSET pos2
+            JOIN UNNEST(@query_vec) AS qe WITH OFFSET pos2
             ON pos = pos2
           ) AS dot
         FROM `{self.table}`
+        {where}
         ORDER BY dot DESC
-        LIMIT {k};
+        LIMIT {int(k)};
         """
-        rows = self.client.query(sql).result()
+
+    def _cache_key(self, query_vec, k: int, filters: Dict | None):
+        vec = tuple(round(float(x), self.cache_decimals) for x in query_vec)
+        return vec, int(k), filters_key(filters)
+
+    def search(self, query_vec, k: int = 5, filters: Dict | None = None) -> List[Dict]:
+        key = self._cache_key(query_vec, k, filters)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return [dict(r) for r in cached]
+
+        where, params = self._where(filters)
+        params.append(self._bq.ArrayQueryParameter("query_vec", "FLOAT64", [float(x) for x in query_vec]))
+        job_config = self._bq.QueryJobConfig(query_parameters=params)
+        rows = [dict(r) for r in self.client.query(self._sql(k, where), job_config=job_config).result()]
+        self.cache.set(key, rows)
         return [dict(r) for r in rows]
-    
+
+    def _sql_many(self, k: int, where: str) -> str:
+        """One query for a batch: @queries is ARRAY<STRUCT<qid INT64, vec ARRAY<FLOAT64>>>."""
+        if self.mode == "vector_search":
+            options = ""
+            if self.fraction_lists_to_search:
+                options = f""",
+          options => '{{"fraction_lists_to_search": {float(self.fraction_lists_to_search)}}}'"""
+            return f"""
+        SELECT query.qid AS qid, base.id AS id, base.title AS title, base.chunk_text AS chunk_text,{self._vec_col('base')} -distance AS dot
+        FROM VECTOR_SEARCH(
+          (SELECT * FROM `{self.table}` {where}),
+          'embedding',
+          (SELECT q.qid, q.vec AS embedding FROM UNNEST(@queries) AS q),
+          'embedding',
+          top_k => {int(k)},
+          distance_type => 'DOT_PRODUCT'{options}
+        )
+        ORDER BY qid, dot DESC;
+        """
+        return f"""
+        SELECT q.qid AS qid, t.id AS id, t.title AS title, t.chunk_text AS chunk_text,{self._vec_col('t')}
+          (
+            SELECT SUM(e * q.vec[OFFSET(pos)])
+            FROM UNNEST(t.embedding) AS e WITH OFFSET pos
+          ) AS dot
+        FROM (SELECT * FROM `{self.table}` {where}) AS t
+        CROSS JOIN UNNEST(@queries) AS q
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY q.qid ORDER BY dot DESC) <= {int(k)}
+        ORDER BY qid, dot DESC;
+        """
+
+    def search_many(self, query_vecs, k: int = 5, filters: Dict | None = None) -> List[List[Dict]]:
+        """search() for many vectors: cache hits are served locally, all misses share one BigQuery job."""
+        query_vecs = [list(v) for v in query_vecs]
+        keys = [self._cache_key(v, k, filters) for v in query_vecs]
+        out: List[List[Dict] | None] = [None] * len(query_vecs)
+        misses = []
+        for i, key in enumerate(keys):
+            cached = self.cache.get(key)
+            if cached is not None:
+                out[i] = [dict(r) for r in cached]
+            else:
+                misses.append(i)
+
+        if misses:
+            where, params = self._where(filters)
+            params.append(self._bq.ArrayQueryParameter("queries", "STRUCT", [
+                self._bq.StructQueryParameter(
+                    None,
+                    self._bq.ScalarQueryParameter("qid", "INT64", i),
+                    self._bq.ArrayQueryParameter("vec", "FLOAT64", [float(x) for x in query_vecs[i]]),
+                )
+                for i in misses
+            ]))
+            job_config = self._bq.QueryJobConfig(query_parameters=params)
+            found: Dict[int, List[Dict]] = {i: [] for i in misses}
+            for r in self.client.query(self._sql_many(k, where), job_config=job_config).result():
+                row = dict(r)
+                found[row.pop("qid")].append(row)
+            for i in misses:
+                self.cache.set(keys[i], found[i])
+                out[i] = [dict(r) for r in found[i]]
+        return out
+
 
 # --- Vertex AI Gemini minimal async wrapper ---
 class VertexLLM:
     """
     Thin async wrapper around Vertex AI Gemini models.
-    Uses generate_content under the hood and returns response.text.
+    Uses generate_content under the hood and returns response.text;
+    generate_stream() yields text chunks as Gemini produces them.
     """
-    def __init__(self, project: str, location: str, model: str = "gemini-1.5-flash"):
-        vertex_init(project=project, location=location)
+    def __init__(self, project: str, location: str, model: str = "gemini-1.5-flash", generative_model=None,
+                 executor=None):
+        # generative_model: pre-built GenerativeModel (or a test double); skips vertex_init
+        # executor: thread pool for the blocking calls (the API's llm stage); None = the loop's default
         self._model_name = model
-        self._model = GenerativeModel(model)
+        self._executor = executor
+        from vertexai.generative_models import GenerationConfig
+        self._generation_config = GenerationConfig
+        if generative_model is None:
+            from vertexai import init as vertex_init
+            from vertexai.generative_models import GenerativeModel
+            vertex_init(project=project, location=location)
+            generative_model = GenerativeModel(model)
+        self._model = generative_model
+
+    def _config(self, max_output_tokens: int, temperature: float, top_p: float):
+        return self._generation_config(
+            max_output_tokens=max_output_tokens,
+            temperature=temperature,
+            top_p=top_p,
+        )
 
     async def generate(
         self,
@@ -86,13 +493,69 @@ class VertexLLM:
         def _gen_sync():
             return self._model.generate_content(
                 [prompt],
-                generation_config=GenerationConfig(
-                    max_output_tokens=max_output_tokens,
-                    temperature=temperature,
-                    top_p=top_p,
-                ),
+                generation_config=self._config(max_output_tokens, temperature, top_p),
             )
         loop = asyncio.get_running_loop()
-        resp = await loop.run_in_executor(None, _gen_sync)
+        resp = await loop.run_in_executor(self._executor, _gen_sync)
         # vertexai responses expose .text with the concatenated candidate
         return getattr(resp, "text", str(resp))
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        max_output_tokens: int = 512,
+        temperature: float = 0.2,
+        top_p: float = 0.95,
+    ) -> AsyncIterator[str]:
+        """
+        Async iterator over text chunks. The blocking gRPC stream is drained on a worker
+        thread; if the consumer stops early (client disconnected), the stream is closed so
+        Gemini stops generating and no further quota is spent.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def _put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:  # loop already closed
+                pass
+
+        def _produce():
+            stream = None
+            try:
+                stream = self._model.generate_content(
+                    [prompt],
+                    generation_config=self._config(max_output_tokens, temperature, top_p),
+                    stream=True,
+                )
+                for chunk in stream:
+                    if stop.is_set():
+                        break
+                    try:
+                        text = chunk.text
+                    except (AttributeError, ValueError):  # e.g. a final chunk with no text part
+                        text = ""
+                    if text:
+                        _put(text)
+            except Exception as e:
+                _put(e)
+            finally:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+                _put(done)
+
+        loop.run_in_executor(self._executor, _produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
@@ -0,0 +1,227 @@
+# src/shared/lexical_index.py
+"""
+In-process BM25 over the chunk_text of a vector_store index, for lexical and hybrid retrieval.
+
+Offline build, into an existing local index dir (or build one from the store/embeddings JSONL first):
+
+    python -m src.shared.lexical_index --index_dir data/index
+    python -m src.shared.lexical_index --embeddings ... --store ... --out data/index
+
+Files added next to the vector_store files (row numbers are shared with embeddings.npy):
+    bm25_vocab.json       {term: term_id}
+    bm25_offsets.npy      (V + 1,) int64 start of each term's postings
+    bm25_docs.npy         (P,) int32 row numbers, ascending within a term
+    bm25_impacts.npy      (P,) float32 precomputed BM25 term score for (term, row)
+    bm25_max_impact.npy   (V,) float32 upper bound of each term's impacts
+    bm25_manifest.json    {"count", "terms", "postings", "avgdl", "k1", "b", "version", "source_version"}
+
+source_version is the vector_store manifest version the rows were read from. BM25 row numbers are
+only valid against that build, so LexicalIndex refuses rows from a different one, and
+shares_rows_with() tells whether a dense searcher can rescore them (retrieval_mode=rerank).
+
+Impacts are precomputed, so a query's score is a sum over the postings of its terms. Top-k uses
+MaxScore pruning (the term-at-a-time form of WAND's upper bounds): terms are visited by
+decreasing max impact, and once the remaining terms' bounds cannot lift an unseen row past the
+current k-th score, they are only looked up for existing candidates instead of adding new ones.
+"""
+import argparse, json, os, re, time
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from src.shared.vector_store import MANIFEST_FILE, LocalVectorSearch, ROWS_FILE, build_index, top_k
+
+VOCAB_FILE = "bm25_vocab.json"
+POSTING_OFFSETS_FILE = "bm25_offsets.npy"
+POSTING_DOCS_FILE = "bm25_docs.npy"
+IMPACTS_FILE = "bm25_impacts.npy"
+MAX_IMPACT_FILE = "bm25_max_impact.npy"
+BM25_MANIFEST_FILE = "bm25_manifest.json"
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were which with
+we our these those their there than then into can not also such via using use used based
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def _iter_rows(index_dir: str) -> Iterable[Dict]:
+    with open(os.path.join(index_dir, ROWS_FILE), "rb") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def build_bm25(index_dir: str, k1: float = 1.2, b: float = 0.75) -> Dict:
+    """Index the title + chunk_text of every row of a vector_store index dir."""
+    t0 = time.time()
+    with open(os.path.join(index_dir, MANIFEST_FILE)) as f:
+        source_version = json.load(f).get("version")
+    vocab: Dict[str, int] = {}
+    terms, docs, tfs, doc_len = [], [], [], []
+    for row_no, row in enumerate(_iter_rows(index_dir)):
+        counts = Counter(tokenize(f"{row.get('title') or ''} {row.get('chunk_text') or ''}"))
+        doc_len.append(sum(counts.values()))
+        for term, tf in counts.items():
+            terms.append(vocab.setdefault(term, len(vocab)))
+            docs.append(row_no)
+            tfs.append(tf)
+
+    n, n_terms = len(doc_len), len(vocab)
+    terms = np.asarray(terms, dtype=np.int32)
+    docs = np.asarray(docs, dtype=np.int32)
+    tfs = np.asarray(tfs, dtype=np.float32)
+    doc_len = np.asarray(doc_len, dtype=np.float32)
+    avgdl = float(doc_len.mean()) if n else 0.0
+
+    order = np.argsort(terms, kind="stable")          # rows stay ascending within each term
+    terms, docs, tfs = terms[order], docs[order], tfs[order]
+    df = np.bincount(terms, minlength=n_terms)
+    offsets = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(df, out=offsets[1:])
+
+    idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+    norm = k1 * (1.0 - b + b * doc_len[docs] / max(avgdl, 1e-9))
+    impacts = (idf[terms] * tfs * (k1 + 1.0) / (tfs + norm)).astype(np.float32)
+    max_impact = np.zeros(n_terms, dtype=np.float32)
+    np.maximum.at(max_impact, terms, impacts)
+
+    with open(os.path.join(index_dir, VOCAB_FILE), "w") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    np.save(os.path.join(index_dir, POSTING_OFFSETS_FILE), offsets)
+    np.save(os.path.join(index_dir, POSTING_DOCS_FILE), docs)
+    np.save(os.path.join(index_dir, IMPACTS_FILE), impacts)
+    np.save(os.path.join(index_dir, MAX_IMPACT_FILE), max_impact)
+    manifest = {"count": n, "terms": n_terms, "postings": int(len(docs)), "avgdl": avgdl,
+                "k1": k1, "b": b, "version": f"bm25-{int(time.time())}-{n}", "source_version": source_version}
+    with open(os.path.join(index_dir, BM25_MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+    print(f"[bm25] {n} rows, {n_terms} terms, {len(docs)} postings in {time.time() - t0:.1f}s")
+    return manifest
+
+
+def _merge(cand: np.ndarray, scores: np.ndarray, docs: np.ndarray, imps: np.ndarray):
+    """Union of two (sorted row, score) sets, summing scores of shared rows."""
+    all_docs = np.concatenate([cand, docs])
+    uniq, inv = np.unique(all_docs, return_inverse=True)
+    return uniq, np.bincount(inv, weights=np.concatenate([scores, imps]), minlength=len(uniq))
+
+
+def _lookup(cand: np.ndarray, scores: np.ndarray, docs: np.ndarray, imps: np.ndarray):
+    """Add a term's impacts to existing candidates only (docs ascending)."""
+    pos = np.searchsorted(docs, cand)
+    pos_c = np.minimum(pos, len(docs) - 1)
+    found = (pos < len(docs)) & (docs[pos_c] == cand)
+    scores = scores.copy()
+    scores[found] += imps[pos_c[found]]
+    return scores
+
+
+class LexicalIndex:
+    """
+    BM25 search over a vector_store index dir: search(text, k) -> [{id,title,chunk_text,bm25,...}].
+    `rows` supplies row(i) (a LocalVectorSearch over the same dir; shared with the dense searcher if given).
+    """
+    def __init__(self, index_dir: str, rows: LocalVectorSearch | None = None):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, BM25_MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(index_dir, VOCAB_FILE)) as f:
+            self.vocab: Dict[str, int] = json.load(f)
+        self.offsets = np.load(os.path.join(index_dir, POSTING_OFFSETS_FILE), mmap_mode="r")
+        self.docs = np.load(os.path.join(index_dir, POSTING_DOCS_FILE), mmap_mode="r")
+        self.impacts = np.load(os.path.join(index_dir, IMPACTS_FILE), mmap_mode="r")
+        self.max_impact = np.load(os.path.join(index_dir, MAX_IMPACT_FILE))
+        self.rows = rows if rows is not None else LocalVectorSearch(index_dir)
+        self.index_version = self.manifest.get("version")
+        if not self.shares_rows_with(self.rows):
+            raise ValueError(f"BM25 index in {index_dir} was built from a different vector index "
+                             f"(rerun python -m src.shared.lexical_index --index_dir {index_dir})")
+
+    def shares_rows_with(self, searcher) -> bool:
+        """True if searcher's row numbers are this index's (same vector_store build), so top_rows() can feed it."""
+        manifest = getattr(searcher, "manifest", None)
+        if manifest is None or manifest.get("count") != len(self):
+            return False
+        if self.manifest.get("source_version") is not None:
+            return self.manifest["source_version"] == manifest.get("version")
+        # built before source_version was recorded: trust the directory
+        return os.path.realpath(getattr(searcher, "index_dir", "")) == os.path.realpath(self.index_dir)
+
+    def __len__(self):
+        return int(self.manifest["count"])
+
+    def _postings(self, t: int) -> Tuple[np.ndarray, np.ndarray]:
+        a, b = int(self.offsets[t]), int(self.offsets[t + 1])
+        return np.asarray(self.docs[a:b]), np.asarray(self.impacts[a:b])
+
+    def top_rows(self, query: str, k: int, prune: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """(row numbers, BM25 scores) of the k best rows, best first."""
+        term_ids = sorted({self.vocab[t] for t in tokenize(query) if t in self.vocab},
+                          key=lambda t: -self.max_impact[t])
+        if not term_ids or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        bounds = self.max_impact[term_ids]
+        # remaining[j]: best score a row can still gain from terms j..end
+        remaining = np.concatenate([np.cumsum(bounds[::-1])[::-1], [0.0]])
+
+        cand = np.empty(0, dtype=np.int32)
+        scores = np.empty(0, dtype=np.float64)
+        theta = 0.0
+        for j, t in enumerate(term_ids):
+            docs, imps = self._postings(t)
+            if prune and len(cand) >= k and remaining[j] <= theta:
+                # no unseen row can reach the top k any more: score existing candidates only,
+                # and drop those that cannot catch up with the current k-th score
+                scores = _lookup(cand, scores, docs, imps)
+                keep = scores + remaining[j + 1] >= theta
+                cand, scores = cand[keep], scores[keep]
+            else:
+                cand, scores = _merge(cand, scores, docs, imps)
+            if len(cand) >= k:
+                theta = float(np.partition(scores, len(scores) - k)[len(scores) - k])
+        best = top_k(scores, min(k, len(scores)))
+        return cand[best].astype(np.int64), scores[best].astype(np.float32)
+
+    def search(self, query: str, k: int = 5, prune: bool = True) -> List[Dict]:
+        rows, scores = self.top_rows(query, k, prune=prune)
+        hits = []
+        for i, s in zip(rows.tolist(), scores.tolist()):
+            row = self.rows.row(i)
+            row["bm25"] = float(s)
+            hits.append(row)
+        return hits
+
+
+def rrf_fuse(result_lists: List[List[Dict]], k: int, c: int = 60) -> List[Dict]:
+    """Reciprocal rank fusion by id: score = sum over lists of 1 / (c + rank)."""
+    fused: Dict[str, Dict] = {}
+    for hits in result_lists:
+        for rank, h in enumerate(hits, start=1):
+            entry = fused.setdefault(h["id"], {**h, "rrf": 0.0})
+            entry.update({key: v for key, v in h.items() if key not in entry})
+            entry["rrf"] += 1.0 / (c + rank)
+    return sorted(fused.values(), key=lambda h: -h["rrf"])[:k]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index_dir", default=None, help="existing vector_store index dir to add BM25 files to")
+    ap.add_argument("--embeddings", default=None)
+    ap.add_argument("--store", default=None)
+    ap.add_argument("--out", default=None, help="with --embeddings/--store: build the vector_store index here first")
+    ap.add_argument("--k1", type=float, default=1.2)
+    ap.add_argument("--b", type=float, default=0.75)
+    args = ap.parse_args()
+    index_dir = args.index_dir
+    if index_dir is None:
+        if not (args.embeddings and args.out):
+            ap.error("pass --index_dir, or --embeddings [--store] --out")
+        build_index(args.embeddings, args.store, args.out)
+        index_dir = args.out
+    m = build_bm25(index_dir, k1=args.k1, b=args.b)
+    print(f"Built BM25 index: {m['count']} rows, {m['terms']} terms -> {index_dir}")
@@ -0,0 +1,44 @@
+# src/shared/model_snapshot.py
+"""
+Prebuilt copy of the query encoder, baked into the API image so a cold start loads weights and
+tokenizer from local disk: no hub lookups or downloads, no ONNX export / quantization.
+
+    python -m src.shared.model_snapshot --model intfloat/e5-small-v2 --backends torch onnx-int8 --out /models/encoder
+    export EMBED_SNAPSHOT_DIR=/models/encoder
+
+The directory is a SentenceTransformer save_pretrained() layout (safetensors weights, which
+transformers memory-maps) plus onnx/model.onnx and onnx/model_qint8_<quantization>.onnx for the
+ONNX backends, i.e. what LocalEmbeddings would otherwise build on first use.
+"""
+import argparse, os, time
+from typing import Dict, Iterable
+
+from src.shared.gcp_clients import LocalEmbeddings
+
+
+def build_snapshot(model_name: str, out_dir: str, backends: Iterable[str] = ("torch",),
+                   quantization: str = "avx2") -> Dict:
+    from sentence_transformers import SentenceTransformer
+    os.makedirs(out_dir, exist_ok=True)
+    SentenceTransformer(model_name, device="cpu").save_pretrained(out_dir, safe_serialization=True)
+    load_secs = {}
+    for backend in backends:
+        # the first load exports into out_dir; time a second one, which is what the API pays
+        LocalEmbeddings(model_name, backend=backend, quantization=quantization, snapshot_dir=out_dir)
+        t0 = time.perf_counter()
+        enc = LocalEmbeddings(model_name, backend=backend, quantization=quantization, snapshot_dir=out_dir)
+        enc.embed_queries(["warmup"])
+        load_secs[backend] = round(time.perf_counter() - t0, 2)
+    size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(out_dir) for f in files)
+    return {"model": model_name, "out": out_dir, "bytes": size, "load_secs": load_secs}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="intfloat/e5-small-v2")
+    ap.add_argument("--out", required=True, help="snapshot dir; point EMBED_SNAPSHOT_DIR at it")
+    ap.add_argument("--backends", nargs="+", default=["torch"], choices=LocalEmbeddings.BACKENDS)
+    ap.add_argument("--quantization", default="avx2", help="onnx-int8 target: arm64, avx2, avx512 or avx512_vnni")
+    args = ap.parse_args()
+    s = build_snapshot(args.model, args.out, args.backends, args.quantization)
+    print(f"Snapshot of {s['model']} ({s['bytes'] / 1e6:.1f} MB) -> {s['out']}; load + first query: {s['load_secs']}")
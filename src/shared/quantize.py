@@ -0,0 +1,285 @@
+# src/shared/quantize.py
+"""
+Scalar (int8) and binary (1 bit / dim) codes for embeddings, with float rescoring.
+
+    int8:    x_d ≈ scale_d * c_d, c_d in [-127, 127], scale_d = max |x_d| / 127 per dimension
+    binary:  bit_d = x_d > 0, packed 8 per byte; distance = popcount(a XOR b) (Hamming)
+
+For 384 dims that is 384 bytes (int8) or 48 bytes (binary) per vector instead of 1536 (float32).
+A search scans the codes for the best `k * rescore` candidates, then recomputes their exact dot
+products from the float matrix. Only those candidate rows are read from the memory-mapped
+embeddings.npy, so the resident working set is the codes.
+
+Build from an existing vector_store index dir (or from the codes artifact written by
+`embed_generator --quantize`, which must list the same ids in the same order):
+
+    python -m src.shared.quantize --index_dir data/index [--codes gs://$BUCKET/embeddings/arxiv_embeddings.codes.parquet]
+
+Adds to the index dir:
+    embeddings.int8.npy   (n, dim) int8
+    int8_scale.npy        (dim,) float32
+    embeddings.bits.npy   (n, dim / 8) uint8
+    quant_manifest.json
+"""
+import argparse, json, os, time
+from typing import Dict, List
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.shared.gcp_clients import GCSClient
+from src.shared.vector_store import MATRIX_FILE, LocalVectorSearch, top_k
+
+INT8_FILE = "embeddings.int8.npy"
+INT8_SCALE_FILE = "int8_scale.npy"
+BITS_FILE = "embeddings.bits.npy"
+QUANT_MANIFEST_FILE = "quant_manifest.json"
+
+
+# ---------- codecs ----------
+def int8_scale(x: np.ndarray) -> np.ndarray:
+    """Per-dimension symmetric scale so the largest |x_d| maps to 127."""
+    peak = np.abs(np.asarray(x, dtype=np.float32)).max(axis=0)
+    return np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+
+
+def quantize_int8(x: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    # values outside the calibration range clip to ±127
+    return np.clip(np.rint(np.asarray(x, dtype=np.float32) / scale), -127, 127).astype(np.int8)
+
+
+def binarize(x: np.ndarray) -> np.ndarray:
+    """Sign bits packed along the last axis: (..., dim) -> (..., ceil(dim / 8)) uint8."""
+    return np.packbits(np.asarray(x) > 0, axis=-1)
+
+
+def _words(bits: np.ndarray) -> np.ndarray:
+    # popcount over 64-bit words is ~8x fewer ops than over bytes
+    if bits.shape[-1] % 8 == 0 and bits.flags.c_contiguous:
+        return bits.view(np.uint64)
+    return bits
+
+
+def int8_scores(codes: np.ndarray, q_scaled: np.ndarray, step: int = 8192) -> np.ndarray:
+    """codes @ q_scaled, widening int8 -> float32 a cache-sized slice at a time (BLAS has no int8 GEMV)."""
+    out = np.empty(codes.shape[0], dtype=np.float32)
+    buf = np.empty((min(step, codes.shape[0]), codes.shape[1]), dtype=np.float32)
+    for i in range(0, codes.shape[0], step):
+        part = codes[i:i + step]
+        np.copyto(buf[:len(part)], part, casting="unsafe")
+        np.matmul(buf[:len(part)], q_scaled, out=out[i:i + len(part)])
+    return out
+
+
+# set bits of every byte value, for numpy < 2.0 (no np.bitwise_count)
+_POPCOUNT8 = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+
+def _hamming_lut(q_bits: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    return _POPCOUNT8[np.bitwise_xor(codes, q_bits)].sum(axis=-1, dtype=np.int32)
+
+
+def hamming(q_bits: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """Hamming distance from one packed query to each row of packed codes."""
+    if not hasattr(np, "bitwise_count"):
+        return _hamming_lut(q_bits, codes)
+    return np.bitwise_count(_words(np.ascontiguousarray(codes)) ^ _words(np.ascontiguousarray(q_bits))).sum(
+        axis=-1, dtype=np.int32)
+
+
+# ---------- pipeline artifact ----------
+def codes_schema(dim: int, scale: np.ndarray) -> pa.Schema:
+    return pa.schema([
+        ("id", pa.string()),
+        ("int8", pa.list_(pa.int8(), dim)),
+        ("bits", pa.list_(pa.uint8(), (dim + 7) // 8)),
+    ], metadata={"int8_scale": json.dumps([float(s) for s in scale])})
+
+
+class QuantizedSink:
+    """
+    Writer-stage sink that passes rows to `inner` (JsonlSink / ParquetSink) and also writes
+    int8 + sign-bit codes of every vector to a Parquet file at `out_uri`. The int8 scale is
+    calibrated on the first `calibration_rows` vectors; later outliers clip.
+    """
+    def __init__(self, inner, gcs: GCSClient, out_uri: str, calibration_rows: int = 8192,
+                 row_group_rows: int = 8192):
+        self.inner = inner
+        self.gcs = gcs
+        self.out_uri = out_uri
+        self.calibration_rows = calibration_rows
+        self.row_group_rows = row_group_rows
+        self.scale = None
+        self.rows = 0
+        self._ids: List[str] = []
+        self._vecs: List[np.ndarray] = []
+        self._pending = 0
+        self._file = self._writer = None
+
+    def __enter__(self):
+        self.inner.__enter__()
+        return self
+
+    def _flush(self):
+        if not self._ids:
+            return
+        x = np.concatenate(self._vecs)
+        if self.scale is None:
+            self.scale = int8_scale(x)
+            self._file = self.gcs.open(self.out_uri, "wb").open()
+            self._writer = pq.ParquetWriter(self._file, codes_schema(x.shape[1], self.scale), compression="NONE")
+        dim = x.shape[1]
+        batch = pa.RecordBatch.from_arrays([
+            pa.array(self._ids, type=pa.string()),
+            pa.FixedSizeListArray.from_arrays(pa.array(quantize_int8(x, self.scale).reshape(-1)), dim),
+            pa.FixedSizeListArray.from_arrays(pa.array(binarize(x).reshape(-1)), (dim + 7) // 8),
+        ], schema=self._writer.schema)
+        self._writer.write_batch(batch, row_group_size=self.row_group_rows)
+        self.rows += len(self._ids)
+        self._ids, self._vecs, self._pending = [], [], 0
+
+    def write(self, batch: List[Dict], vecs: List[List[float]]):
+        self.inner.write(batch, vecs)
+        self._ids.extend(r["id"] for r in batch)
+        self._vecs.append(np.asarray(vecs, dtype=np.float32).reshape(len(batch), -1))
+        self._pending += len(batch)
+        if self._pending >= (self.calibration_rows if self.scale is None else self.row_group_rows):
+            self._flush()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._flush()
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+                self._file.close()
+            self.inner.__exit__(exc_type, exc, tb)
+        return False
+
+
+def read_codes(gcs: GCSClient, uri: str):
+    """(ids, int8 codes, bits, scale) from a QuantizedSink artifact."""
+    with gcs.open(uri, "rb") as f:
+        table = pq.read_table(f)
+    scale = np.asarray(json.loads(table.schema.metadata[b"int8_scale"]), dtype=np.float32)
+    int8 = table.column("int8").combine_chunks()
+    bits = table.column("bits").combine_chunks()
+    return (table.column("id").to_pylist(),
+            int8.flatten().to_numpy().reshape(len(int8), int8.type.list_size),
+            bits.flatten().to_numpy().reshape(len(bits), bits.type.list_size), scale)
+
+
+# ---------- build ----------
+def _save(index_dir: str, int8: np.ndarray, bits: np.ndarray, scale: np.ndarray, source: str) -> Dict:
+    for name, arr in ((INT8_FILE, int8), (BITS_FILE, bits), (INT8_SCALE_FILE, scale)):
+        with open(os.path.join(index_dir, name + ".tmp"), "wb") as f:
+            np.save(f, arr)
+        os.replace(os.path.join(index_dir, name + ".tmp"), os.path.join(index_dir, name))
+    n, dim = int8.shape
+    manifest = {"count": n, "dim": dim, "int8_bytes": int(int8.nbytes), "bits_bytes": int(bits.nbytes),
+                "source": source, "version": f"quant-{int(time.time())}-{n}"}
+    with open(os.path.join(index_dir, QUANT_MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def build_quantized(index_dir: str, codes_uri: str | None = None, gcs: GCSClient | None = None,
+                    block: int = 65536) -> Dict:
+    """Write int8 and binary codes for the float matrix of an existing vector_store index dir."""
+    if codes_uri:
+        base = LocalVectorSearch(index_dir)
+        ids, int8, bits, scale = read_codes(gcs or GCSClient(), codes_uri)
+        if len(ids) != len(base) or any(base.row(i)["id"] != rid for i, rid in enumerate(ids)):
+            raise ValueError(f"{codes_uri} does not list the index rows in order; build without --codes")
+        return _save(index_dir, int8, bits, scale, source=codes_uri)
+
+    matrix = np.load(os.path.join(index_dir, MATRIX_FILE), mmap_mode="r")
+    n, dim = matrix.shape
+    scale = int8_scale(np.stack([np.abs(matrix[i:i + block]).max(axis=0) for i in range(0, n, block)]))
+    int8 = np.empty((n, dim), dtype=np.int8)
+    bits = np.empty((n, (dim + 7) // 8), dtype=np.uint8)
+    for i in range(0, n, block):
+        xb = np.asarray(matrix[i:i + block], dtype=np.float32)
+        int8[i:i + block] = quantize_int8(xb, scale)
+        bits[i:i + block] = binarize(xb)
+    return _save(index_dir, int8, bits, scale, source=MATRIX_FILE)
+
+
+# ---------- search ----------
+class QuantizedVectorSearch(LocalVectorSearch):
+    """
+    Same contract as LocalVectorSearch. mode="int8" scores candidates by the int8 codes against
+    the float query, mode="binary" by Hamming distance of the sign bits. The best `k * rescore`
+    candidates are rescored exactly, so `dot` is the true dot product; rescore=0 returns the
+    coarse ranking with approximate scores (dequantized dot, or 1 - 2 * hamming / dim).
+    """
+    MODES = ("int8", "binary")
+
+    def __init__(self, index_dir: str, mode: str = "binary", rescore: int = 10, block_rows: int = 262144):
+        super().__init__(index_dir, block_rows=block_rows)
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}")
+        with open(os.path.join(index_dir, QUANT_MANIFEST_FILE)) as f:
+            self.quant_manifest = json.load(f)
+        self.mode = mode
+        self.rescore = rescore
+        if mode == "int8":
+            self.codes = np.load(os.path.join(index_dir, INT8_FILE), mmap_mode="r")
+            self.scale = np.load(os.path.join(index_dir, INT8_SCALE_FILE))
+        else:
+            self.codes = np.load(os.path.join(index_dir, BITS_FILE), mmap_mode="r")
+
+    def memory_bytes(self) -> int:
+        """Bytes scanned per query / resident to serve queries (excludes the candidate float rows)."""
+        return int(self.codes.nbytes + (self.scale.nbytes if self.mode == "int8" else 0))
+
+    def _coarse(self, q: np.ndarray, n_cand: int):
+        n, dim = self.matrix.shape
+        n_cand = min(n_cand, n)
+        if self.mode == "int8":
+            qs = q * self.scale
+        else:
+            q_bits = binarize(q)
+        best_idx = best_scores = None
+        for start in range(0, n, self.block_rows):
+            block = self.codes[start:start + self.block_rows]
+            if self.mode == "int8":
+                scores = int8_scores(block, qs)
+            else:
+                scores = 1.0 - 2.0 * hamming(q_bits, block).astype(np.float32) / dim
+            local = top_k(scores, min(n_cand, len(scores)))
+            cand_idx, cand_scores = local + start, scores[local]
+            if best_idx is not None:
+                cand_idx = np.concatenate([best_idx, cand_idx])
+                cand_scores = np.concatenate([best_scores, cand_scores])
+                keep = top_k(cand_scores, n_cand)
+                cand_idx, cand_scores = cand_idx[keep], cand_scores[keep]
+            best_idx, best_scores = cand_idx, cand_scores
+        return best_idx, best_scores
+
+    def _search_one(self, q: np.ndarray, k: int):
+        if self.rescore <= 0:
+            return self._coarse(q, k)
+        cand, _ = self._coarse(q, k * self.rescore)
+        cand = np.sort(cand)   # ascending row order: sequential reads from the mmap
+        exact = np.asarray(self.matrix[cand], dtype=np.float32) @ q
+        best = top_k(exact, min(k, len(exact)))
+        return cand[best], exact[best]
+
+    def search_many(self, query_vecs, k: int = 5, filters: Dict | None = None) -> List[List[Dict]]:
+        self._check_filters(filters)
+        queries = np.asarray(query_vecs, dtype=np.float32).reshape(-1, self.matrix.shape[1])
+        if k <= 0 or len(self) == 0:
+            return [[] for _ in range(queries.shape[0])]
+        return [self._hits(*self._search_one(q, k)) for q in queries]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index_dir", required=True, help="vector_store index dir (python -m src.shared.vector_store)")
+    ap.add_argument("--codes", default=None, help="codes artifact from embed_generator --quantize (default: encode the matrix)")
+    args = ap.parse_args()
+    m = build_quantized(args.index_dir, args.codes)
+    print(f"Quantized {m['count']} x {m['dim']}: int8 {m['int8_bytes']} bytes, binary {m['bits_bytes']} bytes -> {args.index_dir}")
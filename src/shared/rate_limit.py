@@ -0,0 +1,102 @@
+# src/shared/rate_limit.py
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens/sec refill, at most `capacity` stored.
+    acquire(n) blocks until n tokens are available (n is capped at capacity so an
+    oversized request waits for a full bucket instead of forever).
+    """
+    def __init__(self, rate: float, capacity: float | None = None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, per_minute: float, burst_secs: float = 1.0, **kwargs) -> "TokenBucket":
+        rate = per_minute / 60.0
+        return cls(rate, capacity=max(rate * burst_secs, 1.0), **kwargs)
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, n: float = 1.0) -> float:
+        """Take n tokens, sleeping as needed. Returns seconds spent waiting."""
+        n = min(float(n), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return waited
+                wait = (n - self._tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+
+class RateLimiter:
+    """Requests/min and tokens/min budgets enforced together (either may be None)."""
+    def __init__(self, requests_per_min: float | None = None, tokens_per_min: float | None = None):
+        self.requests = TokenBucket.per_minute(requests_per_min) if requests_per_min else None
+        self.tokens = TokenBucket.per_minute(tokens_per_min) if tokens_per_min else None
+
+    def acquire(self, tokens: int = 0) -> float:
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire(1)
+        if self.tokens is not None and tokens:
+            waited += self.tokens.acquire(tokens)
+        return waited
+
+
+class AIMDConcurrency:
+    """
+    Adaptive in-flight limit: additive increase (+1 per `limit` successes) and
+    multiplicative decrease on throttling, like TCP congestion control.
+    """
+    def __init__(self, initial: int = 2, minimum: int = 1, maximum: int = 16, decrease: float = 0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self._limit = float(max(minimum, min(initial, maximum)))
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self.throttles = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self._limit = min(self.maximum, self._limit + 1.0 / max(self._limit, 1.0))
+            self._cond.notify_all()
+
+    def on_throttle(self):
+        with self._cond:
+            self.throttles += 1
+            self._limit = max(self.minimum, self._limit * self.decrease)
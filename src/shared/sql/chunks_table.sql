@@ -0,0 +1,52 @@
+-- Table layout used by BigQueryVectorSearch.
+-- Partitioned by month of update_date and clustered by categories, so the optional
+-- update_date / categories filters in /v1/chat prune partitions and blocks before the
+-- vector scan. Replace PROJECT with your project id.
+
+CREATE TABLE IF NOT EXISTS `PROJECT.arxiv_demo.chunks` (
+  id STRING NOT NULL,            -- "<doc_id>#<chunk_index>"
+  doc_id STRING,
+  title STRING,
+  chunk_index INT64,
+  chunk_text STRING,
+  categories STRING,             -- space-separated, e.g. "cs.CL cs.LG"
+  update_date DATE,
+  embedding ARRAY<FLOAT64>
+)
+PARTITION BY DATE_TRUNC(update_date, MONTH)
+CLUSTER BY categories;
+
+-- Populate from the pipeline outputs loaded as staging tables
+-- (embeddings JSONL, store JSONL, cleaned JSONL).
+INSERT INTO `PROJECT.arxiv_demo.chunks`
+SELECT
+  e.id, s.doc_id, s.title, s.chunk_index, s.chunk_text,
+  c.categories, SAFE.PARSE_DATE('%Y-%m-%d', c.update_date), e.embedding
+FROM `PROJECT.arxiv_demo.embeddings_staging` AS e
+JOIN `PROJECT.arxiv_demo.store_staging` AS s USING (id)
+JOIN `PROJECT.arxiv_demo.clean_staging` AS c ON c.id = s.doc_id;
+
+-- Needed for BQ_SEARCH_MODE=vector_search. Stored columns allow pre-filtering inside VECTOR_SEARCH.
+CREATE VECTOR INDEX IF NOT EXISTS chunks_embedding_idx
+ON `PROJECT.arxiv_demo.chunks`(embedding)
+STORING (title, chunk_text, categories, update_date)
+OPTIONS (index_type = 'IVF', distance_type = 'DOT_PRODUCT', ivf_options = '{"num_lists": 1000}');
+
+-- Applying an incremental embed_generator delta (--manifest runs): load the delta
+-- embeddings/store into the staging tables and the deletes JSONL into deletes_staging, then:
+MERGE `PROJECT.arxiv_demo.chunks` AS t
+USING (
+  SELECT e.id, s.doc_id, s.title, s.chunk_index, s.chunk_text,
+         c.categories, SAFE.PARSE_DATE('%Y-%m-%d', c.update_date) AS update_date, e.embedding
+  FROM `PROJECT.arxiv_demo.embeddings_staging` AS e
+  JOIN `PROJECT.arxiv_demo.store_staging` AS s USING (id)
+  JOIN `PROJECT.arxiv_demo.clean_staging` AS c ON c.id = s.doc_id
+) AS d
+ON t.id = d.id
+WHEN MATCHED THEN UPDATE SET
+  doc_id = d.doc_id, title = d.title, chunk_index = d.chunk_index, chunk_text = d.chunk_text,
+  categories = d.categories, update_date = d.update_date, embedding = d.embedding
+WHEN NOT MATCHED THEN INSERT ROW;
+
+DELETE FROM `PROJECT.arxiv_demo.chunks`
+WHERE id IN (SELECT id FROM `PROJECT.arxiv_demo.deletes_staging`);
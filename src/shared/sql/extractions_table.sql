@@ -0,0 +1,15 @@
+-- Output of src/data_pipeline/nlp_extractor.py (one row per chunk id; ids sharing a text share one analysis).
+-- content_hash = sha1(chunk_text); the extractor skips (id, content_hash) pairs already present, and
+-- clustering on it keeps that lookup (and /v1/extract reads) cheap. Replace PROJECT with your project id.
+
+CREATE TABLE IF NOT EXISTS `PROJECT.arxiv_demo.extractions` (
+  id STRING,                     -- chunk id "<doc_id>#<chunk_index>"
+  title STRING,
+  content_hash STRING NOT NULL,
+  entities JSON,                 -- [{"name", "type", "mentions"}]
+  sentiment_score FLOAT64,
+  sentiment_magnitude FLOAT64,
+  language_code STRING,
+  extracted_at TIMESTAMP
+)
+CLUSTER BY content_hash;
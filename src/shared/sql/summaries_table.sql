@@ -0,0 +1,13 @@
+-- Summaries written back by /v1/summarize (one per chunk id and max_tokens; summaries of raw
+-- request text are only cached in process). Lookups are by id, or by content_hash = sha1(chunk_text)
+-- for raw text that matches a chunk. Replace PROJECT with your project id.
+
+CREATE TABLE IF NOT EXISTS `PROJECT.arxiv_demo.summaries` (
+  id STRING NOT NULL,            -- chunk id "<doc_id>#<chunk_index>"
+  title STRING,
+  content_hash STRING NOT NULL,
+  max_tokens INT64,
+  summary STRING,
+  created_at TIMESTAMP
+)
+CLUSTER BY id, content_hash;
@@ -0,0 +1,264 @@
+# src/shared/vector_store.py
+"""
+In-process exact vector search over a memory-mapped float32 embedding matrix.
+
+Build once (offline) from the JSONL files written by `embed_generator.run`:
+
+    python -m src.shared.vector_store \
+      --embeddings gs://$BUCKET/embeddings/arxiv_embeddings.jsonl \
+      --store gs://$BUCKET/store/arxiv_store.jsonl \
+      --out data/index
+
+Index directory layout:
+    embeddings.npy        (n, dim) float32, C-contiguous, loaded with mmap_mode="r"
+    rows.jsonl            one metadata row per matrix row (id, doc_id, title, chunk_index, chunk_text)
+    rows.offsets.npy      (n + 1,) int64 byte offsets into rows.jsonl
+    manifest.json         {"count", "dim", "version"}
+
+Everything is opened read-only through mmap, so every uvicorn worker on a host shares
+the same page-cache pages instead of holding its own copy of the matrix.
+"""
+import argparse, json, mmap, os, time
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from src.shared.gcp_clients import GCSClient
+
+MATRIX_FILE = "embeddings.npy"
+ROWS_FILE = "rows.jsonl"
+OFFSETS_FILE = "rows.offsets.npy"
+MANIFEST_FILE = "manifest.json"
+
+
+def iter_jsonl(gcs: GCSClient, uri: str) -> Iterable[Dict]:
+    with gcs.open(uri, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _write_index(rows: Iterable[tuple], out_dir: str) -> Dict:
+    """
+    Write (metadata_row, vector) pairs into the memory-mappable layout above.
+    Vectors are streamed to a raw float32 scratch file first, so the matrix is never held in memory.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    raw_path = os.path.join(out_dir, MATRIX_FILE + ".raw")
+    rows_path = os.path.join(out_dir, ROWS_FILE + ".tmp")
+    offsets = [0]
+    dim, n = None, 0
+    with open(raw_path, "wb") as raw, open(rows_path, "wb") as rows_f:
+        for row, vec in rows:
+            if dim is None:
+                dim = len(vec)
+            if len(vec) != dim:
+                continue
+            raw.write(np.asarray(vec, dtype=np.float32).tobytes())
+            rows_f.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+            offsets.append(rows_f.tell())
+            n += 1
+
+    if n == 0:
+        os.remove(raw_path)
+        os.remove(rows_path)
+        raise ValueError("No embeddings to index")
+
+    src = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(n, dim))
+    dst = np.lib.format.open_memmap(os.path.join(out_dir, MATRIX_FILE + ".tmp"), mode="w+", dtype=np.float32, shape=(n, dim))
+    step = 65536
+    for i in range(0, n, step):
+        dst[i:i + step] = src[i:i + step]
+    dst.flush()
+    del src, dst
+    os.remove(raw_path)
+
+    with open(os.path.join(out_dir, OFFSETS_FILE + ".tmp"), "wb") as f:
+        np.save(f, np.asarray(offsets, dtype=np.int64))
+    # swap files in only once complete (never truncate in place): processes that already
+    # mapped the old files keep valid pages until they reload
+    for name in (MATRIX_FILE, ROWS_FILE, OFFSETS_FILE):
+        os.replace(os.path.join(out_dir, name + ".tmp"), os.path.join(out_dir, name))
+    manifest = {"count": n, "dim": dim, "version": f"{int(time.time())}-{n}"}
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def _meta(rec_id: str, meta: Dict) -> Dict:
+    return {
+        "id": rec_id,
+        "doc_id": meta.get("doc_id"),
+        "title": meta.get("title", ""),
+        "chunk_index": meta.get("chunk_index"),
+        "chunk_text": meta.get("chunk_text", ""),
+    }
+
+
+def build_index(embeddings_uri: str, store_uri: str | None, out_dir: str, gcs: GCSClient | None = None) -> Dict:
+    """
+    Convert embeddings + store JSONL into the memory-mappable layout above.
+    Peak memory is the store metadata (needed to join by id), not the matrix.
+    A *.parquet artifact already carries the store columns and is streamed batch by batch.
+    """
+    from src.shared import embed_parquet   # pyarrow; only index builds need it, not the API
+    gcs = gcs or GCSClient()
+    if embed_parquet.is_parquet(embeddings_uri):
+        return _write_index(((_meta(row["id"], row), vec) for row, vec in embed_parquet.iter_rows(gcs, embeddings_uri)), out_dir)
+    store = {r["id"]: r for r in iter_jsonl(gcs, store_uri)}
+    rows = ((_meta(rec["id"], store.get(rec["id"], {})), rec["embedding"])
+            for rec in iter_jsonl(gcs, embeddings_uri) if rec.get("embedding"))
+    return _write_index(rows, out_dir)
+
+
+def apply_delta(base_dir: str, embeddings_uri: str, store_uri: str, deletes_uri: str | None,
+                out_dir: str, gcs: GCSClient | None = None) -> Dict:
+    """
+    Rebuild an index from an existing one plus an incremental embed_generator delta
+    (upserted embeddings/store rows and deleted ids). out_dir may equal base_dir.
+    """
+    gcs = gcs or GCSClient()
+    deleted = {r["id"] for r in iter_jsonl(gcs, deletes_uri)} if deletes_uri and gcs.exists(deletes_uri) else set()
+    store = {r["id"]: r for r in iter_jsonl(gcs, store_uri)}
+    base = LocalVectorSearch(base_dir)
+
+    def rows():
+        # the base arrays stay mapped (unlinked files keep their pages) while out_dir is rewritten
+        for i in range(len(base)):
+            row = base.row(i)
+            if row["id"] not in store and row["id"] not in deleted:
+                yield row, base.matrix[i]
+        for rec in iter_jsonl(gcs, embeddings_uri):
+            if rec.get("embedding") and rec["id"] not in deleted:
+                yield _meta(rec["id"], store.get(rec["id"], {})), rec["embedding"]
+
+    return _write_index(rows(), out_dir)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores along the last axis, best first."""
+    n = scores.shape[-1]
+    if k >= n:
+        return np.argsort(-scores, axis=-1)
+    part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    part_scores = np.take_along_axis(scores, part, axis=-1)
+    order = np.argsort(-part_scores, axis=-1)
+    return np.take_along_axis(part, order, axis=-1)
+
+
+class LocalVectorSearch:
+    """
+    Drop-in replacement for BigQueryVectorSearch: search(query_vec, k) -> [{id,title,chunk_text,dot,...}].
+    Scores are raw dot products, same as the BigQuery SQL.
+    """
+    VERSION_FILE = MANIFEST_FILE
+
+    def __init__(self, index_dir: str, block_rows: int = 262144):
+        self.index_dir = index_dir
+        self.block_rows = block_rows
+        with open(os.path.join(index_dir, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.index_version = self.manifest.get("version")
+        self.matrix = np.load(os.path.join(index_dir, MATRIX_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(index_dir, OFFSETS_FILE), mmap_mode="r")
+        self._rows_file = open(os.path.join(index_dir, ROWS_FILE), "rb")
+        self._rows = mmap.mmap(self._rows_file.fileno(), 0, access=mmap.ACCESS_READ)
+        # add each hit's stored vector as "embedding" (used by the context packer's dedup / MMR)
+        self.return_vectors = False
+        # current_version() re-reads the manifest on disk at most this often
+        self.version_poll_secs = 30.0
+        self._version, self._version_read_at = self.index_version, time.monotonic()
+
+    def current_version(self) -> str | None:
+        """
+        Version in the manifest under index_dir now, which differs from index_version once a
+        rebuilt index has been written there (e.g. to invalidate the semantic answer cache).
+        """
+        now = time.monotonic()
+        if now - self._version_read_at >= self.version_poll_secs:
+            self._version_read_at = now
+            try:
+                with open(os.path.join(self.index_dir, self.VERSION_FILE)) as f:
+                    self._version = json.load(f).get("version")
+            except (OSError, ValueError):
+                pass   # mid-rewrite: keep the last version seen
+        return self._version
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def row(self, i: int) -> Dict:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return json.loads(self._rows[start:end])
+
+    def _scan(self, queries: np.ndarray, k: int):
+        """Block-wise matmul + argpartition, merging per-block candidates. Returns (idx, scores), shape (m, k)."""
+        n = self.matrix.shape[0]
+        k = min(k, n)
+        best_idx = best_scores = None
+        for start in range(0, n, self.block_rows):
+            block = self.matrix[start:start + self.block_rows]
+            scores = queries @ block.T                          # (m, b)
+            local = top_k(scores, min(k, scores.shape[1]))
+            cand_scores = np.take_along_axis(scores, local, axis=1)
+            cand_idx = local + start
+            if best_idx is not None:
+                cand_scores = np.concatenate([best_scores, cand_scores], axis=1)
+                cand_idx = np.concatenate([best_idx, cand_idx], axis=1)
+                keep = top_k(cand_scores, k)
+                cand_scores = np.take_along_axis(cand_scores, keep, axis=1)
+                cand_idx = np.take_along_axis(cand_idx, keep, axis=1)
+            best_idx, best_scores = cand_idx, cand_scores
+        return best_idx, best_scores
+
+    def _hits(self, idx: np.ndarray, scores: np.ndarray) -> List[Dict]:
+        hits = []
+        for i, s in zip(idx.tolist(), scores.tolist()):
+            row = self.row(i)
+            row["dot"] = float(s)
+            if self.return_vectors:
+                row["embedding"] = np.asarray(self.matrix[i], dtype=np.float32)
+            hits.append(row)
+        return hits
+
+    @staticmethod
+    def _check_filters(filters: Dict | None):
+        # The rows sidecar carries no categories / update_date; filtering needs the BigQuery backend.
+        if filters and any(filters.values()):
+            raise ValueError("categories / update_date filters require VECTOR_BACKEND=bigquery")
+
+    def search(self, query_vec, k: int = 5, filters: Dict | None = None) -> List[Dict]:
+        return self.search_many([query_vec], k=k, filters=filters)[0]
+
+    def search_many(self, query_vecs, k: int = 5, filters: Dict | None = None) -> List[List[Dict]]:
+        self._check_filters(filters)
+        queries = np.asarray(query_vecs, dtype=np.float32).reshape(-1, self.matrix.shape[1])
+        if k <= 0 or len(self) == 0:
+            return [[] for _ in range(queries.shape[0])]
+        idx, scores = self._scan(queries, k)
+        return [self._hits(i, s) for i, s in zip(idx, scores)]
+
+    def search_rows(self, query_vec, rows, k: int = 5) -> List[Dict]:
+        """Exact dot-product rescoring of a candidate set of row numbers (e.g. from BM25)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if k <= 0 or len(rows) == 0:
+            return []
+        q = np.asarray(query_vec, dtype=np.float32).reshape(-1)
+        scores = np.asarray(self.matrix[np.sort(rows)], dtype=np.float32) @ q
+        best = top_k(scores, min(k, len(scores)))
+        return self._hits(np.sort(rows)[best], scores[best])
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--embeddings", required=True)
+    ap.add_argument("--store", default=None, help="store JSONL (not needed for a *.parquet --embeddings)")
+    ap.add_argument("--out", required=True, help="local directory for the index files")
+    ap.add_argument("--base", default=None, help="existing index dir; --embeddings/--store/--deletes are a delta on top of it")
+    ap.add_argument("--deletes", default=None, help="delta: JSONL of removed ids")
+    args = ap.parse_args()
+    if args.base:
+        m = apply_delta(args.base, args.embeddings, args.store, args.deletes, args.out)
+    else:
+        m = build_index(args.embeddings, args.store, args.out)
+    print(f"Built local index: {m['count']} x {m['dim']} -> {args.out}")
@@ -0,0 +1,21 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src.agent_api.core.rag_service import RAGService
+from src.agent_api.core.services import Services
+from src.agent_api.main import create_app
+from tests.agent_api.fakes import FakeEmbedder, FakeLLM, FakeSearcher, wait_ready
+
+
+@pytest.fixture
+def fake_services():
+    rag = RAGService(embedder=FakeEmbedder(), searcher=FakeSearcher(), llm=FakeLLM())
+    return Services(rag=rag)
+
+
+@pytest.fixture
+def client(fake_services):
+    app = create_app(services_factory=lambda: fake_services)
+    with TestClient(app) as c:
+        wait_ready(c)
+        yield c
@@ -0,0 +1,60 @@
+import time
+
+from fastapi.testclient import TestClient
+
+
+class FakeEmbedder:
+    def __init__(self, dim: int = 4):
+        self.dim = dim
+        self.calls = []
+
+    def _vec(self, text):
+        v = [0.0] * self.dim
+        for i, ch in enumerate(text):
+            v[i % self.dim] += ord(ch) % 7
+        norm = sum(x * x for x in v) ** 0.5 or 1.0
+        return [x / norm for x in v]
+
+    def embed_queries(self, texts):
+        self.calls.append(list(texts))
+        return [self._vec(t) for t in texts]
+
+    def embed_passages(self, texts):
+        return [self._vec(t) for t in texts]
+
+
+class FakeSearcher:
+    def __init__(self, hits=None):
+        self.hits = hits if hits is not None else [
+            {"id": "1234.5678#0", "title": "Attention Is All You Need", "chunk_text": "Transformers use attention.", "dot": 0.9},
+            {"id": "2345.6789#0", "title": "BERT", "chunk_text": "Bidirectional encoders.", "dot": 0.8},
+        ]
+        self.calls = []
+
+    def search(self, query_vec, k: int = 5, filters=None):
+        self.calls.append((list(query_vec), k, filters))
+        return [dict(h) for h in self.hits[:k]]
+
+
+class FakeLLM:
+    def __init__(self, text: str = "Transformers are attention-based models [Attention Is All You Need]."):
+        self.text = text
+        self.prompts = []
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        self.prompts.append(prompt)
+        return self.text
+
+    async def generate_stream(self, prompt: str, **kwargs):
+        self.prompts.append(prompt)
+        for word in self.text.split(" "):
+            yield word + " "
+
+
+def wait_ready(client: TestClient, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if client.get("/healthz").status_code == 200:
+            return
+        time.sleep(0.01)
+    raise AssertionError("services never became ready")
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from tests.agent_api.fakes import FakeEmbedder, FakeLLM, FakeSearcher
+from src.agent_api.core.admission import OverloadedError, PipelineLimits, StageLimiter, deadline
+from src.agent_api.core.rag_service import RAGService
+
+
+class SlowLLM(FakeLLM):
+    async def generate(self, prompt: str, **kwargs) -> str:
+        self.prompts.append(prompt)
+        await asyncio.sleep(0.05)
+        return self.text
+
+
+class ThreadRecordingSearcher(FakeSearcher):
+    def search(self, query_vec, k: int = 5, filters=None):
+        self.thread = threading.current_thread().name
+        return super().search(query_vec, k, filters)
+
+
+def test_identical_concurrent_questions_share_one_run():
+    async def main():
+        llm = SlowLLM()
+        rag = RAGService(embedder=FakeEmbedder(), searcher=ThreadRecordingSearcher(), llm=llm)
+        results = await asyncio.gather(rag.answer("what is BERT?", k=2), rag.answer("what is BERT?", k=2),
+                                       rag.answer("what is BERT?", k=1))
+        rag.limits.close()
+        return rag, llm, results
+
+    rag, llm, results = asyncio.run(main())
+    assert [r["cache"] for r in results] == ["miss", "coalesced", "miss"]
+    assert results[0]["answer"] == results[1]["answer"]
+    assert len(llm.prompts) == 2   # k differs for the third
+    assert rag.single_flight.stats()["coalesced"] == 1
+    # blocking search runs on the search stage's pool, not the event loop
+    assert rag.searcher.thread.startswith("search")
+
+
+def test_requests_beyond_max_in_flight_get_429():
+    async def main():
+        limits = PipelineLimits(max_in_flight=1)
+        rag = RAGService(embedder=FakeEmbedder(), searcher=FakeSearcher(), llm=SlowLLM(), limits=limits)
+        results = await asyncio.gather(rag.answer("a"), rag.answer("b"), return_exceptions=True)
+        limits.close()
+        return limits, results
+
+    limits, (ok, shed) = asyncio.run(main())
+    assert ok["cache"] == "miss"
+    assert isinstance(shed, OverloadedError) and shed.status_code == 429
+    assert limits.requests.stats()["rejected"] == 1
+
+
+def test_stage_sheds_when_expected_wait_exceeds_deadline():
+    async def main():
+        stage = StageLimiter("search", limit=1)
+        await stage.run(time.sleep, 0.2)   # learns the service time
+        busy = asyncio.ensure_future(stage.run(time.sleep, 0.2))
+        await asyncio.sleep(0.01)
+        with deadline(0.05):
+            with pytest.raises(OverloadedError) as exc:
+                await stage.run(time.sleep, 0)
+        with deadline(5):
+            await stage.run(time.sleep, 0)   # enough budget: waits its turn
+        await busy
+        stage.close()
+        return stage, exc.value
+
+    stage, err = asyncio.run(main())
+    assert err.status_code == 503 and err.headers == {"Retry-After": "1"}
+    assert stage.stats()["shed"] == 1 and stage.stats()["calls"] == 4
+
+
+def test_overloaded_maps_to_status_and_retry_after(client, fake_services, monkeypatch):
+    async def overloaded(*args, **kwargs):
+        raise OverloadedError("llm overloaded", status_code=503, retry_after=2.5)
+
+    monkeypatch.setattr(fake_services.rag, "answer", overloaded)
+    r = client.post("/v1/chat", json={"question": "hi", "k": 2})
+    assert r.status_code == 503 and r.headers["Retry-After"] == "3"
+    assert client.get("/stats").json()["admission"]["requests"]["max_in_flight"] > 0
+
+
+def test_summaries_take_llm_stage_slots():
+    from src.agent_api.core.extract_service import ExtractService
+
+    async def main():
+        stage = StageLimiter("llm", limit=1, max_queue=1)
+        svc = ExtractService(SlowLLM(), llm_stage=stage)
+        results = await asyncio.gather(*(svc.summarize(text=f"text {i}") for i in range(3)), return_exceptions=True)
+        stage.close()
+        return stage, results
+
+    stage, results = asyncio.run(main())
+    shed = [r for r in results if isinstance(r, OverloadedError)]
+    assert len(shed) == 1 and stage.stats()["calls"] == 3 and stage.stats()["shed"] == 1
+
+
+def test_batched_encode_is_shed_past_the_deadline():
+    from src.agent_api.core.embed_batcher import EmbeddingBatcher, QueueFullError
+
+    class SlowEmbedder(FakeEmbedder):
+        def embed_queries(self, texts):
+            time.sleep(0.1)
+            return super().embed_queries(texts)
+
+    async def main():
+        b = EmbeddingBatcher(SlowEmbedder(), max_wait_ms=1)
+        await b.embed_queries(["warm"])   # learns the encode time
+        with deadline(0.01):
+            with pytest.raises(QueueFullError):
+                await b.embed_queries(["late"])
+        with deadline(5):
+            await b.embed_queries(["on time"])
+        await b.close()
+        return b
+
+    assert asyncio.run(main()).stats()["rejected"] == 1
+
+
+def test_coalesced_callers_are_admitted_and_deadlined_on_their_own():
+    async def main(limits):
+        rag = RAGService(embedder=FakeEmbedder(), searcher=FakeSearcher(), llm=SlowLLM(), limits=limits)
+        results = await asyncio.gather(*(rag.answer("same question") for _ in range(4)), return_exceptions=True)
+        limits.close()
+        return rag, results
+
+    # all four share one key, yet only max_in_flight of them are let in
+    rag, results = asyncio.run(main(PipelineLimits(max_in_flight=2)))
+    assert [r["cache"] if isinstance(r, dict) else r.status_code for r in results] == ["miss", "coalesced", 429, 429]
+    assert len(rag.llm.prompts) == 1 and rag.limits.requests.stats()["rejected"] == 2
+
+    # a shared run slower than the deadline: every caller gets 503 when its own budget runs out
+    rag, results = asyncio.run(main(PipelineLimits(deadline_secs=0.01)))
+    assert all(isinstance(r, OverloadedError) and r.status_code == 503 for r in results)
+    assert rag.single_flight.stats()["coalesced"] == 3
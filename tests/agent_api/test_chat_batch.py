@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from tests.agent_api.fakes import FakeEmbedder, FakeLLM, FakeSearcher
+from src.agent_api.core.rag_service import RAGService
+
+
+class FakeBatchSearcher(FakeSearcher):
+    def __init__(self):
+        super().__init__()
+        self.many_calls = []
+
+    def search_many(self, query_vecs, k: int = 5, filters=None):
+        self.many_calls.append((len(query_vecs), k, filters))
+        return [[dict(h) for h in self.hits[:k]] for _ in query_vecs]
+
+
+class FlakyLLM(FakeLLM):
+    async def generate(self, prompt: str, **kwargs) -> str:
+        if "explode" in prompt:
+            raise RuntimeError("Gemini 500")
+        return await super().generate(prompt, **kwargs)
+
+
+@pytest.fixture
+def batch_services(fake_services):
+    fake_services.rag = RAGService(embedder=FakeEmbedder(), searcher=FakeBatchSearcher(), llm=FlakyLLM())
+    return fake_services
+
+
+QUESTIONS = ["What is attention?", "please explode", "What is BERT?"]
+
+
+def test_batch_amortizes_embedding_and_search(client, batch_services):
+    r = client.post("/v1/chat/batch", json={"questions": QUESTIONS, "k": 1})
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [it["index"] for it in results] == [0, 1, 2]
+    assert results[0]["citations"] == ["Attention Is All You Need"] and results[0]["error"] is None
+    assert results[1]["error"] == "RuntimeError: Gemini 500" and results[1]["answer"] is None
+
+    rag = batch_services.rag
+    assert rag.embedder.calls == [QUESTIONS]           # one encode call
+    assert rag.searcher.many_calls == [(3, 1, None)]   # one search call
+    assert rag.searcher.calls == []
+
+
+def test_batch_streams_ndjson(client, batch_services):
+    r = client.post("/v1/chat/batch", json={"questions": QUESTIONS, "k": 2, "stream": True})
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(l) for l in r.text.strip().splitlines()]
+    assert sorted(l["index"] for l in lines) == [0, 1, 2]
+    assert sum(1 for l in lines if l["error"]) == 1
+
+
+def test_batch_limits(client, batch_services, monkeypatch):
+    from src.agent_api.core.config import settings
+    monkeypatch.setattr(settings, "chat_batch_max", 2)
+    assert client.post("/v1/chat/batch", json={"questions": QUESTIONS}).status_code == 413
+    assert client.post("/v1/chat/batch", json={"questions": []}).status_code == 422
+
+
+def test_batch_closes_the_results_when_an_item_fails(client, batch_services, monkeypatch):
+    closed = []
+
+    async def answer_many(questions, **kwargs):
+        try:
+            yield 0, {"answer": "ok"}
+            yield 1, {"answer": ["not a string"]}   # fails validation in the route
+            yield 2, {"answer": "never read"}
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(batch_services.rag, "answer_many", answer_many)
+    assert client.post("/v1/chat/batch", json={"questions": QUESTIONS}).status_code == 400
+    assert closed == [True]
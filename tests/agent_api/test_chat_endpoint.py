@@ -1,13 +1,91 @@
+import time
+from datetime import date
+
 from fastapi.testclient import TestClient
-from src.agent_api.main import app
+from src.agent_api.main import app, create_app
 
-def test_health():
-    c = TestClient(app)
-    r = c.get("/healthz")
+def test_health(client):
+    r = client.get("/healthz")
     assert r.status_code == 200
     assert r.json()["ok"] is True
 
-def test_chat_not_implemented_yet():
+def test_health_not_ready_before_warmup():
     c = TestClient(app)
-    r = c.post("/v1/chat", json={"question": "hi", "top_k": 3})
-    assert r.status_code in (404, 501)
+    r = c.get("/healthz")
+    assert r.status_code == 503
+    assert r.json()["ready"] is False
+
+def test_chat_unavailable_before_warmup():
+    c = TestClient(app)
+    r = c.post("/v1/chat", json={"question": "hi", "k": 3})
+    assert r.status_code == 503
+    assert "Retry-After" in r.headers
+
+def test_chat_uses_shared_services(client, fake_services):
+    for _ in range(2):
+        r = client.post("/v1/chat", json={"question": "What are transformer models?", "k": 1})
+        assert r.status_code == 200
+        body = r.json()
+        assert body["citations"] == ["Attention Is All You Need"]
+        assert len(body["matches"]) == 1
+    rag = fake_services.rag
+    # warm-up query + two requests, all against the same embedder instance
+    assert rag.embedder.calls[0] == ["warmup"]
+    assert len(rag.embedder.calls) == 3
+    assert len(rag.llm.prompts) == 2
+
+def test_startup_failure_is_reported():
+    def boom():
+        raise RuntimeError("no credentials")
+    with TestClient(create_app(services_factory=boom)) as c:
+        r = c.get("/healthz")
+        for _ in range(100):
+            if "error" in r.json():
+                break
+            time.sleep(0.01)
+            r = c.get("/healthz")
+        assert r.status_code == 503
+        assert "no credentials" in r.json()["error"]
+
+def test_chat_passes_filters_to_searcher(client, fake_services):
+    r = client.post("/v1/chat", json={"question": "q", "k": 2, "categories": ["cs.CL"],
+                                      "update_date_from": "2021-01-01"})
+    assert r.status_code == 200
+    _, _, filters = fake_services.rag.searcher.calls[-1]
+    assert filters == {"categories": ["cs.CL"], "update_date_from": date(2021, 1, 1)}
+
+def test_stats_endpoint(client, fake_services):
+    from src.shared.embed_cache import CachedEmbeddings
+    fake_services.rag.embedder = CachedEmbeddings(fake_services.rag.embedder, model_name="fake", maxsize=10)
+    for question in ("What are transformer models?", "  what are Transformer models? "):
+        assert client.post("/v1/chat", json={"question": question, "k": 2}).status_code == 200
+    r = client.get("/stats")
+    assert r.status_code == 200
+    stats = r.json()
+    # the normalized question is encoded once; the second ask is a memory hit
+    assert stats["embed_cache"]["encoded"] == 1 and "disk" not in stats["embed_cache"]
+    memory = stats["embed_cache"]["memory"]
+    assert (memory["size"], memory["hits"], memory["misses"]) == (1, 1, 1)
+    assert stats["admission"]["requests"]["admitted"] == 2 and stats["single_flight"]["coalesced"] == 0
+
+class FakeLexical:
+    def __init__(self):
+        self.queries = []
+
+    def search(self, query, k=5):
+        self.queries.append(query)
+        return [{"id": "2345.6789#0", "title": "BERT", "chunk_text": "Bidirectional encoders.", "bm25": 7.5},
+                {"id": "3456.7890#0", "title": "GPT", "chunk_text": "Autoregressive decoders.", "bm25": 3.0}][:k]
+
+def test_retrieval_modes(client, fake_services):
+    r = client.post("/v1/chat", json={"question": "bert encoders", "k": 2, "retrieval_mode": "lexical"})
+    assert r.status_code == 400 and "LEXICAL_INDEX_DIR" in r.json()["detail"]
+
+    fake_services.rag.lexical = FakeLexical()
+    r = client.post("/v1/chat", json={"question": "bert encoders", "k": 2, "retrieval_mode": "hybrid"})
+    assert r.status_code == 200
+    assert [m["id"] for m in r.json()["matches"]] == ["2345.6789#0", "1234.5678#0"]
+    assert fake_services.rag.lexical.queries == ["bert encoders"]
+    r = client.post("/v1/chat", json={"question": "bert encoders", "k": 2, "retrieval_mode": "hybrid",
+                                      "categories": ["cs.CL"]})
+    assert r.status_code == 400
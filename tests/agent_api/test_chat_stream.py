@@ -0,0 +1,74 @@
+import asyncio
+import json
+import threading
+
+from src.shared.gcp_clients import VertexLLM
+
+
+def parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_sends_retrieval_then_tokens(client, fake_services):
+    r = client.post("/v1/chat/stream", json={"question": "What are transformer models?", "k": 1})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(r.text)
+    assert events[0][0] == "retrieval"
+    assert events[0][1]["citations"] == ["Attention Is All You Need"]
+    tokens = [d["text"] for e, d in events if e == "token"]
+    assert len(tokens) > 1
+    assert events[-1] == ("done", {"answer": "".join(tokens)})
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeStreamingModel:
+    """Stand-in for GenerativeModel.generate_content(stream=True)."""
+    def __init__(self, n_chunks=1000):
+        self.n_chunks = n_chunks
+        self.produced = 0
+        self.closed = threading.Event()
+
+    def generate_content(self, contents, generation_config=None, stream=False):
+        assert stream
+
+        def gen():
+            try:
+                for i in range(self.n_chunks):
+                    self.produced += 1
+                    yield FakeChunk(f"t{i} ")
+            finally:
+                self.closed.set()
+        return gen()
+
+
+def test_vertex_stream_yields_chunks():
+    llm = VertexLLM("p", "l", generative_model=FakeStreamingModel(n_chunks=3))
+
+    async def main():
+        return [t async for t in llm.generate_stream("hi")]
+
+    assert asyncio.run(main()) == ["t0 ", "t1 ", "t2 "]
+
+
+def test_vertex_stream_stops_when_consumer_goes_away():
+    model = FakeStreamingModel(n_chunks=10_000_000)
+    llm = VertexLLM("p", "l", generative_model=model)
+
+    async def main():
+        stream = llm.generate_stream("hi")
+        got = [await stream.__anext__(), await stream.__anext__()]
+        await stream.aclose()           # what the SSE endpoint does on disconnect
+        return got
+
+    assert asyncio.run(main()) == ["t0 ", "t1 "]
+    assert model.closed.wait(5)
+    assert model.produced < model.n_chunks
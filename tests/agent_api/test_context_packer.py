@@ -0,0 +1,70 @@
+import numpy as np
+
+from tests.agent_api.fakes import FakeEmbedder, FakeLLM, FakeSearcher
+from src.agent_api.core.context_packer import ContextPacker, estimate_tokens
+from src.agent_api.core.rag_service import RAGService
+
+WORDS = [f"w{i}" for i in range(2000)]
+
+
+def _hit(id_, text, vec, title="Paper", dot=0.5):
+    return {"id": id_, "title": title, "chunk_text": text, "dot": dot,
+            "embedding": np.asarray(vec, dtype=np.float32)}
+
+
+def _text(seed, n=150):
+    rng = np.random.default_rng(seed)
+    return " ".join(rng.choice(WORDS, n))
+
+
+def test_drops_near_duplicates_and_merges_adjacent_chunks():
+    hits = [
+        _hit("A#1", "second part of A.", [1, 0, 0], title="A"),
+        _hit("B#0", "B text.", [0, 1, 0], title="B"),
+        _hit("C#0", "C restates B.", [0, 0.999, 0.04], title="C"),   # near-duplicate of B
+        _hit("A#0", "first part of A.", [0.6, 0, 0.8], title="A"),
+    ]
+    passages, stats = ContextPacker(token_budget=1000).pack(hits)
+    assert [p["ids"] for p in passages] == [["A#0", "A#1"], ["B#0"]]
+    assert passages[0]["text"] == "first part of A. second part of A."
+    assert stats["duplicates"] == 1 and stats["merged"] == 1 and stats["passages"] == 2
+
+
+def test_jaccard_dedup_without_vectors_and_budget_is_respected():
+    hits = [{"id": f"{i}#0", "title": f"T{i}", "chunk_text": _text(i)} for i in range(1, 20)]
+    hits.insert(1, {"id": "dup#0", "title": "dup", "chunk_text": hits[0]["chunk_text"] + " extra"})
+    passages, stats = ContextPacker(token_budget=500, dedup_threshold=0.9).pack(hits, baseline_tokens=2000)
+    assert "dup#0" not in [i for p in passages for i in p["ids"]]
+    assert stats["context_tokens"] <= 500 and stats["tokens_saved"] == 2000 - stats["context_tokens"]
+    # the last passage is the head of a chunk cut to fill the budget
+    assert 500 - stats["context_tokens"] < 32
+    cut = next(h for h in hits if h["id"] == passages[-1]["ids"][0])
+    assert cut["chunk_text"].startswith(passages[-1]["text"]) and len(cut["chunk_text"]) > len(passages[-1]["text"])
+
+
+def test_mmr_prefers_diverse_hits():
+    q = np.array([1.0, 1.0, 0.0]) / np.sqrt(2)
+    hits = [_hit("a#0", "a", [1, 0.9, 0]), _hit("b#0", "b", [1, 0.95, 0]), _hit("c#0", "c", [0.2, 1, 0])]
+    plain, _ = ContextPacker(token_budget=1000, dedup_threshold=1.1).pack(hits, q)
+    mmr, _ = ContextPacker(token_budget=1000, dedup_threshold=1.1, mmr_lambda=0.5).pack(hits, q)
+    assert [p["ids"][0] for p in plain] == ["a#0", "b#0", "c#0"]
+    assert [p["ids"][0] for p in mmr] == ["b#0", "c#0", "a#0"]
+
+
+def test_chat_reports_tokens_saved(client, fake_services):
+    text = _text(7, 200)
+    searcher = FakeSearcher(hits=[
+        _hit("1234.5678#0", text, [1, 0, 0, 0], title="Attention Is All You Need"),
+        _hit("2345.6789#0", text, [1, 0, 0, 0], title="Attention Is All You Need (v2)"),
+        _hit("3456.7890#0", "Bidirectional encoders.", [0, 1, 0, 0], title="BERT"),
+    ])
+    packer = ContextPacker(token_budget=1500)
+    fake_services.rag = RAGService(embedder=FakeEmbedder(), searcher=searcher, llm=FakeLLM(), packer=packer)
+
+    r = client.post("/v1/chat", json={"question": "What is attention?", "k": 3})
+    assert r.status_code == 200
+    assert int(r.headers["X-Context-Tokens-Saved"]) > 0
+    assert int(r.headers["X-Context-Tokens"]) < estimate_tokens(text) * 2
+    assert all("embedding" not in m for m in r.json()["matches"])
+    assert fake_services.rag.llm.prompts[0].count(text[:200]) == 1
+    assert client.get("/stats").json()["context_packer"]["requests"] == 1
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.agent_api.core.embed_batcher import EmbeddingBatcher, QueueFullError
+
+
+class RecordingEmbedder:
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.threads = set()
+        self.fail = fail
+
+    def embed_queries(self, texts):
+        self.threads.add(threading.current_thread().name)
+        self.batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("encoder crashed")
+        return [[float(len(t))] for t in texts]
+
+
+def test_concurrent_calls_share_one_encode_off_the_loop():
+    async def main():
+        emb = RecordingEmbedder()
+        b = EmbeddingBatcher(emb, max_batch=8, max_wait_ms=50)
+        results = await asyncio.gather(*(b.embed_queries(["x" * i]) for i in range(1, 6)))
+        await b.close()
+        return emb, b, results
+
+    emb, b, results = asyncio.run(main())
+    assert results == [[[float(i)]] for i in range(1, 6)]
+    assert emb.batches == [["x", "xx", "xxx", "xxxx", "xxxxx"]]
+    assert all(name.startswith("embed") for name in emb.threads)
+    s = b.stats()
+    assert s["batches"] == 1 and s["avg_batch_size"] == 5 and s["batch_size_le"]["8"] == 1
+
+
+def test_max_batch_splits_batches():
+    async def main():
+        emb = RecordingEmbedder()
+        b = EmbeddingBatcher(emb, max_batch=2, max_wait_ms=50)
+        await asyncio.gather(*(b.embed_queries([str(i)]) for i in range(5)))
+        await b.close()
+        return emb
+
+    assert [len(x) for x in asyncio.run(main()).batches] == [2, 2, 1]
+
+
+def test_backpressure_and_errors():
+    async def main():
+        b = EmbeddingBatcher(RecordingEmbedder(fail=True), max_queue=2, max_wait_ms=20)
+        first = asyncio.ensure_future(b.embed_queries(["a", "b"]))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await b.embed_queries(["c"])
+        with pytest.raises(RuntimeError, match="encoder crashed"):
+            await first
+        await b.close()
+        return b
+
+    assert asyncio.run(main()).stats()["rejected"] == 1
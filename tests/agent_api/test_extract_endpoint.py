@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import pytest
+
+from tests.agent_api.fakes import FakeLLM
+from src.agent_api.core.extract_service import ExtractService, content_hash
+
+
+class FakeStore:
+    """In-memory stand-in for BigQueryExtractionStore."""
+    def __init__(self):
+        self.chunks = {"1234.5678#0": {"title": "Attention Is All You Need", "text": "Transformers use attention."}}
+        self.extractions = {("id", "precomputed#0"): {"title": "GPT-2", "entities": [{"name": "GPT", "type": "OTHER",
+                                                                                     "mentions": 1}],
+                                                      "sentiment": {"score": 0.1, "magnitude": 0.1}}}
+        self.summaries = {}
+        self.reads = 0
+
+    def get_text(self, doc_id):
+        return self.chunks.get(doc_id)
+
+    def get_extraction(self, key_col, key):
+        self.reads += 1
+        return self.extractions.get((key_col, key))
+
+    def put_extraction(self, row):
+        self.extractions[("id", row["id"])] = self.extractions[("content_hash", row["content_hash"])] = {
+            "title": row["title"], "entities": row["entities"],
+            "sentiment": {"score": row["sentiment_score"], "magnitude": row["sentiment_magnitude"]}}
+
+    def get_summary(self, key_col, key, max_tokens):
+        return self.summaries.get((key_col, key, max_tokens))
+
+    def put_summary(self, row):
+        self.summaries[("id", row["id"], row["max_tokens"])] = {"title": row["title"], "summary": row["summary"]}
+
+
+class SlowAnalyzer:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.texts = []
+
+    def __call__(self, text):
+        self.texts.append(text)
+        time.sleep(self.delay)
+        return {"entities": [{"name": text.split()[0], "type": "OTHER", "mentions": 1}],
+                "sentiment": {"score": 0.5, "magnitude": 0.5}, "language_code": "en"}
+
+
+@pytest.fixture
+def analyzer():
+    return SlowAnalyzer()
+
+
+@pytest.fixture
+def store():
+    return FakeStore()
+
+
+@pytest.fixture
+def extract_client(client, fake_services, analyzer, store):
+    fake_services.extract = ExtractService(FakeLLM("A short summary."), store=store, analyzer=analyzer)
+    return client
+
+
+def test_extract_by_id_reads_precomputed_row(extract_client, analyzer):
+    r = extract_client.post("/v1/extract", json={"id": "precomputed#0", "title": "ignored"})
+    assert r.status_code == 200
+    assert r.json()["entities"][0]["name"] == "GPT" and r.json()["title"] == "GPT-2"
+    assert analyzer.texts == []
+
+
+def test_extract_miss_computes_once_then_serves_from_cache(extract_client, analyzer, store):
+    for _ in range(3):
+        r = extract_client.post("/v1/extract", json={"id": "1234.5678#0"})
+        assert r.status_code == 200 and r.json()["entities"][0]["name"] == "Transformers"
+        assert r.json()["title"] == "Attention Is All You Need"
+    assert analyzer.texts == ["Transformers use attention."]
+    assert ("id", "1234.5678#0") in store.extractions and store.reads == 1
+
+
+def test_raw_text_is_keyed_by_content_hash_and_not_written_back(extract_client, analyzer, store):
+    text = "Diffusion models denoise."
+    extract_client.post("/v1/extract", json={"text": text})
+    r = extract_client.post("/v1/extract", json={"text": text, "title": "other title"})
+    assert analyzer.texts == [text] and r.json()["title"] == "other title"
+    extract_client.post("/v1/summarize", json={"text": text})
+    assert ("content_hash", content_hash(text)) not in store.extractions and store.summaries == {}
+    # text matching a stored chunk is served from that chunk's row
+    store.put_extraction({"id": "9#0", "title": "Stored", "content_hash": content_hash("Known text."),
+                          "entities": [], "sentiment_score": 0.0, "sentiment_magnitude": 0.0})
+    r = extract_client.post("/v1/extract", json={"text": "Known text."})
+    assert r.json()["title"] == "Stored" and analyzer.texts == [text]
+
+
+def test_summarize_and_errors(extract_client, fake_services):
+    r = extract_client.post("/v1/summarize", json={"id": "1234.5678#0", "max_tokens": 64})
+    assert r.status_code == 200 and r.json()["summary"] == "A short summary."
+    assert r.json()["title"] == "Attention Is All You Need"
+    assert fake_services.extract.store.summaries[("id", "1234.5678#0", 64)]["title"] == "Attention Is All You Need"
+    assert "Transformers use attention." in fake_services.extract.llm.prompts[0]
+    assert extract_client.post("/v1/summarize", json={}).status_code == 400
+    assert extract_client.post("/v1/extract", json={"id": "missing#0"}).status_code == 404
+
+
+def test_concurrent_misses_are_coalesced(analyzer, store):
+    service = ExtractService(FakeLLM(), store=store, analyzer=analyzer)
+
+    async def main():
+        return await asyncio.gather(*[service.extract(doc_id="1234.5678#0") for _ in range(10)])
+
+    results = asyncio.run(main())
+    assert len(analyzer.texts) == 1
+    assert all(r["entities"] == results[0]["entities"] for r in results)
+    assert service.flight.stats()["coalesced"] == 9
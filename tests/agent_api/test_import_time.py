@@ -0,0 +1,16 @@
+from pathlib import Path
+
+from benchmarks.cold_start import import_times
+
+# imported where the clients are built (services startup, pipeline jobs), never by `import main`
+HEAVY = ("google.cloud.bigquery", "google.cloud.aiplatform", "vertexai", "google.api_core.exceptions",
+         "sentence_transformers", "torch", "onnxruntime", "pyarrow")
+# about 0.6s on one CPU today, 5.2s with the eager GCP imports
+BUDGET_MS = 2500
+
+
+def test_api_import_stays_light(monkeypatch):
+    monkeypatch.chdir(Path(__file__).resolve().parents[2])
+    times = import_times("src.agent_api.main")
+    assert [m for m in times if any(m == h or m.startswith(h + ".") for h in HEAVY)] == []
+    assert times["src.agent_api.main"] / 1000 < BUDGET_MS
@@ -0,0 +1,95 @@
+import logging
+
+import pytest
+
+from src.agent_api.core import telemetry
+from src.agent_api.core.telemetry import Histogram, logger, span
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def records():
+    handler = ListHandler()
+    logger.addHandler(handler)
+    yield handler.records
+    logger.removeHandler(handler)
+
+
+def test_request_id_stage_timings_and_metrics(client, records):
+    r = client.post("/v1/chat", json={"question": "What are transformer models?", "k": 2},
+                    headers={"X-Request-ID": "req-123"})
+    assert r.status_code == 200 and r.headers["X-Request-ID"] == "req-123"
+    assert client.get("/healthz").headers["X-Request-ID"] != "req-123"
+
+    line = next(rec for rec in records if rec.getMessage() == "request" and rec.request_id == "req-123")
+    assert line.fields["status"] == 200 and line.fields["path"] == "/v1/chat"
+    assert {"embed", "search", "prompt", "generate"} <= set(line.fields["stages_ms"])
+
+    text = client.get("/metrics").text
+    assert 'http_requests_total{method="POST",route="/v1/chat",status="200"}' in text
+    assert 'rag_stage_seconds_bucket{stage="generate",le="+Inf"}' in text
+    assert 'rag_hits_returned_count{mode="dense"}' in text
+    assert "# TYPE rag_prompt_chars histogram" in text
+    assert 'executor_queue_depth{executor="default"}' in text
+    assert 'executor_threads{executor="search"}' in text
+
+
+def test_stream_request_log_includes_generation(client, records):
+    r = client.post("/v1/chat/stream", json={"question": "q", "k": 1})
+    assert r.status_code == 200 and "event: done" in r.text
+    line = next(rec for rec in records if rec.getMessage() == "request" and rec.fields["path"] == "/v1/chat/stream")
+    assert {"generate", "first_token"} <= set(line.fields["stages_ms"])
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("t_seconds", "test", buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 0.5, 5.0):
+        h.observe(v, stage="x")
+    assert h.samples() == [
+        't_seconds_bucket{stage="x",le="0.1"} 1',
+        't_seconds_bucket{stage="x",le="1"} 3',
+        't_seconds_bucket{stage="x",le="+Inf"} 4',
+        't_seconds_sum{stage="x"} 6.05',
+        't_seconds_count{stage="x"} 4',
+    ]
+
+
+def test_span_records_stage_even_when_the_block_raises(monkeypatch):
+    stage_seconds = Histogram("rag_stage_seconds", "test")
+    monkeypatch.setattr(telemetry, "STAGE_SECONDS", stage_seconds)
+    token = telemetry._timings.set({})
+    try:
+        with span("search"):
+            pass
+        with pytest.raises(RuntimeError):
+            with span("search"):
+                raise RuntimeError("boom")
+        timings = telemetry._timings.get()
+    finally:
+        telemetry._timings.reset(token)
+    assert list(timings) == ["search"] and timings["search"] >= 0
+    assert 'rag_stage_seconds_count{stage="search"} 2' in stage_seconds.samples()
+    with span("search"):   # outside a request: metrics only
+        pass
+    assert 'rag_stage_seconds_count{stage="search"} 3' in stage_seconds.samples()
+
+
+def test_executor_gauges_skip_executors_without_a_work_queue():
+    from concurrent.futures import ThreadPoolExecutor
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    pool.submit(int).result()
+    try:
+        gauges = telemetry.executor_gauges({"search": pool, "other": object(), "missing": None})
+    finally:
+        pool.shutdown()
+    assert gauges == [("executor_queue_depth", {"executor": "search"}, 0.0),
+                      ("executor_threads", {"executor": "search"}, 1.0)]
@@ -0,0 +1,65 @@
+from fastapi.testclient import TestClient
+
+from tests.agent_api.fakes import FakeEmbedder, FakeLLM, FakeSearcher, wait_ready
+from src.agent_api.core.rag_service import RAGService
+from src.agent_api.core.semantic_cache import SemanticCache
+from src.agent_api.core.services import Services, index_version_fn
+from src.agent_api.main import create_app
+
+
+def test_threshold_scope_capacity_and_version():
+    version = {"v": "1"}
+    cache = SemanticCache(threshold=0.9, capacity=2, version_fn=lambda: version["v"])
+    cache.store([1.0, 0.0], 5, None, {"answer": "x"})
+    assert cache.lookup([0.99, 0.05], 5, None) == {"answer": "x"}
+    assert cache.lookup([0.0, 1.0], 5, None) is None                      # too far
+    assert cache.lookup([1.0, 0.0], 3, None) is None                      # different k
+    assert cache.lookup([1.0, 0.0], 5, {"categories": ["cs.CL"]}) is None  # different filters
+
+    cache.store([0.0, 1.0], 5, None, {"answer": "y"})
+    cache.store([0.7, 0.7], 5, None, {"answer": "z"})
+    assert cache.lookup([1.0, 0.0], 5, None) is None                      # evicted (capacity 2)
+
+    version["v"] = "2"
+    assert cache.lookup([0.0, 1.0], 5, None) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_ttl_expiry():
+    cache = SemanticCache(threshold=0.9, ttl_secs=1e-9)
+    cache.store([1.0, 0.0], 5, None, {"answer": "x"})
+    assert cache.lookup([1.0, 0.0], 5, None) is None
+
+
+def test_chat_reports_cache_header_and_skips_search_and_llm():
+    rag = RAGService(embedder=FakeEmbedder(), searcher=FakeSearcher(), llm=FakeLLM(),
+                     semantic_cache=SemanticCache(threshold=0.99))
+    app = create_app(services_factory=lambda: Services(rag=rag))
+    with TestClient(app) as c:
+        wait_ready(c)
+        first = c.post("/v1/chat", json={"question": "What are transformer models?", "k": 2})
+        second = c.post("/v1/chat", json={"question": "What are transformer models?", "k": 2})
+        assert first.headers["X-Cache"] == "miss"
+        assert second.headers["X-Cache"] == "hit"
+        assert second.json() == first.json()
+        assert len(rag.searcher.calls) == 1 and len(rag.llm.prompts) == 1
+
+
+def test_index_change_under_a_running_service_turns_hits_into_misses():
+    class VersionedSearcher(FakeSearcher):
+        version = "v1"
+
+        def current_version(self):
+            return self.version
+
+    searcher = VersionedSearcher()
+    rag = RAGService(embedder=FakeEmbedder(), searcher=searcher, llm=FakeLLM(),
+                     semantic_cache=SemanticCache(threshold=0.99, version_fn=index_version_fn(searcher, "static")))
+    app = create_app(services_factory=lambda: Services(rag=rag))
+    body = {"question": "What are transformer models?", "k": 2}
+    with TestClient(app) as c:
+        wait_ready(c)
+        assert [c.post("/v1/chat", json=body).headers["X-Cache"] for _ in range(2)] == ["miss", "hit"]
+        searcher.version = "v2"   # e.g. the BigQuery table was modified by a delta load
+        assert [c.post("/v1/chat", json=body).headers["X-Cache"] for _ in range(2)] == ["miss", "hit"]
+    assert rag.semantic_cache.stats()["version"] == "v2/static" and len(searcher.calls) == 2
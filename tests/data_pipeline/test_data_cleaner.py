@@ -0,0 +1,44 @@
+import json
+import random
+
+from src.data_pipeline.data_cleaner import date_key, run, run_parallel
+
+
+def write_corpus(path, n, seed=0):
+    """Duplicated ids with newer/older/equal dates, non-ASCII text and records the cleaner drops."""
+    rnd = random.Random(seed)
+    kept = set()
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            pid = f"{rnd.randrange(n // 3):04d}.{rnd.randrange(10)}"
+            date = f"20{rnd.randrange(10, 24)}-{rnd.randrange(1, 13):02d}-{rnd.randrange(1, 29):02d}"
+            abstract = rnd.choice(["", "   ", f"  Über  {i}\n  abstract  text "])
+            if pid in kept and rnd.random() < 0.05:
+                date = rnd.choice(["", "2021-3-4", "not a date"])   # run() only tolerates these on repeats
+            if abstract.strip():
+                kept.add(pid)
+            f.write(json.dumps({"id": pid, "title": f" T{i} ", "abstract": abstract,
+                                "categories": "cs.LG", "update_date": date}, ensure_ascii=False) + "\n")
+
+
+def test_date_key_orders_like_strptime():
+    assert date_key("2021-03-04") == "2021-03-04"
+    assert date_key("2021-3-4") == "2021-03-04"
+    assert date_key("2021-02-30") == date_key("") == date_key(None) == "0001-01-01"
+    assert date_key("2021-12-31") > date_key("2021-3-4") > date_key("bad")
+
+
+def test_parallel_output_matches_sequential(tmp_path):
+    src = tmp_path / "raw.jsonl"
+    write_corpus(src, 3000)
+    run(str(src), str(tmp_path / "seq.jsonl"))
+    # tiny ranges and budget: many byte ranges (split mid-line) and many spill partitions
+    stats = run_parallel(str(src), str(tmp_path / "par.jsonl"), workers=3, memory_budget_mb=0.1,
+                         spill_dir=str(tmp_path), range_mb=0.01)
+
+    seq = (tmp_path / "seq.jsonl").read_text(encoding="utf-8")
+    par = (tmp_path / "par.jsonl").read_text(encoding="utf-8")
+    assert par == seq
+    assert stats["ranges"] > 10 and stats["partitions"] > 3
+    assert stats["kept"] == len(seq.splitlines())
+    assert [p.name for p in tmp_path.iterdir() if p.name.startswith("clean-spill-")] == []
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from src.data_pipeline.embed_generator import default_codes_uri, run, stream_embeddings
+from src.shared import embed_parquet
+from src.shared.gcp_clients import GCSClient
+
+
+class FakeEmbedder:
+    def __init__(self, fail_after: int | None = None):
+        self.batch_sizes = []
+        self.fail_after = fail_after
+
+    def embed_texts_sync(self, texts):
+        if self.fail_after is not None and len(self.batch_sizes) >= self.fail_after:
+            raise RuntimeError("quota")
+        self.batch_sizes.append(len(texts))
+        return [[float(len(t)), 0.0] for t in texts]
+
+
+def write_corpus(path, n_docs, words=20):
+    with open(path, "w") as f:
+        for i in range(n_docs):
+            f.write(json.dumps({"id": f"p{i}", "title": f" T{i} ", "abstract": " ".join(["w"] * words)}) + "\n")
+        f.write(json.dumps({"id": "empty", "title": "x", "abstract": "  "}) + "\n")
+
+
+def test_batches_span_documents_and_output_is_streamed(tmp_path):
+    src, emb, store = tmp_path / "clean.jsonl", tmp_path / "emb.jsonl", tmp_path / "store.jsonl"
+    write_corpus(src, 50)
+    embedder = FakeEmbedder()
+    stats = stream_embeddings(embedder, GCSClient(), str(src), str(emb), str(store), batch_size=16, queue_depth=2)
+
+    assert embedder.batch_sizes == [16, 16, 16, 2]
+    assert stats["docs"] == 50 and stats["chunks"] == 50 and stats["chunks_per_sec"] > 0
+    emb_rows = [json.loads(l) for l in open(emb)]
+    store_rows = [json.loads(l) for l in open(store)]
+    assert [r["id"] for r in emb_rows] == [f"p{i}#0" for i in range(50)]
+    assert store_rows[3] == {"id": "p3#0", "doc_id": "p3", "title": "T3", "chunk_index": 0,
+                             "chunk_text": " ".join(["w"] * 20)}
+
+
+def test_multi_chunk_documents_keep_chunk_indexes(tmp_path):
+    src, emb, store = tmp_path / "clean.jsonl", tmp_path / "emb.jsonl", tmp_path / "store.jsonl"
+    write_corpus(src, 3, words=400)   # 180-word chunks -> 3 chunks per doc
+    stream_embeddings(FakeEmbedder(), GCSClient(), str(src), str(emb), str(store), batch_size=4)
+    ids = [json.loads(l)["id"] for l in open(store)]
+    assert ids == [f"p{d}#{c}" for d in range(3) for c in range(3)]
+
+
+def test_encoder_failure_propagates_without_hanging(tmp_path):
+    src = tmp_path / "clean.jsonl"
+    write_corpus(src, 200)
+    with pytest.raises(RuntimeError, match="quota"):
+        stream_embeddings(FakeEmbedder(fail_after=2), GCSClient(), str(src),
+                          str(tmp_path / "e.jsonl"), str(tmp_path / "s.jsonl"), batch_size=4, queue_depth=1)
+
+
+def test_parquet_output_format(tmp_path):
+    src, out = tmp_path / "clean.jsonl", tmp_path / "emb.parquet"
+    write_corpus(src, 20)
+    stats = run(project="p", location="l", embed_model="m", input_uri=str(src), embeddings_uri=str(out),
+                store_uri=None, batch_size=8, output_format="parquet", embedder=FakeEmbedder())
+    assert stats["chunks"] == 20
+    ids, mat = embed_parquet.read_matrix(GCSClient(), str(out))
+    assert ids == [f"p{i}#0" for i in range(20)] and mat.shape == (20, 2)
+
+
+def test_default_codes_uri_only_replaces_the_file_extension():
+    assert default_codes_uri("gs://b/emb/arxiv.jsonl") == "gs://b/emb/arxiv.codes.parquet"
+    assert default_codes_uri("gs://my.bucket/emb") == "gs://my.bucket/emb.codes.parquet"
+    assert default_codes_uri("data/v1.2/emb.parquet") == "data/v1.2/emb.codes.parquet"
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from src.data_pipeline import embed_generator, embed_manifest
+from src.shared.gcp_clients import GCSClient
+from src.shared.vector_store import LocalVectorSearch, apply_delta, build_index
+
+
+class FakeEmbedder:
+    def __init__(self, fail_after_batches: int | None = None):
+        self.texts = []
+        self.batches = 0
+        self.fail_after_batches = fail_after_batches
+
+    def embed_texts_sync(self, texts):
+        if self.fail_after_batches is not None and self.batches >= self.fail_after_batches:
+            raise RuntimeError("crash")
+        self.batches += 1
+        self.texts.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+def write_corpus(path, abstracts):
+    with open(path, "w") as f:
+        for doc_id, abstract in abstracts.items():
+            f.write(json.dumps({"id": doc_id, "title": doc_id.upper(), "abstract": abstract}) + "\n")
+
+
+def run(tmp_path, name, embedder, **kwargs):
+    return embed_generator.run(
+        project="p", location="l", embed_model="m",
+        input_uri=str(tmp_path / "clean.jsonl"),
+        embeddings_uri=str(tmp_path / f"{name}.emb.jsonl"),
+        store_uri=str(tmp_path / f"{name}.store.jsonl"),
+        manifest_uri=str(tmp_path / "manifest.jsonl"),
+        batch_size=2, embedder=embedder, **kwargs,
+    )
+
+
+def read_ids(path):
+    return [json.loads(l)["id"] for l in open(path)]
+
+
+def test_second_run_embeds_only_changes_and_emits_deletes(tmp_path):
+    write_corpus(tmp_path / "clean.jsonl", {"a": "alpha text", "b": "beta text", "c": "gamma text"})
+    first = run(tmp_path, "run1", FakeEmbedder())
+    assert first["upserts"] == 3 and first["deletes"] == 0
+
+    write_corpus(tmp_path / "clean.jsonl", {"a": "alpha text", "b": "beta CHANGED", "d": "delta text"})
+    emb = FakeEmbedder()
+    second = run(tmp_path, "run2", emb)
+    assert emb.texts == ["beta CHANGED", "delta text"]
+    assert second["skipped"] == 1 and second["upserts"] == 2 and second["deletes"] == 1
+    assert read_ids(tmp_path / "run2.emb.jsonl") == ["b#0", "d#0"]
+    assert read_ids(tmp_path / "run2.emb.deletes.jsonl") == ["c#0"]
+    assert set(embed_manifest.load_manifest(GCSClient(), str(tmp_path / "manifest.jsonl"))) == {"a#0", "b#0", "d#0"}
+
+    # the local index loader applies the delta
+    build_index(str(tmp_path / "run1.emb.jsonl"), str(tmp_path / "run1.store.jsonl"), str(tmp_path / "idx"))
+    apply_delta(str(tmp_path / "idx"), str(tmp_path / "run2.emb.jsonl"), str(tmp_path / "run2.store.jsonl"),
+                str(tmp_path / "run2.emb.deletes.jsonl"), str(tmp_path / "idx"))
+    idx = LocalVectorSearch(str(tmp_path / "idx"))
+    rows = {idx.row(i)["id"]: idx.row(i) for i in range(len(idx))}
+    assert set(rows) == {"a#0", "b#0", "d#0"}
+    assert rows["b#0"]["chunk_text"] == "beta CHANGED"
+
+
+def test_interrupted_run_resumes_from_checkpoint(tmp_path):
+    write_corpus(tmp_path / "clean.jsonl", {f"p{i}": f"text {i}" for i in range(10)})
+    with pytest.raises(RuntimeError):
+        run(tmp_path, "run1", FakeEmbedder(fail_after_batches=3), checkpoint_every=2, queue_depth=1)
+    done = embed_manifest.load_checkpoint(GCSClient(), str(tmp_path / "manifest.jsonl.checkpoint"))
+    assert len(done) >= 2
+
+    emb = FakeEmbedder()
+    stats = run(tmp_path, "run1", emb, checkpoint_every=2)
+    assert len(emb.texts) == 10 - len(done)            # completed parts are not re-embedded
+    assert sorted(read_ids(tmp_path / "run1.emb.jsonl")) == sorted(f"p{i}#0" for i in range(10))
+    assert stats["manifest_size"] == 10
+    assert GCSClient().glob(str(tmp_path / "manifest.jsonl.checkpoint" / "*.jsonl")) == []
@@ -0,0 +1,85 @@
+import json
+import threading
+
+from google.cloud import language_v2 as language
+
+from src.data_pipeline import nlp_extractor
+
+
+class FakeLanguageClient:
+    def __init__(self, fail_on=()):
+        self.calls = []
+        self.fail_on = set(fail_on)
+        self._lock = threading.Lock()
+
+    def annotate_text(self, document, features):
+        with self._lock:
+            self.calls.append((document["content"], dict(features)))
+        if document["content"] in self.fail_on:
+            raise RuntimeError("backend error")
+        return language.AnnotateTextResponse(
+            entities=[language.Entity(name=document["content"].split()[0], type_=language.Entity.Type.OTHER,
+                                      mentions=[language.EntityMention(), language.EntityMention()])],
+            document_sentiment=language.Sentiment(score=0.25, magnitude=0.5),
+            language_code="en",
+        )
+
+
+class FakeJob:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def result(self):
+        return iter(self._rows)
+
+
+class FakeBigQuery:
+    def __init__(self, chunks, existing=()):
+        self.chunks = chunks
+        self.existing = [{"id": i, "content_hash": h} for i, h in existing]
+        self.inserts = []
+
+    def query(self, sql):
+        if "content_hash" in sql:
+            return FakeJob(self.existing)
+        groups = {}   # GROUP BY chunk_text
+        for c in self.chunks:
+            groups.setdefault(c["chunk_text"], []).append({"id": c["id"], "title": c["title"]})
+        return FakeJob([{"chunk_text": t, "chunks": cs} for t, cs in groups.items()])
+
+    def insert_rows_json(self, table, rows):
+        self.inserts.append((table, list(rows)))
+        return []
+
+
+def chunks(n):
+    return [{"id": f"p{i}#0", "title": f"T{i}", "chunk_text": f"word{i} is about transformers"} for i in range(n)]
+
+
+def test_batch_run_skips_known_hashes_and_buffers_inserts():
+    rows = chunks(25) + [{"id": "dup#0", "title": "D", "chunk_text": "word3 is about transformers"},
+                         {"id": "empty#0", "title": "E", "chunk_text": ""}]
+    known = [("p0#0", nlp_extractor.content_hash(rows[0]["chunk_text"]))]
+    bq, lang = FakeBigQuery(rows, known), FakeLanguageClient(fail_on={"word7 is about transformers"})
+
+    stats = nlp_extractor.run("p", "p.d.chunks", "p.d.extractions", concurrency=4, requests_per_min=None,
+                              flush_rows=10, language_client=lang, bq_client=bq)
+
+    assert stats == {"chunks": 27, "skipped": 2, "analyzed": 23, "failed": 1, "written": 24}
+    assert len(lang.calls) == 24   # one annotate call per new text, none for skipped ones
+    assert all(f == nlp_extractor.FEATURES for _, f in lang.calls)
+    assert [len(r) for _, r in bq.inserts] == [10, 10, 4]
+    written = {r["id"]: r for _, batch in bq.inserts for r in batch}
+    # the duplicate text is analyzed once but written under both ids
+    assert (written["dup#0"]["title"], written["dup#0"]["entities"]) == ("D", written["p3#0"]["entities"])
+    row = next(r for _, batch in bq.inserts for r in batch if r["id"] == "p5#0")
+    assert json.loads(row["entities"]) == [{"name": "word5", "type": "OTHER", "mentions": 2}]
+    assert row["content_hash"] == nlp_extractor.content_hash("word5 is about transformers")
+    assert (row["sentiment_score"], row["language_code"]) == (0.25, "en")
+
+
+def test_analyze_single_call():
+    lang = FakeLanguageClient()
+    out = nlp_extractor.analyze("BERT rocks", client=lang)
+    assert len(lang.calls) == 1
+    assert out["entities"][0]["name"] == "BERT" and out["sentiment"] == {"score": 0.25, "magnitude": 0.5}
@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions as gexc
+
+from src.data_pipeline import vector_db_loader
+from src.data_pipeline.vector_db_loader import upsert_embeddings
+
+
+class FakeEndpoint:
+    """Records upsert calls; `fail` maps a batch's first id to the exceptions to raise, in order."""
+    def __init__(self, fail=None, delay=0.0, resource_name="endpoints/1"):
+        self.resource_name = resource_name
+        self.fail = {k: list(v) for k, v in (fail or {}).items()}
+        self.delay = delay
+        self.upserted = []
+        self.calls = 0
+        self.in_flight = self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def upsert_datapoints(self, deployed_index_id, datapoints, sync=True):
+        first = datapoints[0].datapoint_id
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            errors = self.fail.get(first)
+            error = errors.pop(0) if errors else None
+        try:
+            time.sleep(self.delay)
+            if error is not None:
+                raise error
+            with self._lock:
+                self.upserted.extend(dp.datapoint_id for dp in datapoints)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def write_embeddings(path, n, dim=4):
+    with open(path, "w") as f:
+        for i in range(n):
+            f.write(json.dumps({"id": f"p{i}#0", "embedding": [float(i)] * dim}) + "\n")
+        f.write(json.dumps({"id": "bad", "embedding": [1.0]}) + "\n")   # wrong dim: skipped
+
+
+def load(tmp_path, endpoint, **kwargs):
+    return upsert_embeddings(endpoint, "dep", str(tmp_path / "emb.jsonl"), dim=4, batch_size=10,
+                             ledger_path=str(tmp_path / "ledger.jsonl"), sleep=lambda s: None, **kwargs)
+
+
+def test_batches_run_concurrently_and_transient_errors_are_retried(tmp_path):
+    write_embeddings(tmp_path / "emb.jsonl", 95)
+    endpoint = FakeEndpoint(fail={"p20#0": [gexc.ServiceUnavailable("x"), gexc.ResourceExhausted("y")]}, delay=0.02)
+    stats = load(tmp_path, endpoint, max_in_flight=4)
+
+    assert sorted(endpoint.upserted) == sorted(f"p{i}#0" for i in range(95))
+    assert stats == {"upserted": 95, "batches": 10, "skipped_batches": 0, "retries": 2}
+    assert 1 < endpoint.max_in_flight <= 4
+
+
+def test_rerun_skips_batches_in_the_ledger(tmp_path):
+    write_embeddings(tmp_path / "emb.jsonl", 95)
+    broken = FakeEndpoint(fail={"p50#0": [gexc.InvalidArgument("bad datapoint")]})
+    with pytest.raises(gexc.InvalidArgument):
+        load(tmp_path, broken, max_in_flight=1)
+    assert sorted(broken.upserted) == sorted(f"p{i}#0" for i in range(50))
+
+    healthy = FakeEndpoint()
+    stats = load(tmp_path, healthy, max_in_flight=2)
+    assert sorted(healthy.upserted) == sorted(f"p{i}#0" for i in range(50, 95))
+    assert stats["skipped_batches"] == 5 and stats["upserted"] == 45
+
+
+def test_exhausted_retries_fail_the_load(tmp_path):
+    write_embeddings(tmp_path / "emb.jsonl", 5)
+    endpoint = FakeEndpoint(fail={"p0#0": [gexc.ServiceUnavailable("down")] * 3})
+    with pytest.raises(gexc.ServiceUnavailable):
+        load(tmp_path, endpoint, max_retries=2)
+    assert endpoint.calls == 3
+
+
+class FakeAiplatform:
+    """vector_db_loader's view of aiplatform: endpoints looked up by resource name."""
+    def __init__(self):
+        self.endpoints = {}
+
+    def init(self, **kwargs):
+        pass
+
+    def MatchingEngineIndexEndpoint(self, name):
+        return self.endpoints[name]
+
+
+def test_rerun_without_existing_endpoint_resumes_into_the_same_index(tmp_path, monkeypatch):
+    write_embeddings(tmp_path / "emb.jsonl", 95)
+    fake = FakeAiplatform()
+    created = []
+
+    def create_index_endpoint(project, location, display_name):
+        ep = FakeEndpoint(fail={"p50#0": [gexc.InvalidArgument("bad datapoint")]},
+                          resource_name=f"endpoints/{len(created)}")
+        created.append(ep)
+        fake.endpoints[ep.resource_name] = ep
+        return ep
+
+    monkeypatch.setattr(vector_db_loader, "aiplatform", fake)
+    monkeypatch.setattr(vector_db_loader, "create_index", lambda *a: type("Index", (), {"resource_name": "indexes/1"}))
+    monkeypatch.setattr(vector_db_loader, "create_index_endpoint", create_index_endpoint)
+    monkeypatch.setattr(vector_db_loader, "deploy_index", lambda *a: None)
+
+    def run(emb):
+        vector_db_loader.run("p", "l", 4, "COSINE_DISTANCE", str(emb), "idx", "ep", "dep", batch_size=10,
+                             max_in_flight=1, ledger_path=str(tmp_path / "ledger.jsonl"))
+
+    with pytest.raises(gexc.InvalidArgument):
+        run(tmp_path / "emb.jsonl")
+    run(tmp_path / "emb.jsonl")   # the same command again: no new index, the rest of the data
+    assert len(created) == 1
+    assert sorted(created[0].upserted) == sorted(f"p{i}#0" for i in range(95))
+
+    # another input is a new load (new index, full upload), not a resume of the old ledger
+    write_embeddings(tmp_path / "delta.jsonl", 15)
+    run(tmp_path / "delta.jsonl")
+    assert len(created) == 2 and sorted(created[1].upserted) == sorted(f"p{i}#0" for i in range(15))
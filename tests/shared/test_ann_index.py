@@ -0,0 +1,27 @@
+import numpy as np
+
+from benchmarks.ann_recall import synthetic_corpus, write_jsonl_corpus
+from src.shared.ann_index import IVFPQVectorSearch, build_ivfpq
+from src.shared.vector_store import LocalVectorSearch, build_index
+
+
+def test_ivfpq_recall_and_contract(tmp_path):
+    x = synthetic_corpus(2000, 32, clusters=20)
+    out = str(tmp_path / "index")
+    build_index(*write_jsonl_corpus(x, str(tmp_path)), out)
+    manifest = build_ivfpq(out, nlist=16, m=8, iters=10)
+    assert manifest["count"] == 2000
+
+    exact = LocalVectorSearch(out)
+    ann = IVFPQVectorSearch(out, nprobe=16)  # probing every list: only PQ error remains
+    recall = []
+    for v in x[:50]:
+        truth = {h["id"] for h in exact.search(v, k=10)}
+        hits = ann.search(v, k=10)
+        assert set(hits[0]) >= {"id", "title", "chunk_text", "dot"}
+        recall.append(len(truth & {h["id"] for h in hits}) / 10)
+    assert np.mean(recall) > 0.6
+
+    ann.nprobe = 1
+    assert len(ann.search(x[0], k=5)) <= 5
+    assert ann.memory_bytes() < exact.matrix.nbytes
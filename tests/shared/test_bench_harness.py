@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+
+from benchmarks.compare import compare, direction
+from benchmarks.fakes import FakeBigQueryClient, FakeGCS, FakeGenerativeModel, Latency, synthetic_chunks
+from benchmarks.load_chat import build_fake_services, run_load
+from benchmarks.micro import bench, bench_readers
+from src.agent_api.main import create_app
+from src.shared.gcp_clients import BigQueryVectorSearch
+
+
+def test_fake_bigquery_answers_search_sql_exactly():
+    rows, matrix = synthetic_chunks(300, 16, seed=1)
+    client = FakeBigQueryClient(matrix, rows)
+    s = BigQueryVectorSearch("p", "p.ds.chunks", client=client)
+    q = matrix[7]
+    expect = [rows[i]["id"] for i in np.argsort(-(matrix @ q))[:5]]
+    assert [h["id"] for h in s.search(q.tolist(), k=5)] == expect
+    many = s.search_many([q.tolist(), matrix[8].tolist()], k=5)
+    assert [h["id"] for h in many[0]] == expect and len(many[1]) == 5
+    assert client.jobs == 2
+
+
+def test_latency_is_seeded_and_llm_streams():
+    a, b = Latency(10, 0.5, seed=3), Latency(10, 0.5, seed=3)
+    assert [a.sample_secs() for _ in range(5)] == [b.sample_secs() for _ in range(5)]
+    model = FakeGenerativeModel(answer_tokens=20, chunk_tokens=8)
+    parts = [c.text for c in model.generate_content(["TITLE: Paper 1\n"], stream=True)]
+    assert len(parts) == 3 and parts[0].startswith("[Paper 1]")
+
+
+def test_compare_flags_regressions_by_metric_direction():
+    base = {"results": {"latency": {"p95_ms": 100.0, "count": 50}, "throughput_rps": 20.0}}
+    new = {"results": {"latency": {"p95_ms": 130.0, "count": 10}, "throughput_rps": 25.0}}
+    res = compare(base, new, threshold=0.1)
+    assert [r[0] for r in res["regressions"]] == ["latency.p95_ms"]
+    assert [r[0] for r in res["improvements"]] == ["throughput_rps"]
+    assert direction("readers.x.rows") == 0
+
+
+def test_load_run_reports_stage_percentiles(tmp_path):
+    args = SimpleNamespace(corpus=200, dim=16, seed=0, backend="bigquery", embed_ms=0, embed_item_ms=0, jitter=0,
+                           bq_ms=0, llm_ttft_ms=0, llm_tps=0, llm_prefill_ms=0, answer_tokens=20,
+                           semantic_cache=False, context_tokens=300)
+    app = create_app(services_factory=lambda: build_fake_services(args, str(tmp_path)))
+    report = asyncio.run(run_load(app, rps=50, duration=0.3, transport="asgi"))
+    assert report["requests"] > 0 and report["ok"] == report["requests"]
+    assert {"embed", "search", "prompt", "generate"} <= set(report["stages"])
+    assert report["latency"]["p50_ms"] <= report["latency"]["p99_ms"]
+
+
+def test_micro_bench_and_readers(tmp_path):
+    assert bench(lambda: None, min_time=0.001, repeat=1)["ops_per_sec"] > 0
+    out = bench_readers(50, 8, str(tmp_path))
+    assert out["data_cleaner_iter_jsonl"]["rows"] == 50
+    assert out["vector_store_iter_jsonl"]["rows"] == 50
+    assert FakeGCS(str(tmp_path)).glob("gs://bench/*.jsonl") == [
+        "gs://bench/emb.jsonl", "gs://bench/raw.jsonl", "gs://bench/store.jsonl"]
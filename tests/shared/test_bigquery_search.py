@@ -0,0 +1,125 @@
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from src.shared.gcp_clients import BigQueryVectorSearch
+
+
+class FakeJob:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def result(self):
+        return iter(self._rows)
+
+
+class FakeBigQueryClient:
+    """Stand-in for bigquery.Client that records the SQL and parameters it receives."""
+    def __init__(self, rows=None):
+        self.rows = rows if rows is not None else [
+            {"id": "a#0", "title": "A", "chunk_text": "alpha", "dot": 0.9},
+        ]
+        self.queries = []
+        self.modified = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def get_table(self, table):
+        return SimpleNamespace(modified=self.modified)
+
+    def query(self, sql, job_config=None):
+        params = {p.name: p for p in (job_config.query_parameters if job_config else [])}
+        self.queries.append((sql, params))
+        return FakeJob(self.rows)
+
+
+def test_vector_is_a_query_parameter_not_a_literal():
+    client = FakeBigQueryClient()
+    s = BigQueryVectorSearch("proj", "proj.ds.chunks", client=client)
+    hits = s.search([0.125, -0.5, 0.25], k=3)
+    assert hits == client.rows
+    sql, params = client.queries[0]
+    assert "0.125" not in sql and "DECLARE" not in sql
+    assert "UNNEST(@query_vec)" in sql and "LIMIT 3" in sql
+    assert params["query_vec"].array_type == "FLOAT64"
+    assert params["query_vec"].values == [0.125, -0.5, 0.25]
+    # same SQL text for a different vector -> BigQuery can reuse cached plans/results
+    s.search([0.3, 0.1, 0.2], k=3)
+    assert client.queries[1][0] == sql
+
+
+def test_filters_are_pushed_into_where():
+    client = FakeBigQueryClient()
+    s = BigQueryVectorSearch("proj", "proj.ds.chunks", client=client)
+    s.search([0.1, 0.2], k=5, filters={"categories": ["cs.CL", "cs.LG"],
+                                       "update_date_from": date(2020, 1, 1)})
+    sql, params = client.queries[0]
+    assert "WHERE" in sql and "UNNEST(@categories)" in sql and "update_date >= @update_date_from" in sql
+    assert "update_date_to" not in sql
+    assert params["categories"].values == ["cs.CL", "cs.LG"]
+    assert params["update_date_from"].type_ == "DATE"
+
+
+def test_vector_search_mode_prefilters_base_table():
+    client = FakeBigQueryClient()
+    s = BigQueryVectorSearch("proj", "proj.ds.chunks", mode="vector_search", client=client,
+                             fraction_lists_to_search=0.05)
+    s.search([0.1, 0.2], k=4, filters={"categories": ["cs.CL"]})
+    sql, params = client.queries[0]
+    assert "VECTOR_SEARCH(" in sql and "top_k => 4" in sql and "DOT_PRODUCT" in sql
+    assert "(SELECT * FROM `proj.ds.chunks` WHERE EXISTS" in sql
+    assert "fraction_lists_to_search" in sql
+    with pytest.raises(ValueError):
+        BigQueryVectorSearch("proj", "t", mode="cosine", client=client)
+
+
+def test_result_cache_keyed_by_quantized_vector_k_and_filters():
+    client = FakeBigQueryClient()
+    s = BigQueryVectorSearch("proj", "proj.ds.chunks", client=client, cache_decimals=3)
+    s.search([0.1, 0.2], k=5)
+    s.search([0.10001, 0.19999], k=5)           # rounds to the same key
+    assert len(client.queries) == 1
+    s.search([0.1, 0.2], k=6)
+    s.search([0.1, 0.2], k=5, filters={"categories": ["cs.CL"]})
+    assert len(client.queries) == 3
+    assert s.cache.stats()["hits"] == 1
+
+
+def test_search_many_is_one_job_over_an_array_of_query_structs():
+    rows = [{"qid": 1, "id": "b#0", "title": "B", "chunk_text": "", "dot": 0.7},
+            {"qid": 0, "id": "a#0", "title": "A", "chunk_text": "", "dot": 0.9}]
+    client = FakeBigQueryClient(rows)
+    s = BigQueryVectorSearch("proj", "proj.ds.chunks", client=client)
+    s.search([0.5, 0.5], k=2)                     # cached single result for the 3rd vector
+    out = s.search_many([[0.1, 0.2], [0.3, 0.4], [0.5, 0.5]], k=2, filters=None)
+
+    assert len(client.queries) == 2
+    sql, params = client.queries[1]
+    assert "UNNEST(@queries)" in sql and "QUALIFY ROW_NUMBER() OVER (PARTITION BY q.qid" in sql and "<= 2" in sql
+    assert params["queries"].array_type == "STRUCT" and len(params["queries"].values) == 2
+    assert [h["id"] for h in out[0]] == ["a#0"] and [h["id"] for h in out[1]] == ["b#0"]
+    assert "qid" not in out[0][0]
+    assert s.search([0.3, 0.4], k=2) == out[1]    # batch results fill the per-vector cache
+    assert len(client.queries) == 2
+
+
+def test_return_vectors_selects_embedding():
+    client = FakeBigQueryClient()
+    BigQueryVectorSearch("proj", "proj.ds.chunks", client=client).search([0.1, 0.2], k=2)
+    BigQueryVectorSearch("proj", "proj.ds.chunks", client=client, return_vectors=True).search([0.1, 0.2], k=2)
+    BigQueryVectorSearch("proj", "proj.ds.chunks", mode="vector_search", client=client,
+                         return_vectors=True).search([0.1, 0.2], k=2)
+    assert "AS embedding," not in client.queries[0][0] and "chunk_text, embedding," in client.queries[1][0]
+    assert "base.embedding AS embedding" in client.queries[2][0]
+
+
+def test_table_modification_changes_the_version_and_drops_cached_results():
+    client = FakeBigQueryClient()
+    s = BigQueryVectorSearch("proj", "proj.ds.chunks", client=client)
+    s.version_poll_secs = 0
+    v1 = s.current_version()
+    s.search([0.1, 0.2], k=5)
+    assert s.current_version() == v1 and len(s.cache) == 1
+    client.modified = datetime(2024, 1, 2, tzinfo=timezone.utc)   # a MERGE delta landed
+    assert s.current_version() != v1 and len(s.cache) == 0
+    s.search([0.1, 0.2], k=5)
+    assert len(client.queries) == 2
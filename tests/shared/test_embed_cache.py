@@ -0,0 +1,50 @@
+from src.shared.embed_cache import CachedEmbeddings
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def embed_queries(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+def test_memory_tier_normalizes_and_batches_misses():
+    inner = CountingEmbedder()
+    emb = CachedEmbeddings(inner, model_name="e5", maxsize=10)
+    a = emb.embed_queries(["What are transformer models?", "BERT?"])
+    b = emb.embed_queries(["  what are   Transformer models? ", "bert?", "GPT?"])
+    assert b[0] == a[0] and b[1] == a[1]
+    assert inner.calls == [["What are transformer models?", "BERT?"], ["GPT?"]]
+    s = emb.stats()
+    assert s["memory"]["hits"] == 2 and s["encoded"] == 3
+
+
+def test_lru_eviction_and_ttl():
+    inner = CountingEmbedder()
+    emb = CachedEmbeddings(inner, model_name="e5", maxsize=1)
+    emb.embed_queries(["a"])
+    emb.embed_queries(["b"])
+    emb.embed_queries(["a"])
+    assert len(inner.calls) == 3
+
+    expiring = CachedEmbeddings(CountingEmbedder(), model_name="e5", ttl_secs=1e-9)
+    expiring.embed_queries(["a"])
+    expiring.embed_queries(["a"])
+    assert len(expiring.inner.calls) == 2
+
+
+def test_disk_tier_survives_restart_and_is_model_scoped(tmp_path):
+    path = str(tmp_path / "q.sqlite")
+    first = CachedEmbeddings(CountingEmbedder(), model_name="e5", disk_path=path)
+    vec = first.embed_queries(["What are transformer models?"])[0]
+
+    restarted = CachedEmbeddings(CountingEmbedder(), model_name="e5", disk_path=path)
+    assert restarted.embed_queries(["what are transformer models?"])[0] == vec
+    assert restarted.inner.calls == []
+    assert restarted.stats()["disk"]["hits"] == 1
+
+    other_model = CachedEmbeddings(CountingEmbedder(), model_name="e5-large", disk_path=path)
+    other_model.embed_queries(["What are transformer models?"])
+    assert len(other_model.inner.calls) == 1
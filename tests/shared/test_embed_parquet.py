@@ -0,0 +1,51 @@
+import json
+
+import numpy as np
+
+from src.shared import embed_parquet
+from src.shared.gcp_clients import GCSClient
+from src.shared.vector_store import LocalVectorSearch, build_index
+
+
+def rows_and_vecs(n, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = [{"id": f"p{i}#0", "doc_id": f"p{i}", "title": f"T{i}", "chunk_index": 0, "chunk_text": f"text é {i}"}
+            for i in range(n)]
+    return rows, rng.normal(size=(n, dim)).astype(np.float32)
+
+
+def test_sharded_roundtrip_is_zero_copy_and_exact(tmp_path):
+    gcs = GCSClient()
+    out = str(tmp_path / "emb.parquet")
+    rows, vecs = rows_and_vecs(1000)
+    with embed_parquet.ParquetSink(gcs, out, shard_rows=300, row_group_rows=64) as sink:
+        for i in range(0, 1000, 16):
+            sink.write(rows[i:i + 16], vecs[i:i + 16].tolist())
+
+    assert len(embed_parquet.list_shards(gcs, out)) == sink.shards == 4
+    batch = next(embed_parquet.iter_batches(gcs, out))
+    assert batch.schema.field("embedding").type.list_size == 8
+    mat = embed_parquet.embedding_matrix(batch)
+    assert mat.dtype == np.float32 and not mat.flags.owndata   # a view over the Arrow buffer
+
+    ids, matrix = embed_parquet.read_matrix(gcs, out)
+    assert ids == [r["id"] for r in rows]
+    np.testing.assert_array_equal(matrix, vecs)
+
+    emb, store = tmp_path / "emb.jsonl", tmp_path / "store.jsonl"
+    assert embed_parquet.export_jsonl(gcs, out, str(emb), str(store)) == 1000
+    assert [json.loads(l) for l in open(store, encoding="utf-8")] == rows
+    first = json.loads(open(emb).readline())
+    assert first["id"] == "p0#0" and np.allclose(first["embedding"], vecs[0])
+
+
+def test_local_index_builds_from_parquet(tmp_path):
+    gcs = GCSClient()
+    out = str(tmp_path / "emb.parquet")
+    rows, vecs = rows_and_vecs(50)
+    with embed_parquet.ParquetSink(gcs, out) as sink:
+        sink.write(rows, vecs)
+
+    build_index(out, None, str(tmp_path / "index"))
+    hits = LocalVectorSearch(str(tmp_path / "index")).search(vecs[7], k=1)
+    assert hits[0]["id"] == "p7#0" and hits[0]["chunk_text"] == "text é 7"
@@ -0,0 +1,82 @@
+import math
+
+import numpy as np
+import pytest
+
+from benchmarks.lexical_hybrid import build_synthetic, synthetic_queries
+from src.shared.lexical_index import LexicalIndex, build_bm25, rrf_fuse, tokenize
+from src.shared.vector_store import LocalVectorSearch, _write_index
+
+
+def brute_force_bm25(docs, query, k1=1.2, b=0.75):
+    toks = [tokenize(d) for d in docs]
+    avgdl = sum(map(len, toks)) / len(toks)
+    scores = []
+    for t in toks:
+        s = 0.0
+        for q in set(tokenize(query)):
+            df = sum(1 for u in toks if q in u)
+            tf = t.count(q)
+            if tf:
+                idf = math.log1p((len(toks) - df + 0.5) / (df + 0.5))
+                s += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(t) / avgdl))
+        scores.append(s)
+    return scores
+
+
+def test_bm25_scores_match_formula(tmp_path):
+    docs = ["Attention is all you need: transformers", "BERT pre-training of deep bidirectional transformers",
+            "Graph neural networks", "Deep residual learning for image recognition", "attention attention graph"]
+    rows = [{"id": f"d{i}#0", "title": "", "chunk_text": d} for i, d in enumerate(docs)]
+    _write_index(zip(rows, np.eye(5, dtype=np.float32)), str(tmp_path))
+    build_bm25(str(tmp_path))
+    lex = LexicalIndex(str(tmp_path))
+
+    expected = brute_force_bm25(docs, "attention transformers graph")
+    hits = lex.search("attention transformers graph", k=5)
+    assert [h["id"] for h in hits] == [f"d{i}#0" for i in np.argsort(expected)[::-1] if expected[i] > 0]
+    for h in hits:
+        assert abs(h["bm25"] - expected[int(h["id"][1])]) < 1e-4
+    assert lex.search("unknownword", k=3) == []
+
+
+def test_pruned_top_k_equals_exhaustive_and_rerank_uses_candidates(tmp_path):
+    rows, word_vecs = build_synthetic(3000, str(tmp_path))
+    lex = LexicalIndex(str(tmp_path))
+    dense = LocalVectorSearch(str(tmp_path))
+    for text, vec in synthetic_queries(rows, word_vecs, 30):
+        pruned, exhaustive = lex.top_rows(text, 10), lex.top_rows(text, 10, prune=False)
+        np.testing.assert_allclose(pruned[1], exhaustive[1], rtol=1e-5)
+
+        cand = lex.top_rows(text, 50)[0]
+        reranked = dense.search_rows(vec, cand, k=5)
+        scores = np.asarray(dense.matrix[cand]) @ vec
+        assert reranked[0]["id"] == dense.row(int(cand[np.argmax(scores)]))["id"]
+        assert {h["id"] for h in reranked} <= {dense.row(int(i))["id"] for i in cand}
+
+
+def test_rerank_needs_rows_from_the_same_vector_index(tmp_path):
+    from src.agent_api.core.rag_service import RAGService
+    build_synthetic(200, str(tmp_path / "a"))
+    build_synthetic(150, str(tmp_path / "b"))
+    lex = LexicalIndex(str(tmp_path / "a"))
+    assert lex.shares_rows_with(LocalVectorSearch(str(tmp_path / "a")))
+    other = LocalVectorSearch(str(tmp_path / "b"))
+    assert not lex.shares_rows_with(other)
+
+    rag = RAGService(embedder=object(), searcher=other, llm=object(), lexical=lex)
+    with pytest.raises(ValueError, match="rerank needs"):
+        rag._search("graph attention", np.zeros(other.matrix.shape[1], dtype=np.float32), 5, None, "rerank")
+
+    # vector index rebuilt in place after the BM25 build
+    _write_index(zip([{"id": f"x{i}"} for i in range(10)], np.eye(10, dtype=np.float32)), str(tmp_path / "a"))
+    with pytest.raises(ValueError, match="different vector index"):
+        LexicalIndex(str(tmp_path / "a"))
+
+
+def test_rrf_fuse():
+    dense = [{"id": "a", "dot": 0.9}, {"id": "b", "dot": 0.8}]
+    lexical = [{"id": "b", "bm25": 7.0}, {"id": "c", "bm25": 3.0}]
+    fused = rrf_fuse([dense, lexical], k=3)
+    assert [h["id"] for h in fused] == ["b", "a", "c"]
+    assert fused[0]["dot"] == 0.8 and fused[0]["bm25"] == 7.0
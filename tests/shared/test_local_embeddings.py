@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from src.shared.gcp_clients import LocalEmbeddings
+
+
+class FakeModel:
+    max_seq_length = 512
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=False):
+        self.calls.append(list(texts))
+        v = np.asarray([[len(t), 1.0] for t in texts], dtype=np.float32)
+        return v / np.linalg.norm(v, axis=1, keepdims=True) if normalize_embeddings else v
+
+
+def test_prefixes_normalization_and_backend_key():
+    model = FakeModel()
+    enc = LocalEmbeddings("m", backend="onnx-int8", max_seq_length=128, model=model)
+    assert model.max_seq_length == 128 and enc.model_id == "m:onnx-int8:L128"
+    vecs = enc.embed_queries(["a", None])
+    assert model.calls[-1] == ["query: a", "query: "]
+    assert np.allclose(np.linalg.norm(vecs, axis=1), 1.0)
+    enc.embed_texts_sync(["b"])
+    assert model.calls[-1] == ["passage: b"]
+    assert LocalEmbeddings("m", model=FakeModel()).model_id == "m"
+    assert LocalEmbeddings("m", max_seq_length=512, model=FakeModel()).model_id == "m"   # the model's own limit
+    assert LocalEmbeddings("m", max_seq_length=256, model=FakeModel()).model_id == "m:L256"
+    with pytest.raises(ValueError, match="backend"):
+        LocalEmbeddings("m", backend="tensorrt", model=model)
+
+
+def test_embed_batches_pools_a_window_and_keeps_order():
+    model = FakeModel()
+    enc = LocalEmbeddings("m", sort_window=10, model=model)
+    batches = [["x" * (i * 4 + j) for j in range(4)] for i in range(7)]
+    out = list(enc.embed_batches(iter(batches)))
+    assert [len(o) for o in out] == [4] * 7
+    assert len(model.calls) == 3   # 12 + 12 + 4 texts
+    expected = [enc.embed_passages(b) for b in batches]
+    assert all(np.allclose(o, e) for o, e in zip(out, expected))
+
+
+@pytest.mark.parametrize("backend,min_cos", [("onnx", 0.9999), ("onnx-int8", 0.98)])
+def test_onnx_backends_match_torch(tmp_path, backend, min_cos):
+    pytest.importorskip("sentence_transformers")
+    pytest.importorskip("optimum.onnxruntime")
+    texts = ["Transformers replace recurrence with attention.", "We study graph neural networks " * 20]
+    try:
+        ref = np.asarray(LocalEmbeddings(backend="torch").embed_passages(texts))
+        enc = LocalEmbeddings(backend=backend, threads=1, cache_dir=str(tmp_path))
+    except OSError as e:   # model download unavailable
+        pytest.skip(str(e))
+    vecs = np.asarray(enc.embed_passages(texts))
+    assert np.allclose(np.linalg.norm(vecs, axis=1), 1.0, atol=1e-4)
+    assert (vecs * ref).sum(axis=1).min() >= min_cos
+    # the export is cached: a second instance loads it from cache_dir
+    again = LocalEmbeddings(backend=backend, cache_dir=str(tmp_path))
+    assert np.allclose(again.embed_passages(texts), vecs, atol=1e-5)
@@ -0,0 +1,83 @@
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.ann_recall import synthetic_corpus, write_jsonl_corpus
+from src.data_pipeline.embed_generator import run
+from src.shared.gcp_clients import GCSClient
+from src.shared.quantize import (
+    QuantizedVectorSearch, _hamming_lut, binarize, build_quantized, hamming, int8_scale, quantize_int8, read_codes,
+)
+from src.shared.vector_store import LocalVectorSearch, build_index
+
+
+def test_codecs():
+    x = synthetic_corpus(500, 64)
+    scale = int8_scale(x)
+    err = np.abs(quantize_int8(x, scale) * scale - x).max(axis=0)
+    assert np.all(err <= scale / 2 + 1e-7)
+
+    bits = binarize(x)
+    assert bits.shape == (500, 8) and bits.dtype == np.uint8
+    naive = [(np.unpackbits(b) != np.unpackbits(bits[0])).sum() for b in bits]
+    assert hamming(bits[0], bits).tolist() == naive
+    assert _hamming_lut(bits[0], bits).tolist() == naive   # numpy < 2.0 path
+    odd = binarize(x[:, :60])   # 8 bytes per row, padded with zero bits
+    assert hamming(odd[3], odd)[3] == 0 and hamming(odd[3], odd).max() <= 60
+
+
+@pytest.mark.parametrize("mode,min_recall", [("int8", 0.95), ("binary", 0.9)])
+def test_quantized_search_rescores_to_exact(tmp_path, mode, min_recall):
+    x = synthetic_corpus(3000, 64, clusters=30)
+    out = str(tmp_path / "index")
+    build_index(*write_jsonl_corpus(x, str(tmp_path)), out)
+    assert build_quantized(out)["count"] == 3000
+
+    exact = LocalVectorSearch(out)
+    s = QuantizedVectorSearch(out, mode=mode, rescore=10, block_rows=1000)   # several blocks to merge
+    recall = []
+    for v in x[:40]:
+        truth = exact.search(v, k=10)
+        hits = s.search(v, k=10)
+        assert set(hits[0]) >= {"id", "title", "chunk_text", "dot"}
+        found = {h["id"]: h["dot"] for h in hits}
+        for h in truth:
+            if h["id"] in found:
+                assert found[h["id"]] == pytest.approx(h["dot"], abs=1e-5)   # rescored scores are exact
+        recall.append(len(found.keys() & {h["id"] for h in truth}) / 10)
+    assert np.mean(recall) >= min_recall
+
+    s.rescore = 0
+    assert len(s.search(x[0], k=5)) == 5
+    assert s.memory_bytes() * (3 if mode == "int8" else 16) <= exact.matrix.nbytes
+
+
+def test_embed_generator_writes_codes_next_to_the_float_output(tmp_path):
+    x = synthetic_corpus(30, 16)
+    src = tmp_path / "clean.jsonl"
+    with open(src, "w") as f:
+        for i in range(30):
+            f.write(json.dumps({"id": f"p{i}", "title": "t", "abstract": f"doc {i}"}) + "\n")
+
+    class Embedder:
+        def embed_texts_sync(self, texts):
+            return [x[int(t.split()[1])].tolist() for t in texts]
+
+    emb, store = tmp_path / "emb.jsonl", tmp_path / "store.jsonl"
+    run(project="p", location="l", embed_model="m", input_uri=str(src), embeddings_uri=str(emb),
+        store_uri=str(store), batch_size=8, embedder=Embedder(), quantize=True)
+    ids, int8, bits, scale = read_codes(GCSClient(), str(tmp_path / "emb.codes.parquet"))
+    assert ids == [f"p{i}#0" for i in range(30)]
+    assert np.array_equal(bits, binarize(x)) and np.array_equal(int8, quantize_int8(x, int8_scale(x)))
+
+    out = str(tmp_path / "index")
+    build_index(str(emb), str(store), out)
+    build_quantized(out, codes_uri=str(tmp_path / "emb.codes.parquet"))
+    assert QuantizedVectorSearch(out, mode="binary").search(x[4], k=1)[0]["id"] == "p4#0"
+
+    reordered = tmp_path / "reordered.jsonl"
+    reordered.write_text("".join(reversed(open(emb).readlines())))
+    build_index(str(reordered), str(store), out)
+    with pytest.raises(ValueError, match="does not list the index rows"):
+        build_quantized(out, codes_uri=str(tmp_path / "emb.codes.parquet"))
@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+import pytest
+
+from src.shared.vector_store import LocalVectorSearch, build_index
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    rng = np.random.default_rng(0)
+    vecs = rng.normal(size=(50, 8)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    emb, store = tmp_path / "emb.jsonl", tmp_path / "store.jsonl"
+    with open(emb, "w") as fe, open(store, "w") as fs:
+        for i, v in enumerate(vecs):
+            vid = f"doc{i}#0"
+            fe.write(json.dumps({"id": vid, "embedding": v.tolist()}) + "\n")
+            fs.write(json.dumps({"id": vid, "doc_id": f"doc{i}", "title": f"Title {i}",
+                                 "chunk_index": 0, "chunk_text": f"text {i}"}) + "\n")
+    out = tmp_path / "index"
+    build_index(str(emb), str(store), str(out))
+    return vecs, str(out)
+
+
+def test_search_matches_brute_force(corpus):
+    vecs, out = corpus
+    searcher = LocalVectorSearch(out, block_rows=7)  # force several blocks
+    q = vecs[3] + 0.1 * vecs[10]
+    hits = searcher.search(q.tolist(), k=5)
+    expected = np.argsort(-(vecs @ q))[:5]
+    assert [h["id"] for h in hits] == [f"doc{i}#0" for i in expected]
+    assert hits[0]["title"] == "Title 3"
+    assert hits[0]["dot"] == pytest.approx(float(vecs[3] @ q), rel=1e-5)
+    assert isinstance(searcher.matrix, np.memmap)
+
+
+def test_search_many_agrees_with_search(corpus):
+    vecs, out = corpus
+    searcher = LocalVectorSearch(out)
+    batch = searcher.search_many(vecs[:4], k=3)
+    assert [[h["id"] for h in hits] for hits in batch] == \
+        [[h["id"] for h in searcher.search(v, k=3)] for v in vecs[:4]]
+    assert len(searcher.search(vecs[0], k=500)) == 50
+
+
+def test_current_version_follows_a_rebuilt_manifest(corpus):
+    _, out = corpus
+    searcher = LocalVectorSearch(out)
+    assert searcher.current_version() == searcher.index_version
+    with open(f"{out}/manifest.json") as f:
+        manifest = json.load(f)
+    with open(f"{out}/manifest.json", "w") as f:
+        json.dump({**manifest, "version": "rebuilt"}, f)
+    assert searcher.current_version() == searcher.index_version   # not re-read before version_poll_secs
+    searcher.version_poll_secs = 0
+    assert searcher.current_version() == "rebuilt"
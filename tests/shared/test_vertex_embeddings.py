@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+from google.api_core.exceptions import ResourceExhausted
+
+from src.shared.gcp_clients import VertexEmbeddings
+from src.shared.rate_limit import AIMDConcurrency, TokenBucket
+
+
+class FakeEmbedding:
+    def __init__(self, values):
+        self.values = values
+
+
+class FakeTextEmbeddingModel:
+    """get_embeddings() stand-in that raises 429 on every `fail_every`-th call."""
+    def __init__(self, fail_every: int = 0):
+        self.fail_every = fail_every
+        self.calls = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def get_embeddings(self, texts):
+        with self._lock:
+            self.calls += 1
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            fail = self.fail_every and self.calls % self.fail_every == 0
+        try:
+            if fail:
+                raise ResourceExhausted("429 quota exceeded")
+            return [FakeEmbedding([float(len(t))]) for t in texts]
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+def make(model, **kwargs):
+    return VertexEmbeddings("p", "l", embedding_model=model, requests_per_min=None,
+                            sleep=lambda s: None, **kwargs)
+
+
+def test_retries_429_and_backs_off_concurrency():
+    model = FakeTextEmbeddingModel(fail_every=3)
+    emb = make(model, max_concurrency=4, initial_concurrency=4)
+    batches = [[f"text {i}", "x" * i] for i in range(30)]
+    results = list(emb.embed_batches(batches))
+    assert results == [[[float(len(a))], [float(len(b))]] for a, b in batches]   # in order
+    assert emb.throttled > 0
+    assert emb.concurrency.throttles == emb.throttled
+    assert model.max_in_flight <= 4
+
+
+def test_gives_up_after_max_retries():
+    emb = make(FakeTextEmbeddingModel(fail_every=1), max_retries=2)
+    with pytest.raises(ResourceExhausted):
+        emb.embed_texts_sync(["a"])
+    assert emb.requests == 3
+
+
+def test_aimd_halves_on_throttle_and_ramps_on_success():
+    c = AIMDConcurrency(initial=8, maximum=16)
+    c.on_throttle()
+    assert c.limit == 4
+    for _ in range(20):
+        c.on_success()
+    assert 6 <= c.limit <= 16
+
+
+def test_token_bucket_waits_for_refill():
+    now = [0.0]
+    slept = []
+
+    def sleep(s):
+        slept.append(s)
+        now[0] += s
+
+    bucket = TokenBucket(rate=10, capacity=10, clock=lambda: now[0], sleep=sleep)
+    assert bucket.acquire(10) == 0
+    assert bucket.acquire(5) == pytest.approx(0.5)
+    assert sum(slept) == pytest.approx(0.5)
+
+
+def test_embed_generator_uses_concurrent_vertex_client(tmp_path):
+    import json
+    from src.data_pipeline.embed_generator import stream_embeddings
+    from src.shared.gcp_clients import GCSClient
+
+    src = tmp_path / "clean.jsonl"
+    with open(src, "w") as f:
+        for i in range(40):
+            f.write(json.dumps({"id": f"p{i}", "title": "t", "abstract": f"abstract {i}"}) + "\n")
+    emb = make(FakeTextEmbeddingModel(fail_every=4), max_concurrency=4)
+    stats = stream_embeddings(emb, GCSClient(), str(src), str(tmp_path / "e.jsonl"), str(tmp_path / "s.jsonl"),
+                              batch_size=4)
+    assert stats["chunks"] == 40
+    rows = [json.loads(l) for l in open(tmp_path / "e.jsonl")]
+    assert [r["id"] for r in rows] == [f"p{i}#0" for i in range(40)]